@@ -0,0 +1,110 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark counters.
+
+Usage:
+    poetry run python benchmarks/bench_counter.py [--num 4000000] [--processes 1 2 4 8]
+    poetry run python benchmarks/bench_counter.py --compare [--num 4000000]
+
+default mode measures sharded LossyCounter scaling with worker processes.
+each shard generates zipf like symbols in worker, so only counters are
+transferred between processes.
+
+--compare mode measures throughput and peak RSS of LossyCounter and
+SpaceSavingCounter and ExactCounter on long tail stream, each in fresh process.
+"""
+import os
+import time
+import random
+import argparse
+import resource
+import functools
+import multiprocessing
+from py_rap_gen import counter
+
+
+VOCAB_SIZE = 200000
+EPSILON = 1e-6
+
+
+def make_shard(shard):
+    """Yield symbols of shard."""
+    seed, num = shard
+    rand = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(VOCAB_SIZE)]
+    for _ in range(num // 10000):
+        yield from rand.choices(range(VOCAB_SIZE), weights=weights, k=10000)
+
+
+def long_tail_stream(num, seed=0):
+    """Yield symbols with many rare symbols like 2-gram stream."""
+    rand = random.Random(seed)
+    for _ in range(num):
+        if rand.random() < 0.5:
+            yield str(int(rand.paretovariate(0.5)))
+        else:
+            yield str(rand.getrandbits(40))
+
+
+def _measure_counter(factory, num, queue):
+    """Count stream in child process and report time and RSS."""
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    c = factory()
+    start = time.perf_counter()
+    c.count(long_tail_stream(num))
+    if isinstance(c, counter.ExactCounter):
+        # include sorted count stream aggregation
+        items = sum(1 for _ in c.items())
+        c.close()
+    else:
+        items = len(c._items)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak_rss - base_rss) / 1024, items))
+
+
+def compare(num):
+    """Compare LossyCounter and SpaceSavingCounter."""
+    factories = [
+        ('lossy(1e-7)', functools.partial(counter.LossyCounter, epsilon=1e-7)),
+        ('lossy(1e-5)', functools.partial(counter.LossyCounter, epsilon=1e-5)),
+        ('space_saving(100000)', functools.partial(counter.SpaceSavingCounter, capacity=100000)),
+        ('exact(100000)', functools.partial(counter.ExactCounter, max_items=100000)),
+    ]
+    print('counter\tseconds\tsymbols/sec\tpeak RSS MB\titems')
+    for name, factory in factories:
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=_measure_counter, args=(factory, num, queue))
+        p.start()
+        elapsed, rss, items = queue.get()
+        p.join()
+        print('{}\t{:.2f}\t{:.0f}\t{:.1f}\t{}'.format(name, elapsed, num / elapsed, rss, items))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num', type=int, default=4000000)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+    if args.compare:
+        compare(args.num)
+        return
+    print('cpu count:', os.cpu_count())
+    if os.cpu_count() < max(args.processes):
+        print('warning: fewer cpus than processes, speedup shows pool overhead only')
+
+    print('processes\tseconds\tsymbols/sec\tspeedup')
+    base = None
+    for processes in args.processes:
+        shards = [(i, args.num // processes) for i in range(processes)]
+        start = time.perf_counter()
+        factory = functools.partial(counter.LossyCounter, epsilon=EPSILON)
+        c = counter.count_parallel(make_shard, shards, factory, processes=processes)
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print('{}\t{:.2f}\t{:.0f}\t{:.2f}'.format(processes, elapsed, c._symbol_num / elapsed, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
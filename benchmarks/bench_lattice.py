@@ -0,0 +1,83 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark per request memory and time of compact lattice against node graph.
+
+Usage:
+    poetry run python benchmarks/bench_lattice.py [--length 12] [--candidates 2000] [--pos 50]
+
+every 1 to 3 tones key has candidates words, so each request matches many large groups.
+"""
+import time
+import random
+import argparse
+import itertools
+import tracemalloc
+from py_rap_gen import graph
+from py_rap_gen import lattice
+from py_rap_gen import trie
+
+
+TONES = [1, 2, 3]
+
+
+def build(candidates, pos_num):
+    """Return tone list, prefix searcher and compiled learner."""
+    tone_list = {}
+    word2pos = {}
+    for n in range(1, 4):
+        for key in itertools.product(TONES, repeat=n):
+            key = bytes(key)
+            tone_list[key] = ['{}-{}'.format(key.hex(), k) for k in range(candidates)]
+            for w in tone_list[key]:
+                word2pos[w] = 'pos' + str(random.randrange(pos_num))
+    learner = graph.StructuredPerceptron()
+    learner.N = 1e6
+    poses = set(word2pos.values())
+    learner.construct_feature(p + '_' + n for p in poses for n in poses)
+    learner._vocabs = set(word2pos)
+    learner._word2pos = word2pos
+    learner._w[:] = [random.randrange(100) for _ in range(learner.N)]
+    return tone_list, trie.DoubleArray(tone_list.keys()), graph.CompiledPerceptron.compile(learner)
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    path = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{}\t{:.3f}\t{:.1f}'.format(name, elapsed, peak / 2 ** 20))
+    return elapsed, peak, [n.word for n in path]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--length', type=int, default=12)
+    parser.add_argument('--candidates', type=int, default=2000)
+    parser.add_argument('--pos', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    tone_list, prefix_searcher, learner = build(args.candidates, args.pos)
+    lexicon = lattice.Lexicon(tone_list, learner)
+    string = bytes(random.choice(TONES) for _ in range(args.length))
+    spans = tuple(prefix_searcher.all_prefix_search(string))
+
+    def search_graph():
+        g = graph.Graph.construct_graph(prefix_searcher, tone_list, string, spans=spans)
+        g.learner = learner
+        return g.search_shortest_path()
+
+    def search_lattice():
+        return lattice.Lattice.construct(prefix_searcher, lexicon, learner, string, spans=spans).search_shortest_path()
+
+    print('implementation\tseconds\tpeak MiB')
+    graph_time, graph_peak, graph_path = measure('graph', search_graph)
+    lattice_time, lattice_peak, lattice_path = measure('lattice', search_lattice)
+    print('same result:', graph_path == lattice_path)
+    print('speedup: {:.1f}x, memory: {:.1f}x'.format(graph_time / lattice_time, graph_peak / lattice_peak))
+
+
+if __name__ == '__main__':
+    main()
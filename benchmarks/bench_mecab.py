@@ -0,0 +1,68 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark mecab output parsing against previous implementation.
+
+Usage:
+    poetry run python benchmarks/bench_mecab.py [--lines articles.txt] [--num 100000]
+
+tagging is done once before measuring, so only result object building is compared.
+"""
+import time
+import argparse
+from py_rap_gen import mecab
+
+
+SAMPLE = "君はまさに俺の太陽、金縛りにあったように動けない。"
+
+
+class WordLegacy(object):
+    """Previous Word implementation."""
+
+    def __init__(self, output):
+        surface = output.split("\t")[0].strip()
+        parts = output.split("\t")[1].strip().split(",")
+        self.pos = parts[0]
+        self.pos1 = parts[1]
+        self.surface = surface
+        self.base = parts[6] if '*' != parts[6] else surface
+        self.yomi = parts[7] if len(parts) >= 8 else surface
+        self.pronounce = parts[8] if len(parts) >= 9 else surface
+
+
+def parse_legacy(output):
+    """Previous Sentence parsing implementation."""
+    return [WordLegacy(line) for line in output.strip().split('\n') if line != 'EOS']
+
+
+def measure(name, func, outputs):
+    start = time.perf_counter()
+    for output in outputs:
+        for w in func(output):
+            w.pos, w.pos1, w.surface, w.pronounce
+    elapsed = time.perf_counter() - start
+    print('{}\t{:.2f}\t{:.0f}'.format(name, elapsed, len(outputs) / elapsed))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', default=None)
+    parser.add_argument('--num', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.lines:
+        with open(args.lines, 'r') as f:
+            lines = [line for _, line in zip(range(args.num), f)]
+    else:
+        lines = [SAMPLE] * args.num
+    tagger = mecab.get_tagger()
+    outputs = [tagger.parse(line) for line in lines]
+
+    print('implementation\tseconds\tlines/sec')
+    legacy = measure('legacy', parse_legacy, outputs)
+    current = measure('slots', lambda output: mecab.Sentence(output).words, outputs)
+    print('speedup: {:.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark n-best path search with slotted identity nodes against previous implementation.
+
+Usage:
+    poetry run python benchmarks/bench_nbest.py [--length 50] [--candidates 5] [--N 100]
+
+lattice is built from every 1 to 3 tones key, so 50 tones input has long paths.
+"""
+import time
+import heapq
+import random
+import argparse
+import tracemalloc
+from py_rap_gen import graph
+import bench_lattice
+
+
+class NodeLegacy(object):
+    """Previous Node implementation."""
+    def __init__(self, start_pos, word):
+        self.start_pos = start_pos
+        self.word = word
+        self.cost = 0
+        self.prev = None
+
+    def __eq__(self, other):
+        return (
+            self.start_pos == other.start_pos and
+            self.word == other.word and
+            self.cost == other.cost and
+            self.prev == other.prev
+        )
+
+    def __hash__(self):
+        return hash((
+            self.start_pos,
+            self.word,
+            self.cost,
+            self.prev))
+
+
+class GraphLegacy(graph.Graph):
+    """Graph of previous nodes with previous n-best search."""
+    def __init__(self, g):
+        super().__init__()
+        self.nodes = [[NodeLegacy(n.start_pos, n.word) for n in nodes] for nodes in g.nodes]
+        self.BOS = self.nodes[0][0]
+        self.EOS = self.nodes[-1][0]
+        self.learner = g.learner
+
+    def search_nbest_path(self, N, beam_width=None):
+        paths = []
+        count = 0
+        queue = []
+
+        eos = graph.Path()
+        eos.start_pos = self.EOS.start_pos
+        eos.words = [self.EOS]
+        heapq.heappush(queue, (eos.f_cost, eos))
+        self._calculate_min_cost()
+
+        while count != N and len(queue) != 0:
+            path = heapq.heappop(queue)[1]
+            if path.words[0] == self.BOS:
+                paths.append(path.words[1:])
+                count += 1
+                continue
+
+            nodes = self.nodes[path.start_pos]
+            for prev in nodes:
+                p = graph.Path()
+                edge_cost = self._learner.get_edge_cost(prev, path.words[0])
+                node_cost = self._learner.get_node_cost(prev)
+                p.g_cost = path.g_cost + edge_cost + node_cost
+                p.f_cost = p.g_cost + prev.cost - node_cost
+                p.words = [prev] + path.words
+                p.start_pos = prev.start_pos
+                heapq.heappush(queue, (p.f_cost, p))
+
+        return paths
+
+
+def measure(name, g, N):
+    tracemalloc.start()
+    start = time.perf_counter()
+    paths = g.search_nbest_path(N)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{}\t{:.3f}\t{:.1f}'.format(name, elapsed, peak / 2 ** 20))
+    return elapsed, [[n.word for n in p] for p in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--length', type=int, default=50)
+    parser.add_argument('--candidates', type=int, default=5)
+    parser.add_argument('--N', type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(0)
+    tone_list, prefix_searcher, learner = bench_lattice.build(args.candidates, 10)
+    string = bytes(random.choice(bench_lattice.TONES) for _ in range(args.length))
+    g = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+    g.learner = learner
+    legacy = GraphLegacy(g)
+
+    print('implementation\tseconds\tpeak MiB')
+    legacy_time, legacy_paths = measure('legacy', legacy, args.N)
+    current_time, current_paths = measure('slots', g, args.N)
+    print('same result:', legacy_paths == current_paths)
+    print('speedup: {:.1f}x'.format(legacy_time / current_time))
+
+
+if __name__ == '__main__':
+    main()
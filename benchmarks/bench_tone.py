@@ -0,0 +1,103 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark tone.convert_tones and convert_tones_array against previous implementation.
+
+Usage:
+    poetry run python benchmarks/bench_tone.py [--words data] [--num 1000000]
+
+--words is tagged corpus (DATA_PATH format) or one pronunciation per line.
+without it, words are sampled from random kana with zipf like frequency.
+"""
+import time
+import random
+import argparse
+from py_rap_gen import tone
+
+
+def convert_tones_legacy(kana):
+    """Previous convert_tones implementation."""
+    tones = []
+    splitted_kana = []
+    for k in kana:
+        if k in tone.mini and len(tones) != 0:
+            del tones[-1]
+        for t in tone.tone_types:
+            if k in tone.tone_types[t]:
+                if k in tone.mini and len(splitted_kana) != 0:
+                    splitted_kana[-1] += k
+                else:
+                    splitted_kana.append(k)
+                tones.append(t)
+        if k == 'ー':
+            if len(tones) != 0:
+                splitted_kana.append(k)
+                tones.append(tones[-1])
+    return tones, splitted_kana
+
+
+def load_words(path, num):
+    """Return pronunciations from corpus file."""
+    words = []
+    with open(path, 'r') as f:
+        for line in f:
+            for w in line.strip().split('\t'):
+                parts = w.split()
+                if len(parts) >= 2:
+                    words.append(parts[1])
+                elif len(parts) == 1:
+                    words.append(parts[0])
+            if len(words) >= num:
+                break
+    return words[:num]
+
+
+def make_words(num, vocab_size=50000, seed=0):
+    """Return random pronunciations with zipf like frequency."""
+    rand = random.Random(seed)
+    kanas = [k for t in tone.tone_types.values() for k in t if k not in tone.mini] + ['ー']
+    vocab = [''.join(rand.choice(kanas) + (rand.choice(tone.mini) if rand.random() < 0.1 else '')
+                     for _ in range(rand.randint(1, 6)))
+             for _ in range(vocab_size)]
+    weights = [1.0 / (i + 1) for i in range(vocab_size)]
+    return rand.choices(vocab, weights=weights, k=num)
+
+
+def measure(name, func, words):
+    start = time.perf_counter()
+    for w in words:
+        func(w)
+    elapsed = time.perf_counter() - start
+    print('{}\t{:.2f}\t{:.0f}'.format(name, elapsed, len(words) / elapsed))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', default=None)
+    parser.add_argument('--num', type=int, default=1000000)
+    args = parser.parse_args()
+
+    words = load_words(args.words, args.num) if args.words else make_words(args.num)
+    for w in set(words[:10000]):
+        assert tone.convert_tones(w) == convert_tones_legacy(w)
+
+    print('implementation\tseconds\twords/sec')
+    legacy = measure('legacy', convert_tones_legacy, words)
+    tone._convert_tones.cache_clear()
+    uncached = measure('table', tone._convert_tones.__wrapped__, words)
+    cached = measure('table+cache', tone.convert_tones, words)
+    start = time.perf_counter()
+    for _ in tone.convert_tones_many(words):
+        pass
+    many = time.perf_counter() - start
+    print('convert_tones_many\t{:.2f}\t{:.0f}'.format(many, len(words) / many))
+    start = time.perf_counter()
+    tone.convert_tones_array(words)
+    vectorized = time.perf_counter() - start
+    print('convert_tones_array\t{:.2f}\t{:.0f}'.format(vectorized, len(words) / vectorized))
+    print('speedup table: {:.1f}x, table+cache: {:.1f}x, array: {:.1f}x'.format(
+        legacy / uncached, legacy / cached, legacy / vectorized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark DoubleArray building against previous builder.
+
+Usage:
+    poetry run python benchmarks/bench_trie_build.py [--sizes 10000 100000 1000000] [--legacy-limit 100000]
+"""
+import time
+import random
+import argparse
+from py_rap_gen import trie
+from py_rap_gen import tone
+
+
+TONES = list(tone.tone_types)
+KANAS = [k for t in tone.tone_types.values() for k in t] + \
+    [k + m for k in tone.tone_types['i'] for m in ['ャ', 'ュ', 'ョ']] + ['ー']
+
+
+def make_keys(n, seed=0):
+    """Return random tone keys like tone dictionary keys."""
+    rand = random.Random(seed)
+    keys = set()
+    while len(keys) < n:
+        length = rand.randint(1, 10)
+        keys.add(tuple(rand.choice(TONES) for _ in range(length - 1)) + (rand.choice(KANAS), ))
+    return list(keys)
+
+
+def build_legacy(words):
+    """Previous DoubleArray builder on dense transition table."""
+    tb = trie.TrieBase(words)
+    table = tb._table
+    base = [0]
+    check = [trie.NOT_FOUND]
+    not_found_indexes = []
+    stack = [(0, 0)]
+    while stack:
+        p, n = stack.pop()
+        if n >= len(base):
+            base.extend([trie.NOT_FOUND] * (n - len(base) + 1))
+        children = [(char_index, c) for char_index, c in enumerate(table[p]) if c != trie.NOT_FOUND]
+        if len(children) == 0:
+            continue
+        min_char_index = children[0][0]
+        max_char_index = children[-1][0]
+        is_end = False
+        start_index = 0
+        while not is_end:
+            if start_index < len(not_found_indexes):
+                min_index = not_found_indexes[start_index]
+            else:
+                check.append(trie.NOT_FOUND)
+                min_index = len(check) - 1
+                not_found_indexes.append(min_index)
+            base[n] = min_index - min_char_index
+            if (base[n] + max_char_index) >= len(check):
+                not_found_indexes.extend(range(len(check), base[n] + max_char_index + 1))
+                check.extend([trie.NOT_FOUND] * (base[n] + max_char_index - len(check) + 1))
+            is_end = all([check[base[n] + char_index] == trie.NOT_FOUND for char_index, _ in children])
+            start_index += 1
+        for char_index, _ in children:
+            check[base[n] + char_index] = n
+            del not_found_indexes[not_found_indexes.index(base[n] + char_index)]
+        for char_index, c in reversed(children):
+            stack.append((c, base[n] + char_index))
+    return base, check
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--legacy-limit', type=int, default=100000,
+                        help='skip previous builder for larger sizes (it is quadratic)')
+    args = parser.parse_args()
+
+    print('keys\tbuilder\tseconds\tslots\tfill_ratio')
+    for n in args.sizes:
+        keys = make_keys(n)
+        da = trie.DoubleArray(keys)
+        print('{}\tnew\t{:.2f}\t{}\t{:.3f}'.format(n, da.build_time, len(da._check), da.fill_ratio))
+        if n > args.legacy_limit:
+            print('{}\tlegacy\tskipped'.format(n))
+            continue
+        start = time.perf_counter()
+        base, check = build_legacy(keys)
+        elapsed = time.perf_counter() - start
+        used = sum(1 for c in check if c != trie.NOT_FOUND) + 1
+        print('{}\tlegacy\t{:.2f}\t{}\t{:.3f}'.format(n, elapsed, len(check), used / len(check)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Benchmark viterbi cost calculation with edge cost matrices and compiled learner against per edge loop.
+
+Usage:
+    poetry run python benchmarks/bench_viterbi.py [--length 8] [--candidates 1000] [--pos 50]
+
+lattice has every span up to 3 tones and each span has candidates words.
+"""
+import time
+import random
+import argparse
+from py_rap_gen import graph
+
+
+def build(length, candidates, pos_num):
+    """Return lattice graph and trained perceptron."""
+    g = graph.Graph()
+    g.nodes = [[g.BOS]] + [[] for _ in range(length)] + [[]]
+    word2pos = {}
+    for end in range(1, length + 1):
+        for start in range(max(0, end - 3), end):
+            for k in range(candidates):
+                word = '{}-{}-{}'.format(start, end, k)
+                word2pos[word] = 'pos' + str(random.randrange(pos_num))
+                g.nodes[end].append(graph.Node(start, word))
+    g.EOS = graph.Node(length, "<EOS>")
+    g.nodes[length + 1] = [g.EOS]
+
+    learner = graph.StructuredPerceptron()
+    learner.N = 1e6
+    poses = set(word2pos.values())
+    learner.construct_feature(p + '_' + n for p in poses for n in poses)
+    learner._word2pos = word2pos
+    learner._w[:] = [random.randrange(100) for _ in range(learner.N)]
+    g.learner = learner
+    return g
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('{}\t{:.3f}'.format(name, elapsed))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--length', type=int, default=8)
+    parser.add_argument('--candidates', type=int, default=1000)
+    parser.add_argument('--pos', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    g = build(args.length, args.candidates, args.pos)
+    print('implementation\tseconds')
+    loop = measure('loop', g._calculate_min_cost_by_loop)
+    expected = [(n.cost, n.prev.word if n.prev else None) for nodes in g.nodes for n in nodes]
+    matrix = measure('matrix', g._calculate_min_cost)
+    eq = expected == [(n.cost, n.prev.word if n.prev else None) for nodes in g.nodes for n in nodes]
+    g.learner = graph.CompiledPerceptron.compile(g.learner)
+    compiled_loop = measure('compiled loop', g._calculate_min_cost_by_loop)
+    compiled_matrix = measure('compiled matrix', g._calculate_min_cost)
+    eq = eq and expected == [(n.cost, n.prev.word if n.prev else None) for nodes in g.nodes for n in nodes]
+    print('same result:', eq)
+    print('speedup: {:.1f}x, compiled loop {:.1f}x, compiled matrix {:.1f}x'.format(
+        loop / matrix, loop / compiled_loop, loop / compiled_matrix))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,17 @@ import responder
 import pickle
 import pathlib
 from py_rap_gen import generator
+from py_rap_gen import trie
+from py_rap_gen import graph
+from py_rap_gen import lattice
 
 
 # Load pre-trained objects
 with open('mecab_tone_yomi.pkl', 'rb') as w:
     tone_list = pickle.load(w)
-with open('prefix_searcher.pkl', 'rb') as w:
-    prefix_searcher = pickle.load(w)
-with open('learner.pkl', 'rb') as w:
-    learner = pickle.load(w)
+prefix_searcher = trie.DoubleArray.load('prefix_searcher.bin')
+learner = graph.CompiledPerceptron.load('learner.bin')
+lexicon = lattice.Lexicon(tone_list, learner)
 
 route = pathlib.Path(__file__).parent
 api = responder.API(static_dir=route.joinpath('static'))
@@ -24,7 +26,13 @@ def greet_world(req, resp):
     # return generating rap
     sentence = req.params['sentence']
     nums = int(req.params['nums'])
-    resp.media = {"result": generator.generate_rapv2(sentence, tone_list, prefix_searcher, learner, nums)}
+    resp.media = {"result": generator.generate_rapv2(sentence, tone_list, prefix_searcher, learner, nums, lexicon)}
+
+
+@api.route("/cache")
+def cache_info(req, resp):
+    # return generator cache statistics
+    resp.media = generator.cache_info()
 
 
 def main():
@@ -0,0 +1,99 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Flat binary container of typed arrays loaded with mmap."""
+import sys
+import json
+import mmap
+import struct
+from array import array
+
+
+MAGIC = b'PYRAPGEN'
+ALIGN = 8
+
+
+def _padding(size):
+    """Return padding bytes size for aligning size."""
+    return (ALIGN - size % ALIGN) % ALIGN
+
+
+def save(path, arrays, meta=None):
+    """Write typed arrays to flat binary file.
+
+    file layout is magic, header size, json header and aligned array data.
+
+    Args:
+        path (String): output file path.
+        arrays (Hash[String, array]): array name to typed array.
+        meta (Hash[String, Any]): json serializable extra information.
+    """
+    entries = []
+    offset = 0
+    for name, a in arrays.items():
+        nbytes = len(a) * a.itemsize
+        entries.append([name, a.typecode, offset, len(a)])
+        offset += nbytes + _padding(nbytes)
+
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'arrays': entries,
+        'meta': meta or {}}).encode('utf-8')
+    head_size = len(MAGIC) + 8 + len(header)
+
+    with open(path, 'wb') as w:
+        w.write(MAGIC)
+        w.write(struct.pack('<Q', len(header)))
+        w.write(header)
+        w.write(b'\x00' * _padding(head_size))
+        for a in arrays.values():
+            data = a.tobytes()
+            w.write(data)
+            w.write(b'\x00' * _padding(len(data)))
+
+
+def load(path):
+    """Map flat binary file and return typed array views.
+
+    Args:
+        path (String): input file path.
+
+    Return:
+        arrays (Hash[String, memoryview]): array name to typed view on mapped buffer.
+        meta (Hash[String, Any]): extra information.
+        buf (mmap): mapped buffer. views are valid while it is opened.
+    """
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not array file: " + str(path))
+    header_size = struct.unpack('<Q', buf[len(MAGIC):len(MAGIC) + 8])[0]
+    head_size = len(MAGIC) + 8 + header_size
+    header = json.loads(buf[len(MAGIC) + 8:head_size].decode('utf-8'))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError("Array file byteorder mismatch: " + header['byteorder'])
+
+    data_start = head_size + _padding(head_size)
+    view = memoryview(buf)
+    arrays = {}
+    for name, typecode, offset, length in header['arrays']:
+        itemsize = array(typecode).itemsize
+        start = data_start + offset
+        arrays[name] = view[start:start + length * itemsize].cast(typecode)
+    return arrays, header['meta'], buf
+
+
+def to_array(a):
+    """Return writable typed array copy of typed array or view.
+
+    Args:
+        a (array or memoryview): typed array.
+
+    Return:
+        ret (array): typed array.
+    """
+    if isinstance(a, array):
+        return a
+    ret = array(a.format)
+    ret.frombytes(a.tobytes())
+    return ret
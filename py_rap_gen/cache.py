@@ -0,0 +1,104 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Thread safe LRU cache with size and TTL limits."""
+import time
+import threading
+from collections import OrderedDict
+
+
+# Missing value marker
+_MISSING = object()
+
+
+class LRUCache(object):
+    """Least recently used cache.
+
+    entries older than ttl seconds are treated as missing.
+    hits and misses are counted for sizing the cache.
+    """
+    def __init__(self, maxsize=1024, ttl=None, timer=time.monotonic):
+        """Initialize cache object.
+
+        Args:
+            maxsize (Int): max entry numbers.
+            ttl (Float): entry lifetime seconds. None is unlimited.
+            timer (Callable[[], Float]): current time function.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._timer = timer
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        """Return cached value and mark it recently used.
+
+        Args:
+            key (Hashable): cache key.
+            default (Any): return value when key is missing or expired.
+
+        Return:
+            value (Any): cached value.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and (self.ttl is None or self._timer() - item[1] < self.ttl):
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Set value and evict least recently used entries over maxsize.
+
+        Args:
+            key (Hashable): cache key.
+            value (Any): cached value.
+        """
+        with self._lock:
+            self._items[key] = (value, self._timer())
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def get_or_compute(self, key, func):
+        """Return cached value or cache func() result.
+
+        func runs without lock, so same key may be computed concurrently.
+
+        Args:
+            key (Hashable): cache key.
+            func (Callable[[], Any]): value function.
+
+        Return:
+            value (Any): cached or computed value.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Return cache statistics.
+
+        Return:
+            info (Hash[String, Any]): hits, misses, size and maxsize.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._items), 'maxsize': self.maxsize}
@@ -0,0 +1,254 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Columnar binary tagged corpus."""
+from array import array
+import numpy as np
+from py_rap_gen import arrayfile
+from py_rap_gen import tone
+
+
+# Corpus file format version
+FORMAT_VERSION = 1
+
+# Sentence nums processed at once
+CHUNK_SIZE = 100000
+
+# Begin and end of sentence part-of-speech
+BOS = '<BOS>'
+EOS = '<EOS>'
+
+
+def _string_table(strings):
+    """Return utf-8 blob and offsets of strings."""
+    blob = array('B')
+    offsets = array('q', [0])
+    for s in strings:
+        blob.frombytes(s.encode('utf-8'))
+        offsets.append(len(blob))
+    return blob, offsets
+
+
+def write(path, words, tokens, sentences):
+    """Write corpus file.
+
+    Args:
+        path (String): output file path.
+        words (List[String]): word types formatted as surface + ' ' + pronounce + ' ' + pos.
+        tokens (array): word type ids of all sentences.
+        sentences (array): sentence start offsets of tokens and total token nums.
+    """
+    parts = [w.split() + ['', '', ''] for w in words]
+    pos_list = sorted(set(p[2] for p in parts))
+    pos2id = {p: i for i, p in enumerate(pos_list)}
+    pronounces = [p[1] for p in parts]
+
+    surfaces, surface_offsets = _string_table(p[0] for p in parts)
+    pronounce_blob, pronounce_offsets = _string_table(pronounces)
+    tones, tone_offsets = tone.convert_tones_array(pronounces)
+    kanas, _ = tone.convert_tones_array(pronounces, final_kana=True)
+    kana_only = array('B', [all(c in tone.char_table for c in p) for p in pronounces])
+
+    arrayfile.save(path, {
+        'tokens': tokens,
+        'sentences': sentences,
+        'surfaces': surfaces,
+        'surface_offsets': surface_offsets,
+        'pronounces': pronounce_blob,
+        'pronounce_offsets': pronounce_offsets,
+        'type_pos': array('i', [pos2id[p[2]] for p in parts]),
+        'kana_only': kana_only,
+        'tones': array('B', tones.tobytes()),
+        'kanas': array('B', kanas.tobytes()),
+        'tone_offsets': array('q', tone_offsets.tolist()),
+    }, {'format': 'corpus', 'version': FORMAT_VERSION, 'pos': pos_list})
+
+
+def convert(text_path, path):
+    """Convert tagged text corpus to corpus file.
+
+    each text line is a sentence of tab separated surface + ' ' + pronounce + ' ' + pos words.
+
+    Args:
+        text_path (String): tagged text corpus path.
+        path (String): output file path.
+
+    Return:
+        sentence_num (Int): converted sentence nums.
+    """
+    types = {}
+    tokens = array('i')
+    sentences = array('q', [0])
+    with open(text_path, 'r') as f:
+        for line in f:
+            for w in line.strip().split('\t'):
+                if w.strip() == '':
+                    continue
+                i = types.get(w)
+                if i is None:
+                    i = types[w] = len(types)
+                tokens.append(i)
+            sentences.append(len(tokens))
+    write(path, list(types), tokens, sentences)
+    return len(sentences) - 1
+
+
+class Corpus(object):
+    """Tagged corpus on memory mapped corpus file.
+
+    sentences are word type id sequences. word type strings, part-of-speech
+    ids and tone codes are stored per type, so reading corpus does not split
+    strings or convert tones.
+    """
+    def __init__(self, arrays, meta, buf=None):
+        """Initialize corpus object from arrays.
+
+        Args:
+            arrays (Hash[String, memoryview]): corpus arrays.
+            meta (Hash[String, Any]): corpus file meta information.
+            buf (mmap): mapped buffer of arrays.
+        """
+        if meta.get('format') != 'corpus' or meta.get('version') != FORMAT_VERSION:
+            raise ValueError("Not corpus file version " + str(FORMAT_VERSION))
+        self._buffer = buf
+        self.pos_list = meta['pos']
+        self.tokens = np.frombuffer(arrays['tokens'], dtype=np.int32)
+        self.sentences = np.frombuffer(arrays['sentences'], dtype=np.int64)
+        self.type_pos = np.frombuffer(arrays['type_pos'], dtype=np.int32)
+        self.kana_only = np.frombuffer(arrays['kana_only'], dtype=np.uint8)
+        self.tone_offsets = np.frombuffer(arrays['tone_offsets'], dtype=np.int64)
+        self._surfaces = arrays['surfaces']
+        self._surface_offsets = arrays['surface_offsets']
+        self._pronounces = arrays['pronounces']
+        self._pronounce_offsets = arrays['pronounce_offsets']
+        self._tones = arrays['tones']
+        self._kanas = arrays['kanas']
+
+    @classmethod
+    def load(cls, path):
+        """Load corpus file with mmap.
+
+        Args:
+            path (String): corpus file path.
+
+        Return:
+            corpus (Corpus): loaded corpus.
+        """
+        return cls(*arrayfile.load(path))
+
+    def __len__(self):
+        return len(self.sentences) - 1
+
+    @property
+    def vocab_size(self):
+        """Word type nums."""
+        return len(self.type_pos)
+
+    def surface(self, type_id):
+        """Return surface string of word type."""
+        return bytes(self._surfaces[self._surface_offsets[type_id]:self._surface_offsets[type_id + 1]]).decode('utf-8')
+
+    def pronounce(self, type_id):
+        """Return pronounce string of word type."""
+        return bytes(self._pronounces[self._pronounce_offsets[type_id]:self._pronounce_offsets[type_id + 1]]).decode('utf-8')
+
+    def pos(self, type_id):
+        """Return part-of-speech string of word type."""
+        return self.pos_list[self.type_pos[type_id]]
+
+    def tones(self, type_id):
+        """Return packed tones of word type."""
+        return bytes(self._tones[self.tone_offsets[type_id]:self.tone_offsets[type_id + 1]])
+
+    def kanas(self, type_id):
+        """Return packed tones of word type whose last tone is replaced with last kana."""
+        return bytes(self._kanas[self.tone_offsets[type_id]:self.tone_offsets[type_id + 1]])
+
+    def sentence(self, i):
+        """Return word type ids of sentence."""
+        return self.tokens[self.sentences[i]:self.sentences[i + 1]]
+
+    def chunks(self, size=CHUNK_SIZE):
+        """Yield token chunks of consecutive sentences.
+
+        Args:
+            size (Int): sentence nums of chunk.
+
+        Return:
+            chunks (Iterator[Tuple[ndarray, ndarray]]): word type ids and
+                sentence offsets starting from 0.
+        """
+        for start in range(0, len(self), size):
+            offsets = self.sentences[start:min(start + size, len(self)) + 1]
+            yield self.tokens[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+    def count_types(self):
+        """Return token nums of each word type."""
+        counts = np.zeros(self.vocab_size, dtype=np.int64)
+        for tokens, _ in self.chunks(CHUNK_SIZE):
+            counts += np.bincount(tokens, minlength=self.vocab_size)
+        return counts
+
+    def pos_2gram_names(self):
+        """Return part-of-speech 2-gram names indexed by 2-gram ids.
+
+        Return:
+            names (List[String]): 'pos1_pos2' names with begin and end of sentences.
+        """
+        names = self.pos_list + [BOS, EOS]
+        return [p + '_' + n for p in names for n in names]
+
+    def pos_2gram_chunks(self, size=CHUNK_SIZE):
+        """Yield part-of-speech 2-gram ids of sentence chunks with begin and end of sentences.
+
+        Args:
+            size (Int): sentence nums of chunk.
+
+        Return:
+            chunks (Iterator[ndarray]): 2-gram ids indexing pos_2gram_names.
+        """
+        pos_num = len(self.pos_list) + 2
+        bos, eos = pos_num - 2, pos_num - 1
+        for tokens, offsets in self.chunks(size):
+            lengths = np.diff(offsets)
+            sentence_ids = np.repeat(np.arange(len(lengths)), lengths)
+            extended = np.empty(len(tokens) + 2 * len(lengths), dtype=np.int64)
+            extended[offsets[:-1] + 2 * np.arange(len(lengths))] = bos
+            extended[offsets[1:] + 2 * np.arange(len(lengths)) + 1] = eos
+            extended[np.arange(len(tokens)) + 2 * sentence_ids + 1] = self.type_pos[tokens]
+            first, second = extended[:-1], extended[1:]
+            inner = first != eos
+            yield first[inner] * pos_num + second[inner]
+
+    def count_pos_2grams(self):
+        """Return part-of-speech 2-gram counts with begin and end of sentences.
+
+        Return:
+            counts (Hash[String, Int]): 'pos1_pos2' to count.
+        """
+        names = self.pos_2gram_names()
+        counts = np.zeros(len(names), dtype=np.int64)
+        for ids in self.pos_2gram_chunks(CHUNK_SIZE):
+            counts += np.bincount(ids, minlength=len(names))
+        return {names[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def train_example(self, i):
+        """Return packed tones and correct words of sentence.
+
+        words whose pronounce has not kana characters are skipped.
+
+        Args:
+            i (Int): sentence index.
+
+        Return:
+            example (Tuple[bytes, List[String]]): packed tones and words. None when no tones.
+        """
+        t = []
+        ws = []
+        for type_id in self.sentence(i):
+            if not self.kana_only[type_id] or self.tone_offsets[type_id] == self.tone_offsets[type_id + 1]:
+                continue
+            t.append(self.kanas(type_id))
+            ws.append(self.surface(type_id))
+        if len(t) == 0:
+            return None
+        return b''.join(t), ws
@@ -1,6 +1,19 @@
 # Limitations under the MIT License.
 # Copyright 2019 Katsuya Shimabukuro.
 """Counter object."""
+import os
+import zlib
+import heapq
+import random
+import shutil
+import tempfile
+import functools
+import itertools
+import multiprocessing
+
+
+# Repartitioning depth limit of ExactCounter aggregation
+MAX_PARTITION_LEVEL = 4
 
 
 class LossyCounter(object):
@@ -19,23 +32,50 @@ class LossyCounter(object):
     def count(self, data):
         """Count data element nums.
 
+        counts are accumulated over calls.
+
         Args:
             data (List[X]): data object list.
         """
-        self._symbol_num = 0
-        self._buckets_num = 0
-
+        items = self._items
+        width = int(1 / self.epsilon)
         for symbol in data:
             self._symbol_num += 1
 
-            if symbol in self._items:
-                self._items[symbol] += 1
+            if symbol in items:
+                items[symbol] += 1
             else:
-                self._items[symbol] = self._buckets_num + 1
+                items[symbol] = self._buckets_num + 1
 
-            if self._symbol_num % int(1 / self.epsilon) == 0:
+            if self._symbol_num % width == 0:
                 self._buckets_num += 1
-                self._items = self._remove_items(self._items, self._buckets_num)
+                self._items = items = self._remove_items(items, self._buckets_num)
+
+    def merge(self, other):
+        """Merge other counter counted on another stream.
+
+        items missing in one counter may have been counted up to its buckets
+        num, so merged counts keep upper bounds within epsilon * total symbols.
+
+        Args:
+            other (LossyCounter): counter to merge.
+        Return:
+            self (LossyCounter): merged counter.
+        """
+        items = {}
+        for symbol, c in self._items.items():
+            items[symbol] = c + other._items.get(symbol, other._buckets_num)
+        for symbol, c in other._items.items():
+            if symbol not in items:
+                items[symbol] = c + self._buckets_num
+        self._items = items
+        self._symbol_num += other._symbol_num
+        self._buckets_num += other._buckets_num
+        return self
+
+    def keys(self):
+        """Return counted items."""
+        return iter(self._items)
 
     def _remove_items(self, items, threshold):
         """Remove elements lower count than threshold.
@@ -46,5 +86,437 @@ class LossyCounter(object):
         Return:
             ret (Hash[X]): updated data object count list
         """
-        ret = dict(filter(lambda x: x[1] >= threshold, items.items()))
+        ret = {k: v for k, v in items.items() if v >= threshold}
         return ret
+
+
+class SpaceSavingCounter(object):
+    """Count top items using Space-Saving algorithme with fixed memory.
+
+    at most capacity items are monitored. counts in _items are upper bounds
+    and overestimated at most by the minimum monitored count.
+
+    items are grouped by count in stream summary buckets, so count update
+    and eviction of a minimum count item are constant time.
+    """
+    def __init__(self, capacity=100000):
+        """Initialize counter object.
+        Args:
+            capacity (Int): max monitored item nums.
+        """
+        self.capacity = capacity
+        self._symbol_num = 0
+        self._items = {}
+        self._errors = {}
+        self._buckets = {}
+        self._min_count = 0
+
+    def count(self, data):
+        """Count data element nums.
+
+        counts are accumulated over calls.
+
+        Args:
+            data (List[X]): data object list.
+        """
+        items = self._items
+        buckets = self._buckets
+        for symbol in data:
+            self._symbol_num += 1
+            c = items.get(symbol)
+            if c is None:
+                if len(items) < self.capacity:
+                    c = 0
+                    self._errors[symbol] = 0
+                    self._min_count = 1
+                else:
+                    # replace one of minimum count items
+                    c = self._min_count
+                    bucket = buckets[c]
+                    evicted, _ = bucket.popitem()
+                    del items[evicted]
+                    del self._errors[evicted]
+                    self._errors[symbol] = c
+                    if len(bucket) == 0:
+                        del buckets[c]
+                        self._min_count = c + 1
+            else:
+                bucket = buckets[c]
+                del bucket[symbol]
+                if len(bucket) == 0:
+                    del buckets[c]
+                    if c == self._min_count:
+                        self._min_count = c + 1
+
+            items[symbol] = c + 1
+            bucket = buckets.get(c + 1)
+            if bucket is None:
+                bucket = buckets[c + 1] = {}
+            bucket[symbol] = None
+
+    def merge(self, other):
+        """Merge other counter counted on another stream.
+
+        items missing in a full counter may have been counted up to its
+        minimum count, so merged counts keep upper bounds.
+
+        Args:
+            other (SpaceSavingCounter): counter to merge.
+        Return:
+            self (SpaceSavingCounter): merged counter.
+        """
+        self_min = self._min_count if len(self._items) >= self.capacity else 0
+        other_min = other._min_count if len(other._items) >= other.capacity else 0
+        merged = {}
+        for symbol in itertools.chain(self._items, other._items):
+            if symbol in merged:
+                continue
+            merged[symbol] = (
+                self._items.get(symbol, self_min) + other._items.get(symbol, other_min),
+                self._errors.get(symbol, self_min) + other._errors.get(symbol, other_min))
+        top = heapq.nlargest(self.capacity, merged.items(), key=lambda x: x[1][0])
+
+        self._symbol_num += other._symbol_num
+        self._items = {}
+        self._errors = {}
+        self._buckets = {}
+        for symbol, (c, e) in top:
+            self._items[symbol] = c
+            self._errors[symbol] = e
+            self._buckets.setdefault(c, {})[symbol] = None
+        self._min_count = min(self._buckets) if self._buckets else 0
+        return self
+
+    def keys(self):
+        """Return monitored items."""
+        return iter(self._items)
+
+    def most_common(self, n=None):
+        """Return items sorted by count.
+
+        Args:
+            n (Int): return item nums. None is all items.
+        Return:
+            items (List[Tuple[X, Int]]): item and count list.
+        """
+        if n is None:
+            return sorted(self._items.items(), key=lambda x: x[1], reverse=True)
+        return heapq.nlargest(n, self._items.items(), key=lambda x: x[1])
+
+
+class ReservoirSampler(object):
+    """Uniform fixed size sample of stream using reservoir sampling."""
+    def __init__(self, size=10000, seed=None):
+        """Initialize sampler object.
+        Args:
+            size (Int): max sample nums.
+            seed (Int): random seed.
+        """
+        self.size = size
+        self._symbol_num = 0
+        self._items = []
+        self._random = random.Random(seed)
+
+    def count(self, data):
+        """Sample data elements.
+
+        samples are accumulated over calls.
+
+        Args:
+            data (List[X]): data object list.
+        """
+        items = self._items
+        rand = self._random.random
+        for symbol in data:
+            self._symbol_num += 1
+            if len(items) < self.size:
+                items.append(symbol)
+            else:
+                i = int(rand() * self._symbol_num)
+                if i < self.size:
+                    items[i] = symbol
+
+    def merge(self, other):
+        """Merge other sampler sampled on another stream.
+
+        each merged sample is taken from one of samplers with probability
+        proportional to remaining stream sizes, so the result is uniform
+        sample of both streams.
+
+        Args:
+            other (ReservoirSampler): sampler to merge.
+        Return:
+            self (ReservoirSampler): merged sampler.
+        """
+        samples = [list(self._items), list(other._items)]
+        for sample in samples:
+            self._random.shuffle(sample)
+        remains = [self._symbol_num, other._symbol_num]
+        items = []
+        while len(items) < self.size and remains[0] + remains[1] > 0:
+            i = 0 if self._random.randrange(remains[0] + remains[1]) < remains[0] else 1
+            remains[i] -= 1
+            items.append(samples[i].pop())
+        self._items = items
+        self._symbol_num += other._symbol_num
+        return self
+
+    def keys(self):
+        """Return sampled items."""
+        return iter(self._items)
+
+
+def _read_counts(path):
+    """Yield symbol and count of count file lines."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            symbol, _, c = line.rstrip('\n').rpartition('\t')
+            yield symbol, int(c)
+
+
+def _sum_sorted(counts):
+    """Yield counts of adjacent same symbols summed."""
+    for symbol, group in itertools.groupby(counts, key=lambda x: x[0]):
+        yield symbol, sum(c for _, c in group)
+
+
+class CountFile(object):
+    """Sorted count file written by ExactCounter.save().
+
+    each line is symbol + '\t' + count sorted by symbol.
+    """
+    def __init__(self, path):
+        """Initialize count file object.
+        Args:
+            path (String): count file path.
+        """
+        self.path = path
+
+    def items(self):
+        """Return symbol and count iterator."""
+        return _read_counts(self.path)
+
+    def keys(self):
+        """Return symbol iterator."""
+        return (symbol for symbol, _ in self.items())
+
+
+class ExactCounter(object):
+    """Count exactly with bounded memory.
+
+    when distinct items exceed max_items, in memory counts are hash
+    partitioned and appended to partition files. each partition is
+    aggregated in memory later, and partitions still too large are
+    repartitioned with another hash. aggregated partitions are sorted runs
+    merged into one sorted count stream.
+
+    symbols must be str without new line.
+    """
+    def __init__(self, max_items=1000000, partitions=16, tmpdir=None):
+        """Initialize counter object.
+        Args:
+            max_items (Int): max distinct items kept in memory.
+            partitions (Int): partition file nums.
+            tmpdir (String): parent directory of spill files. None is system default.
+        """
+        self.max_items = max_items
+        self.partitions = partitions
+        self._symbol_num = 0
+        self._items = {}
+        self._dir = tempfile.mkdtemp(prefix='exact_counter_', dir=tmpdir)
+        self._files = [None] * partitions
+        self._spilled = False
+        self._runs = []
+
+    def __getstate__(self):
+        # spill in memory counts, so pickled counter is only spill directory
+        if self._items:
+            self._spill()
+        self._close_files()
+        return self.__dict__.copy()
+
+    def count(self, data):
+        """Count data element nums.
+
+        counts are accumulated over calls.
+
+        Args:
+            data (List[String]): data object list.
+        """
+        items = self._items
+        for symbol in data:
+            self._symbol_num += 1
+            if symbol in items:
+                items[symbol] += 1
+            else:
+                items[symbol] = 1
+                if len(items) > self.max_items:
+                    self._spill()
+
+    def merge(self, other):
+        """Merge other counter counted on another stream.
+
+        other counter is closed.
+
+        Args:
+            other (ExactCounter): counter to merge.
+        Return:
+            self (ExactCounter): merged counter.
+        """
+        if other.partitions != self.partitions:
+            raise ValueError("Partition nums mismatch: " + str(other.partitions))
+        for symbol, c in other._items.items():
+            self._items[symbol] = self._items.get(symbol, 0) + c
+            if len(self._items) > self.max_items:
+                self._spill()
+        other._close_files()
+        if other._spilled:
+            for p in range(self.partitions):
+                path = other._partition_path(p)
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        shutil.copyfileobj(f, self._partition_file(p))
+            self._spilled = True
+        for run in other._runs:
+            moved = os.path.join(self._dir, 'run-%06d' % len(self._runs))
+            shutil.move(run, moved)
+            self._runs.append(moved)
+        self._symbol_num += other._symbol_num
+        other._runs = []
+        other.close()
+        return self
+
+    def items(self):
+        """Return symbol and count iterator sorted by symbol.
+
+        Return:
+            items (Iterator[Tuple[String, Int]]): symbol and count.
+        """
+        if self._spilled:
+            self._spill()
+            self._close_files()
+            for p in range(self.partitions):
+                path = self._partition_path(p)
+                if os.path.exists(path):
+                    self._runs.extend(self._aggregate(path, 0))
+            self._spilled = False
+        memory = sorted(self._items.items())
+        return _sum_sorted(heapq.merge(memory, *[_read_counts(run) for run in self._runs]))
+
+    def keys(self):
+        """Return symbol iterator sorted by symbol."""
+        return (symbol for symbol, _ in self.items())
+
+    def save(self, path):
+        """Write sorted count file.
+
+        Args:
+            path (String): output file path.
+        Return:
+            count_file (CountFile): written count file.
+        """
+        with open(path, 'w', encoding='utf-8') as w:
+            for symbol, c in self.items():
+                w.write(symbol + '\t' + str(c) + '\n')
+        return CountFile(path)
+
+    def close(self):
+        """Remove spill files."""
+        self._close_files()
+        shutil.rmtree(self._dir, ignore_errors=True)
+        self._runs = []
+        self._spilled = False
+
+    def _partition_path(self, p):
+        """Return partition file path."""
+        return os.path.join(self._dir, 'part-%03d' % p)
+
+    def _partition_file(self, p):
+        """Return partition file opened with append mode."""
+        if self._files[p] is None:
+            self._files[p] = open(self._partition_path(p), 'a', encoding='utf-8')
+        return self._files[p]
+
+    def _close_files(self):
+        """Close partition files."""
+        for i, f in enumerate(self._files):
+            if f is not None:
+                f.close()
+                self._files[i] = None
+
+    def _spill(self):
+        """Append in memory counts to partition files."""
+        for symbol, c in self._items.items():
+            p = zlib.crc32(symbol.encode('utf-8')) % self.partitions
+            self._partition_file(p).write(symbol + '\t' + str(c) + '\n')
+        self._items.clear()
+        self._spilled = True
+
+    def _aggregate(self, path, level):
+        """Return sorted run files aggregated from partition file.
+
+        Args:
+            path (String): partition file path. it is removed.
+            level (Int): repartitioning depth.
+        Return:
+            runs (List[String]): sorted run file paths.
+        """
+        counts = {}
+        for symbol, c in _read_counts(path):
+            counts[symbol] = counts.get(symbol, 0) + c
+            if len(counts) > self.max_items and level < MAX_PARTITION_LEVEL:
+                break
+        else:
+            run = os.path.join(self._dir, 'run-%06d' % len(self._runs) + '-' + os.path.basename(path))
+            with open(run, 'w', encoding='utf-8') as w:
+                for symbol, c in sorted(counts.items()):
+                    w.write(symbol + '\t' + str(c) + '\n')
+            os.remove(path)
+            return [run]
+
+        # too many distinct items, split with another hash
+        counts = None
+        sub_paths = [path + '-%03d' % p for p in range(self.partitions)]
+        sub_files = [open(sub_path, 'w', encoding='utf-8') for sub_path in sub_paths]
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                symbol = line.rpartition('\t')[0]
+                sub_files[zlib.crc32(symbol.encode('utf-8'), level + 1) % self.partitions].write(line)
+        for sub_file in sub_files:
+            sub_file.close()
+        os.remove(path)
+        return [run for sub_path in sub_paths for run in self._aggregate(sub_path, level + 1)]
+
+
+def _count_shard(func, factory, shard):
+    """Return counter of one shard."""
+    c = factory()
+    c.count(func(shard))
+    return c
+
+
+def count_parallel(func, shards, factory=LossyCounter, processes=None):
+    """Count shards in worker processes and merge counters.
+
+    counters are merged one by one in completion order, so parent keeps
+    one worker counter at a time.
+
+    Args:
+        func (Callable[[X], Iterable[Y]]): picklable function returning data of shard.
+        shards (List[X]): picklable shard descriptions.
+        factory (Callable[[], Counter]): picklable counter constructor like
+            functools.partial(LossyCounter, epsilon=1e-6).
+        processes (Int): worker process nums. None is cpu count.
+    Return:
+        counter (Counter): merged counter.
+    """
+    worker = functools.partial(_count_shard, func, factory)
+    ret = factory()
+    if processes == 1:
+        for c in map(worker, shards):
+            ret.merge(c)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for c in pool.imap_unordered(worker, shards):
+                ret.merge(c)
+    return ret
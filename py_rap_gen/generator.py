@@ -3,12 +3,31 @@
 
 import random
 import pickle
+from array import array
 from py_rap_gen import mecab
 from py_rap_gen import tone
 from py_rap_gen import graph
+from py_rap_gen import lattice
+from py_rap_gen import trie
+from py_rap_gen import cache
 import numpy as np
 
 
+# Fuzzy tone search parameters
+FUZZY_MAX_DISTANCE = 2
+FUZZY_TOP_N = 10
+
+# Request cache parameters
+CACHE_SIZE = 4096
+CACHE_TTL = 3600
+
+# Input sentence to packed tones cache
+sentence_cache = cache.LRUCache(CACHE_SIZE, CACHE_TTL)
+
+# (searcher version, packed tones) to lattice spans cache
+lattice_cache = cache.LRUCache(CACHE_SIZE, CACHE_TTL)
+
+
 def measure_levenshtein(word1, word2):
     """Return levenshtein distance between word1 and word2
 
@@ -77,22 +96,35 @@ def measure_tail_match_num(word1, word2):
     return match_num
 
 
-def get_match_word(yomi, tone_list):
+def get_match_word(yomi, tone_list, prefix_searcher=None, suffix_searcher=None):
     """Return tone match words to word.
 
+    with prefix_searcher and suffix_searcher, longest head and tail match
+    words are searched on tries instead of scanning whole tone_list.
+
     Aarg:
         yomi (str): target word yomi.
-        tone_list (str): tone dictionary.
+        tone_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+        prefix_searcher (DoubleArray): Trie prefix searcher class
+        suffix_searcher (DoubleArray): Trie prefix searcher class built on reversed tones
     Return:
         words (List[String]): match word list.
     """
-    tones, _ = tone.convert_tones(yomi)
-    tones = "".join(tones)
+    tones = tone.encode(tone.convert_tones(yomi)[0])
+
+    if prefix_searcher is not None and suffix_searcher is not None:
+        head_len, heads = prefix_searcher.longest_prefix_match(tones, len(tones))
+        tail_len, tails = suffix_searcher.longest_prefix_match(tones[::-1], len(tones))
+        if len(heads) == 0 and len(tails) == 0:
+            return []
+        if tail_len >= head_len:
+            return tone_list[tails[0][::-1]]
+        return tone_list[heads[0]]
 
     distances = [
         (
-            max(measure_tail_match_num(tones, t),
-                measure_initial_match_num(tones, t)),
+            max(measure_tail_match_num(tones, tone.encode(t)),
+                measure_initial_match_num(tones, tone.encode(t))),
             t)
         for t in tone_list
         if len(tones) == len(t)
@@ -107,19 +139,23 @@ def get_match_word_with_searcher(yomi, tone_list, prefix_searcher):
 
     Aarg:
         yomi (str): target word yomi.
-        tone_list (str): tone dictionary.
-        prefix_searcher (TrieBase): Trie prefix searcher class
+        tone_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+        prefix_searcher (DoubleArray): Trie prefix searcher class
     Return:
         words (List[String]): match word list.
     """
-    tones, _ = tone.convert_tones(yomi)
+    tones = tone.encode(tone.convert_tones(yomi)[0])
+    result = prefix_searcher.search(tones, max_len=len(tones))
+    if len(result) == 0:
+        # Use nearest tone words when there is no exact match word.
+        result = prefix_searcher.fuzzy_search(tones, max_dist=FUZZY_MAX_DISTANCE, top_n=FUZZY_TOP_N)
+        result = [w for w, d in result if d == result[0][1]]
+
     N = len(tones)
-    result = []
-    while len(tones) != 0:
-        result = prefix_searcher.search(tones, max_len=N)
-        if len(result) != 0:
-            break
+    while len(result) == 0 and len(tones) > 1:
+        # Drop last tone until prefix matches when there is no near word.
         tones = tones[:-1]
+        result = prefix_searcher.search(tones, max_len=N)
 
     if len(result) == 0:
         return []
@@ -153,22 +189,20 @@ def generate_rap(s, tone_list, prefix_searcher):
     )
 
 
-def generate_rapv2(s, tone_list, prefix_searcher, learner, N=1):
-    """Return generated rap.
+def sentence_to_tones(s):
+    """Return packed tones of sentence.
+
+    last tone of each content word is replaced with its last kana.
 
     Aarg:
         s (String): target sentence.
-        tone_list (Hash[Tuple[String], List[String]]): string to string dictionary.
-        prefix_searcher (TrieBase): Trie Prefix Searcher class
-        learner (StructuredLearner): pre-trained structured learner
-        N (Int): response numbers.
     Return:
-        rap (List[String]): generated rap
+        tones (bytes): packed tones.
     """
-    t = []
+    t = array('B')
     is_last_tone = False
     for w in reversed(mecab.parse(s).words):
-        tones, kana = tone.convert_tones(w.pronounce)
+        tones, kana = tone.convert_tones(w.pronounce, packed=True)
         if len(tones) == 0:
             continue
         if not is_last_tone:
@@ -177,10 +211,41 @@ def generate_rapv2(s, tone_list, prefix_searcher, learner, N=1):
             is_last_tone = False
         if (w.pos != '名詞' and w.pos != '形容詞' and w.pos != '動詞') and len(tones) == 1:
             is_last_tone = True
-        t += reversed(tones)
-    t = list(reversed(t))
-    g = graph.Graph.construct_graph(prefix_searcher, tone_list, t)
-    g.learner = learner
+        t.extend(reversed(tones))
+    t.reverse()
+    return t.tobytes()
+
+
+def cache_info():
+    """Return request cache statistics.
+
+    Return:
+        info (Hash[String, Hash[String, Any]]): cache name to statistics.
+    """
+    return {'sentence': sentence_cache.info(), 'lattice': lattice_cache.info()}
+
+
+def generate_rapv2(s, tone_list, prefix_searcher, learner, N=1, lexicon=None):
+    """Return generated rap.
+
+    Aarg:
+        s (String): target sentence.
+        tone_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+        prefix_searcher (DoubleArray): Trie Prefix Searcher class
+        learner (StructuredLearner): pre-trained structured learner
+        N (Int): response numbers.
+        lexicon (Lexicon): tone_list lexicon of learner. compact lattice is used when given.
+    Return:
+        rap (List[String]): generated rap
+    """
+    t = sentence_cache.get_or_compute(s, lambda: sentence_to_tones(s))
+    spans = lattice_cache.get_or_compute(
+        (prefix_searcher.version, t), lambda: tuple(prefix_searcher.all_prefix_search(t)))
+    if lexicon is not None:
+        g = lattice.Lattice.construct(prefix_searcher, lexicon, learner, t, spans=spans)
+    else:
+        g = graph.Graph.construct_graph(prefix_searcher, tone_list, t, spans=spans)
+        g.learner = learner
     try:
         if N != 1:
             paths = g.search_nbest_path(N)
@@ -194,13 +259,12 @@ def generate_rapv2(s, tone_list, prefix_searcher, learner, N=1):
 def main():
     with open('mecab_tone_yomi.pkl', 'rb') as w:
         tone_list = pickle.load(w)
-    with open('prefix_searcher.pkl', 'rb') as w:
-        prefix_searcher = pickle.load(w)
-    with open('learner.pkl', 'rb') as w:
-        learner = pickle.load(w)
+    prefix_searcher = trie.DoubleArray.load('prefix_searcher.bin')
+    learner = graph.CompiledPerceptron.load('learner.bin')
+    lexicon = lattice.Lexicon(tone_list, learner)
     while True:
         print('Please Input Sentence:')
         sentence = input()
         print('\nOutput Sentence:')
-        print(generate_rapv2(sentence, tone_list, prefix_searcher, learner))
+        print(generate_rapv2(sentence, tone_list, prefix_searcher, learner, lexicon=lexicon))
         print('\n')
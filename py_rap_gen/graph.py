@@ -4,11 +4,67 @@
 import sys
 import heapq
 import random
+from array import array
 import numpy as np
+from py_rap_gen import arrayfile
 
 
 UNKNOW_WORD = "<UNKNOWN>"
 
+# Unreachable node cost on edge cost matrices
+MAX_COST = np.float32(sys.maxsize)
+
+# Max previous and target node pair nums summed at once
+VITERBI_BLOCK_SIZE = 1 << 16
+
+# Edge feature index of edge always having default cost
+_DEFAULT_EDGE = -2
+
+# Edge feature index of edge not registered yet
+_UNRESOLVED_EDGE = -1
+
+
+def _unique(ids):
+    """Return unique ids in first occurrence order and inverse indices."""
+    unique, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return unique[order], rank[inverse.reshape(-1)]
+
+
+def viterbi_step(learner, prev_costs, prev_ids, node_costs, node_ids):
+    """Return minimum cost previous nodes of nodes starting at same position.
+
+    costs of all previous and target node pairs are summed in float32 in
+    same order as per edge loop, and first minimum previous node is selected.
+    ids are passed to edge cost matrix in first occurrence order, so new
+    edge features are registered in same order as per edge loop.
+
+    Args:
+        learner (StructuredLearner): learner having edge cost matrix.
+        prev_costs (ndarray): float32 minimum costs of previous nodes.
+        prev_ids (ndarray): edge feature ids of previous nodes.
+        node_costs (ndarray): float32 node costs of target nodes.
+        node_ids (ndarray): edge feature ids of target nodes.
+
+    Return:
+        best (ndarray): previous node index of each target node.
+        costs (ndarray): float32 minimum cost of each target node.
+        reachable (ndarray): target node has minimum cost less than sys.maxsize.
+    """
+    prev_unique, prev_inverse = _unique(prev_ids)
+    node_unique, node_inverse = _unique(node_ids)
+    edge_costs = learner.get_edge_cost_matrix(prev_unique, node_unique)[prev_inverse]
+    best = np.empty(len(node_costs), dtype=np.int64)
+    costs = np.empty(len(node_costs), dtype=np.float32)
+    step = max(1, VITERBI_BLOCK_SIZE // max(1, len(prev_costs)))
+    for b in range(0, len(node_costs), step):
+        total = prev_costs[:, None] + edge_costs[:, node_inverse[b:b + step]] + node_costs[b:b + step]
+        best[b:b + step] = total.argmin(axis=0)
+        costs[b:b + step] = total[best[b:b + step], np.arange(total.shape[1])]
+    return best, costs, costs < sys.maxsize
+
 
 class SearchShortestPathError(Exception):
     """Shortest path search error"""
@@ -16,27 +72,37 @@ class SearchShortestPathError(Exception):
 
 
 class Node(object):
-    """Graph Node Object."""
+    """Graph Node Object.
+
+    nodes are hashed and compared by identity. use node_equal for
+    structural comparison.
+    """
+    __slots__ = ('start_pos', 'word', 'cost', 'prev')
+
     def __init__(self, start_pos, word):
         self.start_pos = start_pos
         self.word = word
         self.cost = 0
         self.prev = None
 
-    def __eq__(self, other):
-        return (
-            self.start_pos == other.start_pos and
-            self.word == other.word and
-            self.cost == other.cost and
-            self.prev == other.prev
-        )
 
-    def __hash__(self):
-        return hash((
-            self.start_pos,
-            self.word,
-            self.cost,
-            self.prev))
+def node_equal(a, b):
+    """Return nodes have same positions, words and costs on whole previous nodes chain.
+
+    Args:
+        a (Node): node object.
+        b (Node): node object.
+
+    Return:
+        equal (Bool): nodes are structurally equal.
+    """
+    while a is not None and b is not None:
+        if a is b:
+            return True
+        if a.start_pos != b.start_pos or a.word != b.word or a.cost != b.cost:
+            return False
+        a, b = a.prev, b.prev
+    return a is b
 
 
 class Path(object):
@@ -68,14 +134,16 @@ class Graph(object):
         self._learner = l
 
     @classmethod
-    def construct_graph(cls, prefix_searcher, string_list, string, beam_width=None):
+    def construct_graph(cls, prefix_searcher, string_list, string, beam_width=None, spans=None):
         """Construct convert graph.
 
         Args:
-            prefix_searcher (TrieBase): trie data
-            string_list (Hash[Tuple[String], List[String]]): string to string dictionary.
-            string (Tuple[String]): target string.
+            prefix_searcher (DoubleArray): trie data
+            string_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+                tuple keys are also available with not packed trie.
+            string (bytes): target packed tones.
             beam_width (Int): max prefix size.
+            spans (Iterable[Tuple[Int, Int, Int]]): precomputed all_prefix_search(string) results.
 
         Return:
             graph (Graph): new graph object.
@@ -88,18 +156,26 @@ class Graph(object):
         g.EOS = Node(len(string), "<EOS>")
         g.nodes[len(string) + 1] = [g.EOS]
 
-        for i in range(len(string)):
-            words = prefix_searcher.prefix_search(string[i:])
-            for s in words:
-                sl = string_list[s]
-                if beam_width:
-                    sl = sl if len(sl) <= beam_width else random.sample(sl, beam_width)
-                g.nodes[i + len(s)].extend([Node(i, str(w)) for w in sl])
+        if spans is None:
+            spans = prefix_searcher.all_prefix_search(string)
+        for start, end, word_id in spans:
+            sl = string_list[prefix_searcher.key(word_id)]
+            if beam_width:
+                sl = sl if len(sl) <= beam_width else random.sample(sl, beam_width)
+            g.nodes[end].extend([Node(start, str(w)) for w in sl])
 
         return g
 
     def _calculate_min_cost(self):
         """Calculate minimum node cost by viterbi algorithme."""
+        edge_ids = [self._learner.get_edge_ids(nodes) for nodes in self.nodes]
+        if any(ids is None for ids in edge_ids):
+            self._calculate_min_cost_by_loop()
+        else:
+            self._calculate_min_cost_by_matrix(edge_ids)
+
+    def _calculate_min_cost_by_loop(self):
+        """Calculate minimum node cost by viterbi algorithme with per edge costs."""
         N = len(self.nodes)
 
         for i in range(1, N):
@@ -113,6 +189,42 @@ class Graph(object):
                         node.cost = cost
                         node.prev = prev
 
+    def _calculate_min_cost_by_matrix(self, edge_ids):
+        """Calculate minimum node cost by viterbi algorithme with edge cost matrices.
+
+        nodes ending at same position are processed together with
+        viterbi_step, so results are same as _calculate_min_cost_by_loop.
+
+        Args:
+            edge_ids (List[ndarray]): edge feature ids of nodes on each position.
+        """
+        N = len(self.nodes)
+        costs = [None] * N
+        costs[0] = np.array([n.cost for n in self.nodes[0]], dtype=np.float32)
+
+        for i in range(1, N):
+            nodes = self.nodes[i]
+            node_costs = np.array([self._learner.get_node_cost(n) for n in nodes], dtype=np.float32)
+            starts = np.array([n.start_pos for n in nodes], dtype=np.int64)
+            column = np.full(len(nodes), MAX_COST, dtype=np.float32)
+            reachable = np.zeros(len(nodes), dtype=bool)
+
+            for start in np.unique(starts):
+                prevs = self.nodes[start]
+                if len(prevs) == 0:
+                    continue
+                members = np.flatnonzero(starts == start)
+                best, best_costs, ok = viterbi_step(
+                    self._learner, costs[start], edge_ids[start], node_costs[members], edge_ids[i][members])
+                column[members[ok]] = best_costs[ok]
+                reachable[members[ok]] = True
+                for k, j in zip(members[ok], best[ok]):
+                    nodes[k].prev = prevs[j]
+
+            for k, node in enumerate(nodes):
+                node.cost = column[k] if reachable[k] else sys.maxsize
+            costs[i] = column
+
     def search_nbest_path(self, N, beam_width=None):
         """Return graph n-bet path by A* algorithme.
 
@@ -137,7 +249,7 @@ class Graph(object):
         # Search N-best paths by A* algorithme.
         while count != N and len(queue) != 0:
             path = heapq.heappop(queue)[1]
-            if path.words[0] == self.BOS:
+            if path.words[0] is self.BOS:
                 # Add one of path to results
                 paths.append(path.words[1:])
                 count += 1
@@ -167,7 +279,7 @@ class Graph(object):
         self._calculate_min_cost()
         node = self.EOS
         result = []
-        while node != self.BOS:
+        while node is not self.BOS:
             result.insert(0, node)
             node = node.prev
             if node is None:
@@ -183,6 +295,16 @@ class StructuredLearner(object):
         self._w = np.ones((self._N, ), dtype=np.float32) * self._default_cost
         self._feature2index = {}
         self._index2feature = []
+        self._version = 0
+
+    @property
+    def version(self):
+        """Change nums of weights and feature ids."""
+        return getattr(self, '_version', 0)
+
+    def _touch(self):
+        """Mark weights or feature ids changed."""
+        self._version = self.version + 1
 
     @property
     def N(self):
@@ -193,6 +315,7 @@ class StructuredLearner(object):
     def N(self, val):
         self._N = int(val)
         self._w = np.ones((self._N, ), dtype=np.float32) * self._default_cost
+        self._touch()
 
     @property
     def default_cost(self):
@@ -203,6 +326,7 @@ class StructuredLearner(object):
     def default_cost(self, val):
         self._default_cost = int(val)
         self._w = np.ones((self._N, ), dtype=np.float32) * self._default_cost
+        self._touch()
 
     def construct_feature(self, features):
         """Construct feature dictionary.
@@ -214,6 +338,7 @@ class StructuredLearner(object):
             if len(self._index2feature) < self._N:
                 self._index2feature.append(f)
                 self._feature2index[f] = len(self._index2feature) - 1
+        self._touch()
 
     def get_node_feature(self, node):
         """Return node feature.
@@ -281,6 +406,33 @@ class StructuredLearner(object):
 
         return self._w[self._feature2index[feature]]
 
+    def get_edge_ids(self, nodes):
+        """Return edge feature ids of nodes.
+
+        edge cost is given by previous and target node id pair.
+        base learner does not have ids, then costs are calculated per edge.
+
+        Args:
+            nodes (List[Node]): target node objects.
+
+        Return:
+            ids (ndarray): edge feature ids. None when not supported.
+        """
+        return None
+
+    def get_edge_cost_matrix(self, prev_ids, node_ids):
+        """Return edge costs of all id pairs.
+
+        Args:
+            prev_ids (ndarray): previous node edge feature ids.
+            node_ids (ndarray): target node edge feature ids.
+
+        Return:
+            costs (ndarray): float32 costs of shape (len(prev_ids), len(node_ids)).
+                None when not supported.
+        """
+        return None
+
     def update_feature(self, feature, is_true):
         """Update feature.
 
@@ -293,6 +445,7 @@ class StructuredLearner(object):
             self._w[self._feature2index[feature]] += updated_val
             if self._w[self._feature2index[feature]] < 0:
                 self._w[self._feature2index[feature]] = 0
+            self._touch()
 
     def train(self, strings, golds):
         """Training learnier.
@@ -309,6 +462,19 @@ class StructuredPerceptron(StructuredLearner):
         self._epochs = 1000
         self._vocabs = set()
         self._word2pos = dict()
+        self._reset_edge_index()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_edge_index' not in state:
+            self._reset_edge_index()
+
+    def _reset_edge_index(self):
+        """Clear part-of-speech ids and cached edge feature indices."""
+        self._pos2id = {}
+        self._pos_names = []
+        self._edge_index = np.empty((0, 0), dtype=np.int64)
+        self._touch()
 
     @property
     def epochs(self):
@@ -356,6 +522,73 @@ class StructuredPerceptron(StructuredLearner):
 
         return p + '_' + n
 
+    def construct_feature(self, features):
+        """Construct feature dictionary.
+
+        Args:
+            features (List[String]): feature string list.
+        """
+        super().construct_feature(features)
+        self._reset_edge_index()
+
+    def get_edge_ids(self, nodes):
+        """Return part-of-speech ids of nodes.
+
+        Args:
+            nodes (List[Node]): target node objects.
+
+        Return:
+            ids (ndarray): part-of-speech ids.
+        """
+        ids = np.empty(len(nodes), dtype=np.int64)
+        for k, node in enumerate(nodes):
+            p = self._word2pos.get(node.word, UNKNOW_WORD)
+            i = self._pos2id.get(p)
+            if i is None:
+                i = self._pos2id[p] = len(self._pos_names)
+                self._pos_names.append(p)
+            ids[k] = i
+        return ids
+
+    def _get_edge_index(self, feature):
+        """Return feature index of edge feature and register it like get_edge_cost."""
+        if UNKNOW_WORD in feature:
+            return _DEFAULT_EDGE
+        if feature not in self._feature2index:
+            if len(self._index2feature) < self._N:
+                self._index2feature.append(feature)
+                self._feature2index[feature] = len(self._index2feature) - 1
+            else:
+                return _UNRESOLVED_EDGE
+        return self._feature2index[feature]
+
+    def get_edge_cost_matrix(self, prev_ids, node_ids):
+        """Return edge costs of all part-of-speech id pairs.
+
+        edge feature indices are cached on dense part-of-speech matrix and
+        costs are read from current weights. new features are registered
+        target id major like per edge loop, so features registered under
+        feature nums limit are same as get_edge_cost.
+
+        Args:
+            prev_ids (ndarray): previous node part-of-speech ids.
+            node_ids (ndarray): target node part-of-speech ids.
+
+        Return:
+            costs (ndarray): float32 costs of shape (len(prev_ids), len(node_ids)).
+        """
+        size = len(self._pos_names)
+        if len(self._edge_index) < size:
+            index = np.full((size, size), _UNRESOLVED_EDGE, dtype=np.int64)
+            index[:len(self._edge_index), :len(self._edge_index)] = self._edge_index
+            self._edge_index = index
+
+        index = self._edge_index[np.ix_(prev_ids, node_ids)]
+        for b, a in zip(*np.nonzero(index.T == _UNRESOLVED_EDGE)):
+            p, n = prev_ids[a], node_ids[b]
+            index[a, b] = self._edge_index[p, n] = self._get_edge_index(self._pos_names[p] + '_' + self._pos_names[n])
+        return np.where(index >= 0, self._w[np.maximum(index, 0)], np.float32(self._default_cost))
+
     def train(self, train_data, prefix_searcher, string_list, word2pos):
         """Construct convert graph.
 
@@ -375,6 +608,7 @@ class StructuredPerceptron(StructuredLearner):
             feature = self.get_node_feature(Node(-1, v))
             self._index2feature.append(feature)
             self._feature2index[feature] = len(self._index2feature) - 1
+        self._reset_edge_index()
 
         for _ in range(self._epochs):
             for string, gold in train_data:
@@ -403,3 +637,147 @@ class StructuredPerceptron(StructuredLearner):
                             self.update_feature(self.get_edge_feature(Node(-1, gold[i]), g.EOS), True)
                         else:
                             self.update_feature(self.get_edge_feature(Node(-1, gold[i-1]), Node(-1, gold[i])), True)
+
+
+class CompiledPerceptron(StructuredLearner):
+    """Inference only form of trained StructuredPerceptron.
+
+    part-of-speech tags are interned to ids, node costs are kept per word
+    and edge costs are kept on dense part-of-speech matrix, so costs are
+    read without building feature strings.
+    """
+    def __init__(self, words, word_pos, node_costs, pos_names, edge_costs, default_cost):
+        """Initialize compiled learner.
+
+        Args:
+            words (List[String]): vocabulary words.
+            word_pos (ndarray): part-of-speech id of each word.
+            node_costs (ndarray): float32 node cost of each word.
+            pos_names (List[String]): part-of-speech tags. last one is unknown tag.
+            edge_costs (ndarray): float32 edge costs of shape (len(pos_names), len(pos_names)).
+            default_cost (Int): cost of unknown words.
+        """
+        super().__init__()
+        self._default_cost = default_cost
+        self._word2id = {w: i for i, w in enumerate(words)}
+        self._word_pos = word_pos
+        self._node_costs = node_costs
+        self.pos_names = pos_names
+        self._unknown_pos = len(pos_names) - 1
+        self._edge_costs = edge_costs
+
+    @classmethod
+    def compile(cls, learner):
+        """Return compiled form of trained learner.
+
+        costs are same as learner.get_node_cost and learner.get_edge_cost.
+
+        Args:
+            learner (StructuredPerceptron): trained learner.
+
+        Return:
+            compiled (CompiledPerceptron): compiled learner.
+        """
+        words = sorted(learner._vocabs | set(learner._word2pos))
+        pos_names = sorted(set(learner._word2pos.values())) + [UNKNOW_WORD]
+        pos2id = {p: i for i, p in enumerate(pos_names)}
+        default_cost = np.float32(learner.default_cost)
+
+        def cost(feature):
+            if UNKNOW_WORD in feature or feature not in learner._feature2index:
+                return default_cost
+            return learner._w[learner._feature2index[feature]]
+
+        word_pos = np.array([pos2id[learner._word2pos.get(w, UNKNOW_WORD)] for w in words], dtype=np.int32)
+        node_costs = np.array([cost(learner.get_node_feature(Node(-1, w))) for w in words], dtype=np.float32)
+        edge_costs = np.array([[cost(p + '_' + n) for n in pos_names] for p in pos_names], dtype=np.float32)
+        return cls(words, word_pos, node_costs, pos_names, edge_costs, learner.default_cost)
+
+    def save(self, path):
+        """Save compiled learner to flat binary file.
+
+        Args:
+            path (String): output file path.
+        """
+        words = sorted(self._word2id, key=self._word2id.get)
+        arrayfile.save(path, {
+            'words': array('B', '\n'.join(words).encode('utf-8')),
+            'word_pos': array('i', self._word_pos.tobytes()),
+            'node_costs': array('f', self._node_costs.tobytes()),
+            'edge_costs': array('f', self._edge_costs.tobytes()),
+        }, {'pos': self.pos_names, 'word_num': len(words), 'default_cost': self._default_cost})
+
+    @classmethod
+    def load(cls, path):
+        """Load compiled learner from flat binary file.
+
+        Args:
+            path (String): input file path.
+
+        Return:
+            compiled (CompiledPerceptron): loaded learner.
+        """
+        arrays, meta, buf = arrayfile.load(path)
+        words = bytes(arrays['words']).decode('utf-8').split('\n') if meta['word_num'] else []
+        size = len(meta['pos'])
+        ret = cls(
+            words,
+            np.frombuffer(arrays['word_pos'], dtype=np.int32),
+            np.frombuffer(arrays['node_costs'], dtype=np.float32),
+            meta['pos'],
+            np.frombuffer(arrays['edge_costs'], dtype=np.float32).reshape(size, size),
+            meta['default_cost'])
+        ret._buffer = buf
+        return ret
+
+    def _pos_id(self, word):
+        """Return part-of-speech id of word."""
+        i = self._word2id.get(word)
+        return self._unknown_pos if i is None else self._word_pos[i]
+
+    def get_node_cost(self, node):
+        """Return node cost.
+
+        Args:
+            node (Node): target node object.
+
+        Return:
+            cost (Float): node cost value.
+        """
+        i = self._word2id.get(node.word)
+        return self._default_cost if i is None else self._node_costs[i]
+
+    def get_edge_cost(self, prev, node):
+        """Return prev to node edge cost.
+
+        Args:
+            prev (Node): previous node object.
+            node (Node): target node object.
+
+        Return:
+            cost (Float): edge cost value.
+        """
+        return self._edge_costs[self._pos_id(prev.word), self._pos_id(node.word)]
+
+    def get_edge_ids(self, nodes):
+        """Return part-of-speech ids of nodes.
+
+        Args:
+            nodes (List[Node]): target node objects.
+
+        Return:
+            ids (ndarray): part-of-speech ids.
+        """
+        return np.array([self._pos_id(n.word) for n in nodes], dtype=np.int64)
+
+    def get_edge_cost_matrix(self, prev_ids, node_ids):
+        """Return edge costs of all part-of-speech id pairs.
+
+        Args:
+            prev_ids (ndarray): previous node part-of-speech ids.
+            node_ids (ndarray): target node part-of-speech ids.
+
+        Return:
+            costs (ndarray): float32 costs of shape (len(prev_ids), len(node_ids)).
+        """
+        return self._edge_costs[np.ix_(prev_ids, node_ids)]
@@ -0,0 +1,250 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Compact lattice of candidate word groups."""
+import heapq
+import random
+import numpy as np
+from py_rap_gen import graph
+
+
+BOS = "<BOS>"
+EOS = "<EOS>"
+
+
+class Lexicon(object):
+    """Word id arrays of tone keys with learner costs of words.
+
+    candidate id arrays are shared by all lattices, so lattice construction
+    does not copy words. costs are read from learner once, so learner must
+    not be trained after lexicon construction.
+    """
+    def __init__(self, string_list, learner):
+        """Initialize lexicon object.
+
+        Args:
+            string_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+            learner (StructuredLearner): learner having edge cost matrix.
+        """
+        self.string_list = string_list
+        self.learner = learner
+        self.version = learner.version
+        self._word_ids = {}
+        self.candidates = {}
+        for key, words in string_list.items():
+            self.candidates[key] = self._intern(words)
+        self.words = list(self._word_ids) + [BOS, EOS]
+        self.bos_id = len(self.words) - 2
+        self.eos_id = len(self.words) - 1
+
+        nodes = [graph.Node(-1, w) for w in self.words]
+        self.node_costs = np.array([learner.get_node_cost(n) for n in nodes], dtype=np.float32)
+        self.edge_ids = learner.get_edge_ids(nodes)
+        if self.edge_ids is None:
+            raise ValueError("Learner does not have edge cost matrix: " + type(learner).__name__)
+
+    def _intern(self, words):
+        """Return word id array of words adding new words to word ids."""
+        return np.array([self._word_ids.setdefault(str(w), len(self._word_ids)) for w in words], dtype=np.int32)
+
+    def add(self, key, words):
+        """Add candidate words of tone key inserted after construction.
+
+        Args:
+            key (bytes): packed tones.
+            words (List[String]): candidate words of key.
+
+        Return:
+            ids (ndarray): word id array of key.
+        """
+        size = len(self._word_ids)
+        ids = self._intern(words)
+        # words added after construction follow BOS and EOS ids
+        ids[ids >= self.bos_id] += 2
+        new_words = list(self._word_ids)[size:]
+        if new_words:
+            nodes = [graph.Node(-1, w) for w in new_words]
+            self.words.extend(new_words)
+            self.node_costs = np.concatenate([
+                self.node_costs, np.array([self.learner.get_node_cost(n) for n in nodes], dtype=np.float32)])
+            self.edge_ids = np.concatenate([self.edge_ids, self.learner.get_edge_ids(nodes)])
+        self.candidates[key] = ids
+        return ids
+
+
+class Lattice(object):
+    """Lattice storing one candidate word group per matched span.
+
+    costs and back pointers are kept on arrays per end position and Node
+    objects are built only for result paths.
+    """
+    def __init__(self, lexicon, learner, length):
+        """Initialize empty lattice.
+
+        Args:
+            lexicon (Lexicon): candidate words and costs.
+            learner (StructuredLearner): learner given lexicon costs.
+            length (Int): target tones length.
+        """
+        self._lexicon = lexicon
+        self._learner = learner
+        self.length = length
+        self.groups = [[] for _ in range(length + 2)]  # (start, word ids) groups on each end position
+        self.groups[0] = [(0, np.array([lexicon.bos_id], dtype=np.int32))]
+        self.groups[length + 1] = [(length, np.array([lexicon.eos_id], dtype=np.int32))]
+        self._ids = None
+        self._starts = None
+        self._costs = None
+        self._backs = None
+
+    @classmethod
+    def construct(cls, prefix_searcher, lexicon, learner, string, beam_width=None, spans=None):
+        """Construct lattice.
+
+        Args:
+            prefix_searcher (DoubleArray): trie data
+            lexicon (Lexicon): candidate words and costs.
+            learner (StructuredLearner): learner given lexicon costs.
+            string (bytes): target packed tones.
+            beam_width (Int): max prefix size.
+            spans (Iterable[Tuple[Int, Int, Int]]): precomputed all_prefix_search(string) results.
+
+        Return:
+            lattice (Lattice): new lattice object.
+        """
+        if lexicon.learner is not learner or lexicon.version != learner.version:
+            raise ValueError("Lexicon costs are not of current learner")
+        lattice = cls(lexicon, learner, len(string))
+        if spans is None:
+            spans = prefix_searcher.all_prefix_search(string)
+        for start, end, word_id in spans:
+            key = prefix_searcher.key(word_id)
+            ids = lexicon.candidates.get(key)
+            if ids is None:
+                ids = lexicon.add(key, lexicon.string_list.get(key, []))
+            if beam_width and len(ids) > beam_width:
+                ids = ids[random.sample(range(len(ids)), beam_width)]
+            lattice.groups[end].append((start, ids))
+        return lattice
+
+    def __len__(self):
+        """Candidate word nums."""
+        return sum(len(ids) for groups in self.groups for _, ids in groups)
+
+    def _calculate_min_cost(self):
+        """Calculate minimum costs and back pointers by viterbi algorithme."""
+        N = len(self.groups)
+        empty = np.empty(0, dtype=np.int64)
+        self._ids = [np.concatenate([ids for _, ids in groups]) if groups else empty for groups in self.groups]
+        self._starts = [
+            np.repeat([s for s, _ in groups], [len(ids) for _, ids in groups]) if groups else empty
+            for groups in self.groups]
+        self._costs = [None] * N
+        self._backs = [None] * N
+        self._costs[0] = np.zeros(1, dtype=np.float32)
+        self._backs[0] = np.full(1, -1, dtype=np.int64)
+
+        edge_ids = self._lexicon.edge_ids
+        for i in range(1, N):
+            ids = self._ids[i]
+            starts = self._starts[i]
+            node_costs = self._lexicon.node_costs[ids]
+            column = np.full(len(ids), graph.MAX_COST, dtype=np.float32)
+            backs = np.full(len(ids), -1, dtype=np.int64)
+            for start in np.unique(starts):
+                prev_ids = self._ids[start]
+                if len(prev_ids) == 0:
+                    continue
+                members = np.flatnonzero(starts == start)
+                best, best_costs, ok = graph.viterbi_step(
+                    self._learner, self._costs[start], edge_ids[prev_ids], node_costs[members], edge_ids[ids[members]])
+                column[members[ok]] = best_costs[ok]
+                backs[members[ok]] = best[ok]
+            self._costs[i] = column
+            self._backs[i] = backs
+
+    def _node(self, position, index):
+        """Return node object of candidate."""
+        node = graph.Node(int(self._starts[position][index]), self._lexicon.words[self._ids[position][index]])
+        node.cost = self._costs[position][index]
+        return node
+
+    def _nodes(self, elements):
+        """Return linked node objects of path elements from BOS."""
+        prev = graph.Node(0, BOS)
+        nodes = []
+        for position, index in elements:
+            node = self._node(position, index)
+            node.prev = prev
+            nodes.append(node)
+            prev = node
+        return nodes
+
+    def search_shortest_path(self):
+        """Return lattice shortest path.
+
+        Return:
+            path (List[Node]): node list constructs shortest path.
+        """
+        self._calculate_min_cost()
+        position, index = self.length + 1, 0
+        elements = []
+        while position != 0:
+            if self._backs[position][index] < 0:
+                raise graph.SearchShortestPathError()
+            elements.insert(0, (position, index))
+            position, index = int(self._starts[position][index]), int(self._backs[position][index])
+
+        return self._nodes(elements)
+
+    def search_nbest_path(self, N, beam_width=None):
+        """Return lattice n-bet path by A* algorithme.
+
+        Args:
+            N (Int): return path nums
+            beam_width (Int): max next path size
+
+        Return:
+            paths (List[List[Node]]): n-best short path node.
+        """
+        paths = []
+        count = 0
+        queue = []
+
+        # Initialize queue
+        eos = graph.Path()
+        eos.start_pos = self.length
+        eos.words = [(self.length + 1, 0)]
+        heapq.heappush(queue, (eos.f_cost, eos))
+        self._calculate_min_cost()
+
+        edge_ids = self._lexicon.edge_ids
+        # Search N-best paths by A* algorithme.
+        while count != N and len(queue) != 0:
+            path = heapq.heappop(queue)[1]
+            position, index = path.words[0]
+            if position == 0:
+                # Add one of path to results
+                paths.append(self._nodes(path.words[1:]))
+                count += 1
+                continue
+
+            start = path.start_pos
+            prevs = np.arange(len(self._ids[start]))
+            if beam_width:
+                prevs = prevs if len(prevs) < beam_width else np.array(random.sample(range(len(prevs)), beam_width))
+            prev_ids = self._ids[start][prevs]
+            node_ids = edge_ids[self._ids[position][index:index + 1]]
+            prev_unique, prev_inverse = np.unique(edge_ids[prev_ids], return_inverse=True)
+            edge_costs = self._learner.get_edge_cost_matrix(prev_unique, node_ids)[prev_inverse, 0]
+            node_costs = self._lexicon.node_costs[prev_ids]
+            g_costs = path.g_cost + edge_costs + node_costs
+            f_costs = g_costs + self._costs[start][prevs] - node_costs
+            for k, prev in enumerate(prevs):
+                p = graph.Path()
+                p.g_cost = g_costs[k]
+                p.f_cost = f_costs[k]
+                p.words = [(start, int(prev))] + path.words
+                p.start_pos = int(self._starts[start][prev])
+                heapq.heappush(queue, (p.f_cost, p))
+
+        return paths
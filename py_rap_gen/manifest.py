@@ -0,0 +1,132 @@
+# Limitations under the MIT License.
+# Copyright 2019 Katsuya Shimabukuro.
+"""Stage manifest for skipping up-to-date preprocessing stages."""
+import os
+import json
+import hashlib
+
+
+# File read size for hashing
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _file_hash(path):
+    """Return sha256 hex digest of file contents."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _dir_hash(path):
+    """Return sha256 hex digest of file names, sizes and modified times in directory."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            h.update('{}\t{}\t{}\n'.format(os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    return h.hexdigest()
+
+
+class Manifest(object):
+    """Record of stage inputs, parameters and outputs saved as json.
+
+    file hashes are reused while file size and modified time are unchanged,
+    so large inputs are hashed once.
+    """
+    def __init__(self, path):
+        """Initialize manifest object.
+
+        Args:
+            path (String): manifest json file path.
+        """
+        self.path = path
+        self.stages = {}
+        self._signatures = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.stages = data.get('stages', {})
+            self._signatures = data.get('signatures', {})
+
+    def save(self):
+        """Write manifest atomically."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as w:
+            json.dump({'stages': self.stages, 'signatures': self._signatures}, w, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def signature(self, path):
+        """Return content hash of file or directory.
+
+        Args:
+            path (String): target path.
+
+        Return:
+            signature (String): content hash. None when path does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        if os.path.isdir(path):
+            return _dir_hash(path)
+        stat = os.stat(path)
+        cached = self._signatures.get(path)
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+            return cached['sha256']
+        digest = _file_hash(path)
+        self._signatures[path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def is_fresh(self, name, inputs, outputs, params):
+        """Return stage outputs are made from current inputs and parameters.
+
+        Args:
+            name (String): stage name.
+            inputs (List[String]): input paths.
+            outputs (List[String]): output paths.
+            params (Hash[String, Any]): json serializable stage parameters.
+
+        Return:
+            fresh (Bool): stage can be skipped.
+        """
+        record = self.stages.get(name)
+        if record is None or record['params'] != params:
+            return False
+        if record['inputs'] != {p: self.signature(p) for p in inputs}:
+            return False
+        current = {p: self.signature(p) for p in outputs}
+        return all(s is not None for s in current.values()) and record['outputs'] == current
+
+    def run(self, name, func, inputs=(), outputs=(), params=None):
+        """Run stage unless its outputs are fresh, then record it.
+
+        Args:
+            name (String): stage name.
+            func (Callable[[], Bool]): stage function. false result is failure.
+            inputs (List[String]): input paths.
+            outputs (List[String]): output paths.
+            params (Hash[String, Any]): json serializable stage parameters.
+
+        Return:
+            ret (Bool): stage succeeded or skipped.
+        """
+        params = params or {}
+        if self.is_fresh(name, inputs, outputs, params):
+            print("Skip stage:", name)
+            return True
+
+        print("Run stage:", name)
+        self.stages.pop(name, None)
+        self.save()
+        ret = func()
+        if ret is False:
+            return False
+        self.stages[name] = {
+            'inputs': {p: self.signature(p) for p in inputs},
+            'outputs': {p: self.signature(p) for p in outputs},
+            'params': params}
+        self.save()
+        return True
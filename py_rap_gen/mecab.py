@@ -1,51 +1,71 @@
 # Limitations under the MIT License.
 # Copyright 2019 Katsuya Shimabukuro.
 
+import os
+import threading
 import MeCab
 
-tagger = MeCab.Tagger("")
+DEFAULT_ARGS = ""
+
+_local = threading.local()
+
+
+def get_tagger(args=DEFAULT_ARGS):
+    """Return tagger for current process and thread.
+
+    taggers are created lazily and reused, so dictionary is loaded once per worker.
+
+    Args:
+        args (str): mecab tagger arguments like "-d ./lib".
+    Return:
+        tagger (MeCab.Tagger): tagger owned by current process and thread.
+    """
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        # forked child must not share parent tagger.
+        _local.pid = pid
+        _local.taggers = {}
+    tagger = _local.taggers.get(args)
+    if tagger is None:
+        tagger = MeCab.Tagger(args)
+        _local.taggers[args] = tagger
+    return tagger
 
 
 class Word(object):
     """Word class from mecab output."""
 
-    def __init__(self, output):
-        """Initialize mecab one word class from mecab one line."""
-        pos, pos1, surface, base, yomi, pronounce = self._parse_mecab_output(output)
-        self.pos = pos
-        self.pos1 = pos1
+    __slots__ = ('surface', 'feature', 'pos', 'pos1', 'base', 'yomi', 'pronounce')
+
+    def __init__(self, surface, feature):
+        """Initialize mecab one word class from surface and feature csv."""
+        parts = feature.split(",")
         self.surface = surface
-        self.base = base
-        self.yomi = yomi
-        self.pronounce = pronounce
+        self.feature = feature
+        self.pos = parts[0]
+        self.pos1 = parts[1]
+        self.base = parts[6] if '*' != parts[6] else surface
+        self.yomi = parts[7] if len(parts) >= 8 else surface
+        self.pronounce = parts[8] if len(parts) >= 9 else surface
 
     @classmethod
-    def _parse_mecab_output(cls, output):
-        """Return mecab one word parsing results.
+    def from_output(cls, output):
+        """Return mecab one word class from mecab one line.
 
         Args:
             output (str): mecab one line.
         Return:
-            pos (str): most import part-of-speech tag.
-            pos1 (str): second import part-of-speech tag.
-            surface (str): word surface format string.
-            base (str): word base format string.
-            yomi (str): word surface yomi string.
-            pronounce (str): word surfade pronounce string.
+            word (Word): word class.
         """
-        surface = output.split("\t")[0].strip()
-        parts = output.split("\t")[1].strip().split(",")
-        pos = parts[0]
-        pos1 = parts[1]
-        base = parts[6] if '*' != parts[6] else surface
-        yomi = parts[7] if len(parts) >= 8 else surface
-        pronounce = parts[8] if len(parts) >= 9 else surface
-        return pos, pos1, surface, base, yomi, pronounce
+        surface, _, feature = output.partition("\t")
+        return cls(surface.strip(), feature.strip())
 
 
 class Sentence(object):
     """Sentence class from mecab output."""
 
+    __slots__ = ('words', )
+
     def __init__(self, output):
         """Initialize mecab one Sentence class from mecab one line."""
         self.words = self._parse_mecab_output(output)
@@ -59,16 +79,35 @@ class Sentence(object):
         Return:
             words (List[Word]): parsing output word class array.
         """
-        words = [Word(line) for line in output.strip().split('\n') if line != 'EOS']
+        words = []
+        for line in output.strip().split('\n'):
+            if line == 'EOS':
+                continue
+            words.append(Word.from_output(line))
         return words
 
 
-def parse(s):
+def parse(s, args=DEFAULT_ARGS):
     """Parsing mecab.
 
     Args:
         s (str): target string.
+        args (str): mecab tagger arguments.
     Return:
         sentence (Sentence): parsed sentence object.
     """
-    return Sentence(tagger.parse(s))
+    return Sentence(get_tagger(args).parse(s))
+
+
+def parse_many(lines, args=DEFAULT_ARGS):
+    """Parsing mecab for each line.
+
+    Args:
+        lines (Iterable[str]): target strings.
+        args (str): mecab tagger arguments.
+    Return:
+        sentences (Iterator[Sentence]): parsed sentence objects.
+    """
+    tagger = get_tagger(args)
+    for line in lines:
+        yield Sentence(tagger.parse(line))
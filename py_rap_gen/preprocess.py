@@ -3,23 +3,73 @@
 """Yomi data preprocessing module.
 """
 import os
+import json
+import time
+import argparse
+import functools
+import itertools
+import collections
+import multiprocessing
 import subprocess
 import pandas as pd
 import pathlib
 import pickle
-import random
+import numpy as np
+from array import array
 from py_rap_gen import tone
 from py_rap_gen import counter
 from py_rap_gen import trie
 from py_rap_gen import graph
 from py_rap_gen import mecab
+from py_rap_gen import manifest
+from py_rap_gen import corpus
 
 TONE_PATH = 'mecab_tone_yomi.pkl'
-PREFIX_SEARCHER_PATH = 'prefix_searcher.pkl'
+PREFIX_SEARCHER_PATH = 'prefix_searcher.bin'
 COUNTER_2GRAM_PATH = 'counter_2gram.pkl'
+WORD_COUNT_PATH = 'word_counts.tsv'
+POS_2GRAM_COUNT_PATH = 'pos_2gram_counts.tsv'
 WORD2POS_PATH = 'word2pos.pkl'
+SAMPLE_PATH = 'train_sample.pkl'
 LEARNER_PATH = 'learner.pkl'
+COMPILED_LEARNER_PATH = 'learner.bin'
 DATA_PATH = 'data'
+CORPUS_PATH = 'data.bin'
+ARTICLES_PATH = 'articles.txt'
+DICTIONARY_PATH = 'lib'
+MANIFEST_PATH = 'preprocess_manifest.json'
+MECAB_ARGS = "-d ./lib"
+
+# Space-Saving counter capacities
+WORD_CAPACITY = 2000000
+POS_2GRAM_CAPACITY = 100000
+
+# Exact counter in memory distinct item limit
+EXACT_MAX_ITEMS = 2000000
+
+# Word nums converted to tones at once
+TONE_CHUNK_SIZE = 1000000
+
+# Training sample line nums
+TRAIN_SAMPLE_SIZE = 100000
+
+# Data line nums fed to counters at once
+SCAN_BATCH_SIZE = 1000
+
+# Line nums tagged by worker at once
+TAG_CHUNK_SIZE = 1000
+
+# Tagged chunk nums between checkpoints
+CHECKPOINT_INTERVAL = 100
+
+# Dictionary csv row nums parsed at once
+DICT_CHUNK_SIZE = 100000
+
+# Mecab dictionary csv columns
+DICT_HEADERS = [
+    "surface", "leftconnection", "rightconnection", "cost",
+    "pos", "pos1", "pos2", "pos3", "conjugation1", "conjugation2",
+    "base", "yomi", "pronounce"]
 
 
 def _build_neologd(path):
@@ -45,22 +95,34 @@ def _install_neologd():
     return True
 
 
-def _preprocess_dict(path):
-    """Extract base and yomi data from mecab dictionary."""
-    headers = [
-        "surface", "leftconnection", "rightconnection", "cost",
-        "pos", "pos1", "pos2", "pos3", "conjugation1", "conjugation2",
-        "base", "yomi", "pronounce"]
-    _dict = None
-    for p in pathlib.Path(path + "/build").glob('**/*.csv'):
+def _read_dict(path, chunk_size=DICT_CHUNK_SIZE):
+    """Yield surface and yomi of mecab dictionary csv files.
+
+    only surface and yomi columns are parsed, chunk_size rows at a time.
+
+    Args:
+        path (String): neologd repository path.
+        chunk_size (Int): csv row nums parsed at once.
+
+    Return:
+        records (Iterator[Tuple[String, String]]): surface and yomi pairs.
+    """
+    for p in sorted(pathlib.Path(path + "/build").glob('**/*.csv')):
         print("Processing:", p)
-        df = pd.read_csv(p, names=headers, header=None)
-        if _dict is None:
-            _dict = df
-        else:
-            _dict = _dict.append(df, ignore_index=True)
-    _dict = _dict[["surface", "yomi"]].to_dict(orient='records')
-    return _dict
+        chunks = pd.read_csv(
+            p, names=DICT_HEADERS, header=None, usecols=['surface', 'yomi'],
+            dtype=str, keep_default_na=False, chunksize=chunk_size)
+        for df in chunks:
+            yield from zip(df['surface'], df['yomi'])
+
+
+def _preprocess_dict(path):
+    """Extract base and yomi data from mecab dictionary.
+
+    Return:
+        records (Iterator[Hash[String, String]]): surface and yomi records.
+    """
+    return ({'surface': surface, 'yomi': yomi} for surface, yomi in _read_dict(path))
 
 
 def _process_syntax(line):
@@ -72,8 +134,18 @@ def _process_syntax(line):
     Return:
         result (String): kana1 + ' ' + pronounce1 + '\t' + kana2 + ' ' + pronounce2 ... sforamted string.
     """
-    mecab.tagger = mecab.MeCab.Tagger("-d ./lib")
-    sentence = mecab.parse(line)
+    return _process_sentence(mecab.parse(line, MECAB_ARGS))
+
+
+def _process_sentence(sentence):
+    """Return kana and pronounce list for parsed sentence.
+
+    Args:
+        sentence (mecab.Sentence): parsed sentence.
+
+    Return:
+        result (String): same format as _process_syntax.
+    """
     result = []
     ret_kana = ""
     ret_pronounce = ""
@@ -113,11 +185,11 @@ def _mix_tone_and_kana(tones, kanas):
     """Return kana and tone mixes list.
 
     Args:
-        tones (List[String]): tone splitted list.
-        kanas (List[String]): kana splitted list.
+        tones (bytes): packed tones.
+        kanas (bytes): packed tones whose last tone is replaced with last kana.
 
     Return:
-        ret (List[Tuple[String]]): kana and tone mixes list.
+        ret (List[bytes]): packed kana and tone mixes list.
     """
     if len(tones) != len(kanas):
         return []
@@ -125,142 +197,498 @@ def _mix_tone_and_kana(tones, kanas):
     ret = []
 
     if len(tones) == 1:
-        ret.append(tuple(tones))
-        ret.append(tuple(kanas))
+        ret.append(tones)
+        ret.append(kanas)
     else:
-        ret.append(tuple(tones[:-1] + [kanas[-1]]))
+        ret.append(kanas)
     if len(tones) >= 4:
-        ret.append(tuple(tones))
+        ret.append(tones)
 
     return ret
 
 
-def _create_tone_list():
-    """Return tone to string dictionary.
+def _file_shards(path, num):
+    """Return byte range shards of file.
+
+    Args:
+        path (String): target file path.
+        num (Int): shard nums.
 
     Return:
-        tone_list (Hash[String, List[String]]): tone to string dictionary.
+        shards (List[Tuple[String, Int, Int]]): path, start and end byte offsets.
     """
+    size = os.path.getsize(path)
+    bounds = [size * i // num for i in range(num + 1)]
+    return [(path, bounds[i], bounds[i + 1]) for i in range(num)]
+
+
+def _read_shard(shard):
+    """Yield lines starting in shard byte range.
 
-    def train_data():
-        with open(DATA_PATH, 'r') as f:
-            for line in f:
-                line = line.strip()
-                words = line.split('\t')
-                words = filter(lambda w: w.strip() != '', words)
-                yield from words
+    Args:
+        shard (Tuple[String, Int, Int]): path, start and end byte offsets.
 
-    def train_data_2gram():
+    Return:
+        lines (Iterator[String]): decoded lines.
+    """
+    path, start, end = shard
+    with open(path, 'rb') as f:
+        if start != 0:
+            # skip line started in previous shard
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode('utf-8')
+
+
+class _CorpusScan(object):
+    """Word counter, 2-gram counter and training sample fed by one data scan.
+
+    each line is splitted once and fed to all of them.
+    """
+    def __init__(self, word_factory, pos_2gram_factory, sample_size=TRAIN_SAMPLE_SIZE):
+        """Initialize scan object.
+
+        Args:
+            word_factory (Callable[[], Counter]): word counter constructor.
+            pos_2gram_factory (Callable[[], Counter]): part-of-speech 2-gram counter constructor.
+            sample_size (Int): training sample line nums.
+        """
+        self.words = word_factory()
+        self.pos_2grams = pos_2gram_factory()
+        self.sample = counter.ReservoirSampler(sample_size)
+
+    def count(self, lines):
+        """Scan data lines.
+
+        Args:
+            lines (Iterable[String]): data lines.
+        """
         g = graph.Graph()
-        with open(DATA_PATH, 'r') as f:
-            for line in f:
-                line = line.strip()
-                words = line.split('\t')
-                words = list(filter(lambda w: w.strip() != '', words))
-                words = [' '.join([g.BOS.word]*3)] + words + [' '.join([g.EOS.word]*3)]
-                yield from [words[i].split()[2] + '_' + words[i+1].split()[2] for i in range(len(words) - 1)]
-
-    lcounter = counter.LossyCounter(epsilon=1e-6)
-    lcounter.count(train_data())
-    lcounter_2gram = counter.LossyCounter(epsilon=1e-7)
-    lcounter_2gram.count(train_data_2gram())
-    print(len(lcounter._items))
-    print(len(lcounter_2gram._items))
+        lines = iter(lines)
+        for batch in iter(lambda: list(itertools.islice(lines, SCAN_BATCH_SIZE)), []):
+            words = []
+            pos_2grams = []
+            sample = []
+            for line in batch:
+                line_words = [w for w in line.strip().split('\t') if w.strip() != '']
+                parts = [w.split() for w in line_words]
+                pos = [g.BOS.word] + [p[2] for p in parts] + [g.EOS.word]
+                words.extend(line_words)
+                pos_2grams.extend([pos[i] + '_' + pos[i + 1] for i in range(len(pos) - 1)])
+                sample.append(parts)
+            self.words.count(words)
+            self.pos_2grams.count(pos_2grams)
+            self.sample.count(sample)
+
+    def merge(self, other):
+        """Merge other scan results.
+
+        Args:
+            other (_CorpusScan): scan to merge.
+        Return:
+            self (_CorpusScan): merged scan.
+        """
+        self.words.merge(other.words)
+        self.pos_2grams.merge(other.pos_2grams)
+        self.sample.merge(other.sample)
+        return self
+
+
+def _counter_factories(counter_type):
+    """Return word and 2-gram counter constructors.
+
+    Args:
+        counter_type (String): 'lossy', 'space_saving' or 'exact'.
+
+    Return:
+        factories (Tuple[Callable, Callable]): word and 2-gram counter constructors.
+    """
+    if counter_type == 'lossy':
+        return (functools.partial(counter.LossyCounter, epsilon=1e-6),
+                functools.partial(counter.LossyCounter, epsilon=1e-7))
+    if counter_type == 'space_saving':
+        return (functools.partial(counter.SpaceSavingCounter, capacity=WORD_CAPACITY),
+                functools.partial(counter.SpaceSavingCounter, capacity=POS_2GRAM_CAPACITY))
+    if counter_type == 'exact':
+        return (functools.partial(counter.ExactCounter, max_items=EXACT_MAX_ITEMS),
+                functools.partial(counter.ExactCounter, max_items=EXACT_MAX_ITEMS))
+    raise ValueError("Unknown counter type: " + str(counter_type))
+
+
+def _create_tone_list(processes=None, counter_type='lossy'):
+    """Return tone to string dictionary.
+
+    words and 2-grams are counted on data file shards in parallel.
+
+    Args:
+        processes (Int): worker process nums. None is cpu count.
+        counter_type (String): 'lossy', 'space_saving' with fixed memory
+            or 'exact' with bounded memory spilling to disk.
+
+    Return:
+        tone_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+        lcounter_2gram (Counter): part-of-speech 2-gram counter.
+        word2pos (Hash[String, String]): word to part-of-speech dictionary.
+        train_data (List[Tuple[bytes, List[String]]]): packed tones and correct words pairs.
+    """
+    shards = _file_shards(DATA_PATH, processes or os.cpu_count())
+    scan = counter.count_parallel(
+        _read_shard, shards, functools.partial(_CorpusScan, *_counter_factories(counter_type)), processes=processes)
+    lcounter = scan.words
+    lcounter_2gram = scan.pos_2grams
+    if counter_type == 'exact':
+        exact_counters = (lcounter, lcounter_2gram)
+        lcounter = lcounter.save(WORD_COUNT_PATH)
+        lcounter_2gram = lcounter_2gram.save(POS_2GRAM_COUNT_PATH)
+        for c in exact_counters:
+            c.close()
 
     tone_list = {}
     word2pos = {}
     count = 0
-    for w in lcounter._items:
-        chars = w.split()[1]
-        tones, kana = tone.convert_tones(chars)
+    words = lcounter.keys()
+    while True:
+        items = [w.split() for w in itertools.islice(words, TONE_CHUNK_SIZE)]
+        if len(items) == 0:
+            break
+        pronounces = [w[1] for w in items]
+        tones, offsets = tone.convert_tones_array(pronounces)
+        kanas, _ = tone.convert_tones_array(pronounces, final_kana=True)
+        for i, w in enumerate(items):
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                count += 1
+                continue
 
-        if len(tones) == 0:
-            count += 1
-            continue
-        if len(tones) != len(kana):
+            _add_word(tone_list, word2pos, w[0], w[2], tones[start:end].tobytes(), kanas[start:end].tobytes())
+    print("Remove Count:", count)
+    print('Total Count:', sum(1 for t in tone_list for _ in tone_list[t]))
+    return tone_list, lcounter_2gram, word2pos, _train_examples(scan.sample.keys())
+
+
+def _create_tone_list_from_corpus(path=CORPUS_PATH, counter_type='exact', sample_size=TRAIN_SAMPLE_SIZE, seed=None):
+    """Return tone to string dictionary from corpus file.
+
+    words are counted on word type ids and tones are read from the corpus
+    without conversion. exact counts are summed on arrays, other counters
+    are fed word type ids and part-of-speech 2-grams of sentence chunks.
+
+    Args:
+        path (String): corpus file path.
+        counter_type (String): 'lossy', 'space_saving' or 'exact'.
+        sample_size (Int): training sample line nums.
+        seed (Int): sampling random seed.
+
+    Return:
+        tone_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+        lcounter_2gram (Counter): part-of-speech 2-gram counter.
+        word2pos (Hash[String, String]): word to part-of-speech dictionary.
+        train_data (List[Tuple[bytes, List[String]]]): packed tones and correct words pairs.
+    """
+    data = corpus.Corpus.load(path)
+    if counter_type == 'exact':
+        type_ids = np.flatnonzero(data.count_types())
+        lcounter_2gram = collections.Counter(data.count_pos_2grams())
+    else:
+        word_factory, pos_2gram_factory = _counter_factories(counter_type)
+        lcounter = word_factory()
+        for tokens, _ in data.chunks(corpus.CHUNK_SIZE):
+            lcounter.count(tokens.tolist())
+        lcounter_2gram = pos_2gram_factory()
+        names = np.array(data.pos_2gram_names(), dtype=object)
+        for ids in data.pos_2gram_chunks(corpus.CHUNK_SIZE):
+            lcounter_2gram.count(names[ids])
+        type_ids = sorted(lcounter.keys())
+
+    tone_list = {}
+    word2pos = {}
+    count = 0
+    for type_id in type_ids:
+        start, end = data.tone_offsets[type_id], data.tone_offsets[type_id + 1]
+        if start == end:
             count += 1
             continue
-
-        word = w.split()[0]
-        if word not in word2pos:
-            word2pos[word] = w.split()[2]
-            for t in _mix_tone_and_kana(tones, kana):
-                if t not in tone_list:
-                    tone_list[t] = []
-                tone_list[t].append(word)
+        _add_word(tone_list, word2pos, data.surface(type_id), data.pos(type_id), data.tones(type_id), data.kanas(type_id))
     print("Remove Count:", count)
-    print('Total Count:', sum(1 for t in tone_list for l in tone_list[t]))
-    return tone_list, lcounter_2gram, word2pos
+    print('Total Count:', sum(1 for t in tone_list for _ in tone_list[t]))
+
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(data), min(sample_size, len(data)), replace=False))
+    train_data = [e for e in (data.train_example(i) for i in indices) if e is not None]
+    return tone_list, lcounter_2gram, word2pos, train_data
 
 
-def _train_graph(prefix_searcher, tone_list, lcounter_2gram, word2pos):
+def _add_word(tone_list, word2pos, word, pos, tones, kanas):
+    """Add first seen word to tone list and word pos dictionary.
+
+    Args:
+        tone_list (Hash[bytes, List[String]]): packed tones to string dictionary.
+        word2pos (Hash[String, String]): word to part-of-speech dictionary.
+        word (String): word surface.
+        pos (String): word part-of-speech.
+        tones (bytes): packed tones of word.
+        kanas (bytes): packed tones of word whose last tone is replaced with last kana.
+    """
+    if word in word2pos:
+        return
+    word2pos[word] = pos
+    for t in _mix_tone_and_kana(tones, kanas):
+        if t not in tone_list:
+            tone_list[t] = []
+        tone_list[t].append(word)
+
+
+def _train_examples(sample):
+    """Return training data from sample lines.
+
+    Args:
+        sample (List[List[List[String]]]): splitted words of sample lines.
+
+    Return:
+        train_data (List[Tuple[bytes, List[String]]]): packed tones and correct words pairs.
+    """
+    train_data = []
+    for parts in sample:
+        parts = [p for p in parts if all(c in tone.char_table for c in p[1])]
+        t = array('B')
+        ws = []
+        for p in parts:
+            tones, kanas = tone.convert_tones(p[1], packed=True)
+            if len(tones) == 0:
+                continue
+            tones[-1] = kanas[-1]
+            t.extend(tones)
+            ws.append(p[0])
+        if len(t) != 0:
+            train_data.append((t.tobytes(), ws))
+    return train_data
+
+
+def _train_graph(prefix_searcher, tone_list, lcounter_2gram, word2pos, train_data):
     """Training Structured learner.
 
     Return:
         learner (StructuredLearner): Pretrained learner object.
     """
-    class iteratorWrapper():
-        def __init__(self, func):
-            self._func = func
-
-        def __iter__(self):
-            return self._func()
-
-    def train_data():
-        count = 0
-        with open(DATA_PATH, 'r') as f:
-            for line in f:
-                if random.random() > 0.01:
-                    continue
-                count += 1
-                line = line.strip()
-                words = list(filter(lambda w: w.strip() != '', line.split('\t')))
-                words = list(filter(lambda w: all(any(c in t for t in tone.tone_types.values()) for c in w.split()[1]), words))
-                if len(words) == 0:
-                    continue
-
-                t = []
-                ws = []
-                for w in words:
-                    tones, kanas = tone.convert_tones(w.split()[1])
-                    if len(tones) == 0:
-                        continue
-                    tones[-1] = kanas[-1]
-                    t.extend(tones)
-                    ws.append(w.split()[0])
-                if len(t) != 0:
-                    yield t, ws
-
     learner = graph.StructuredPerceptron()
     learner.N = 1e7
     learner.epochs = 1
     learner.default_cost = 100
-    learner.construct_feature(list(lcounter_2gram._items))
-    learner.train(iteratorWrapper(train_data), prefix_searcher, tone_list, word2pos)
+    learner.construct_feature(lcounter_2gram.keys())
+    learner.train(train_data, prefix_searcher, tone_list, word2pos)
     return learner
 
 
-def main():
-    ret = subprocess.call("./download.sh", shell=True)
-    if ret != 0:
-        return False
-    ret = _install_neologd()
-    if not ret:
-        return False
-    with open(DATA_PATH, 'w') as w:
-        with open('articles.txt', 'r') as f:
-            for line in f:
-                w.write(_process_syntax(line) + '\n')
-    tone_list, lcounter_2gram, word2pos = _create_tone_list()
+def _tag_chunk(lines, mecab_args=MECAB_ARGS):
+    """Return processed lines of chunk with worker tagger.
+
+    Args:
+        lines (List[String]): parse target strings.
+        mecab_args (String): mecab tagger arguments.
+
+    Return:
+        results (List[String]): _process_syntax results.
+    """
+    return [_process_sentence(sentence) for sentence in mecab.parse_many(lines, mecab_args)]
+
+
+def _read_chunks(f, chunk_size):
+    """Yield decoded line chunks and file offset after each chunk.
+
+    Args:
+        f (BinaryIO): input file.
+        chunk_size (Int): line nums of chunk.
+
+    Return:
+        chunks (Iterator[Tuple[List[String], Int]]): lines and end offset.
+    """
+    offset = f.tell()
+    while True:
+        lines = list(itertools.islice(f, chunk_size))
+        if len(lines) == 0:
+            break
+        offset += sum(len(line) for line in lines)
+        yield [line.decode('utf-8') for line in lines], offset
+
+
+def _tag_corpus(input_path, output_path, workers=None, chunk_size=TAG_CHUNK_SIZE, mecab_args=MECAB_ARGS,
+                checkpoint_interval=CHECKPOINT_INTERVAL):
+    """Tag corpus lines in worker processes and write results in input order.
+
+    at most workers * 2 chunks are in flight, so memory is bounded.
+    input and output offsets are saved to checkpoint file every
+    checkpoint_interval chunks, and interrupted tagging of same input is
+    resumed from last checkpoint.
+
+    Args:
+        input_path (String): one sentence per line file path.
+        output_path (String): output file path.
+        workers (Int): worker process nums. None is cpu count.
+        chunk_size (Int): line nums sent to worker at once.
+        mecab_args (String): mecab tagger arguments.
+        checkpoint_interval (Int): written chunk nums between checkpoints.
+
+    Return:
+        line_num (Int): processed line nums.
+    """
+    workers = workers or os.cpu_count()
+    checkpoint_path = output_path + '.checkpoint'
+    stat = os.stat(input_path)
+    source = {'path': input_path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'mecab_args': mecab_args}
+    checkpoint = {'source': source, 'input_offset': 0, 'output_offset': 0, 'lines': 0}
+    if os.path.exists(checkpoint_path) and os.path.exists(output_path):
+        with open(checkpoint_path, 'r') as f:
+            saved = json.load(f)
+        if saved['source'] == source:
+            checkpoint = saved
+            print("Resume tagging from line", checkpoint['lines'])
+
+    start = time.perf_counter()
+    resumed_lines = checkpoint['lines']
+    with open(input_path, 'rb') as f, open(output_path, 'ab') as w:
+        f.seek(checkpoint['input_offset'])
+        w.truncate(checkpoint['output_offset'])
+        written = 0
+
+        def write(lines, input_offset):
+            nonlocal written
+            w.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+            checkpoint['lines'] += len(lines)
+            written += 1
+            if written % checkpoint_interval == 0:
+                w.flush()
+                os.fsync(w.fileno())
+                checkpoint['input_offset'] = input_offset
+                checkpoint['output_offset'] = w.tell()
+                with open(checkpoint_path + '.tmp', 'w') as c:
+                    json.dump(checkpoint, c)
+                os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+        chunks = _read_chunks(f, chunk_size)
+        if workers == 1:
+            for chunk, offset in chunks:
+                write(_tag_chunk(chunk, mecab_args), offset)
+        else:
+            with multiprocessing.Pool(workers) as pool:
+                pending = collections.deque()
+                for chunk, offset in chunks:
+                    pending.append((pool.apply_async(_tag_chunk, (chunk, mecab_args)), offset))
+                    if len(pending) >= workers * 2:
+                        result, end = pending.popleft()
+                        write(result.get(), end)
+                while pending:
+                    result, end = pending.popleft()
+                    write(result.get(), end)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    line_num = checkpoint['lines']
+    elapsed = time.perf_counter() - start
+    tagged = line_num - resumed_lines
+    print("Tagging: {} lines, {:.0f} lines/s".format(line_num, tagged / elapsed if elapsed > 0 else 0))
+    return line_num
+
+
+def _count_stage(workers, counter_type, input_format):
+    """Count words and 2-grams, then save tone list, 2-gram counter, word pos and training data."""
+    if input_format == 'corpus':
+        tone_list, lcounter_2gram, word2pos, train_data = _create_tone_list_from_corpus(counter_type=counter_type)
+    else:
+        tone_list, lcounter_2gram, word2pos, train_data = _create_tone_list(workers, counter_type)
+    with open(SAMPLE_PATH, 'wb') as w:
+        pickle.dump(train_data, w, pickle.HIGHEST_PROTOCOL)
     with open(TONE_PATH, 'wb') as w:
         pickle.dump(tone_list, w, pickle.HIGHEST_PROTOCOL)
     with open(COUNTER_2GRAM_PATH, 'wb') as w:
         pickle.dump(lcounter_2gram, w, pickle.HIGHEST_PROTOCOL)
     with open(WORD2POS_PATH, 'wb') as w:
         pickle.dump(word2pos, w, pickle.HIGHEST_PROTOCOL)
+
+
+def _trie_stage():
+    """Build and save prefix searcher."""
+    with open(TONE_PATH, 'rb') as f:
+        tone_list = pickle.load(f)
     prefix_searcher = trie.DoubleArray(tone_list.keys())
-    with open(PREFIX_SEARCHER_PATH, 'wb') as w:
-        pickle.dump(prefix_searcher, w, pickle.HIGHEST_PROTOCOL)
-    learner = _train_graph(prefix_searcher, tone_list, lcounter_2gram, word2pos)
+    print("Build Time:", prefix_searcher.build_time)
+    print("Fill Ratio:", prefix_searcher.fill_ratio)
+    prefix_searcher.save(PREFIX_SEARCHER_PATH)
+
+
+def _train_stage():
+    """Train and save structured learner."""
+    with open(TONE_PATH, 'rb') as f:
+        tone_list = pickle.load(f)
+    with open(COUNTER_2GRAM_PATH, 'rb') as f:
+        lcounter_2gram = pickle.load(f)
+    with open(WORD2POS_PATH, 'rb') as f:
+        word2pos = pickle.load(f)
+    with open(SAMPLE_PATH, 'rb') as f:
+        train_data = pickle.load(f)
+    prefix_searcher = trie.DoubleArray.load(PREFIX_SEARCHER_PATH)
+    learner = _train_graph(prefix_searcher, tone_list, lcounter_2gram, word2pos, train_data)
     with open(LEARNER_PATH, 'wb') as w:
         pickle.dump(learner, w, pickle.HIGHEST_PROTOCOL)
+
+
+def _compile_stage(learner_path=LEARNER_PATH, compiled_path=COMPILED_LEARNER_PATH):
+    """Compile trained learner to inference form and save it."""
+    with open(learner_path, 'rb') as f:
+        learner = pickle.load(f)
+    graph.CompiledPerceptron.compile(learner).save(compiled_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None, help='worker process nums. default is cpu count.')
+    parser.add_argument(
+        '--counter-type', default='lossy', choices=['lossy', 'space_saving', 'exact'],
+        help='word and 2-gram counter. exact counts do not prune rare words.')
+    parser.add_argument(
+        '--input-format', default='text', choices=['text', 'corpus'],
+        help='count on tagged text data or on converted columnar binary corpus.')
+    parser.add_argument('--force', action='store_true', help='run all stages even if outputs are fresh.')
+    args = parser.parse_args(argv)
+
+    if args.force and os.path.exists(MANIFEST_PATH):
+        os.remove(MANIFEST_PATH)
+    stages = manifest.Manifest(MANIFEST_PATH)
+    count_outputs = [TONE_PATH, COUNTER_2GRAM_PATH, WORD2POS_PATH, SAMPLE_PATH]
+    count_inputs = [CORPUS_PATH] if args.input_format == 'corpus' else [DATA_PATH]
+    if args.counter_type == 'exact' and args.input_format == 'text':
+        # exact counts on corpus are summed on word type arrays without count files
+        count_outputs += [WORD_COUNT_PATH, POS_2GRAM_COUNT_PATH]
+
+    ret = stages.run(
+        'download', lambda: subprocess.call("./download.sh", shell=True) == 0,
+        outputs=[ARTICLES_PATH])
+    ret = ret and stages.run(
+        'neologd', _install_neologd,
+        outputs=[DICTIONARY_PATH])
+    ret = ret and stages.run(
+        'tagging', lambda: _tag_corpus(ARTICLES_PATH, DATA_PATH, args.workers),
+        inputs=[ARTICLES_PATH, DICTIONARY_PATH], outputs=[DATA_PATH], params={'mecab_args': MECAB_ARGS})
+    if args.input_format == 'corpus':
+        ret = ret and stages.run(
+            'corpus', lambda: corpus.convert(DATA_PATH, CORPUS_PATH),
+            inputs=[DATA_PATH], outputs=[CORPUS_PATH], params={'version': corpus.FORMAT_VERSION})
+    ret = ret and stages.run(
+        'counting', lambda: _count_stage(args.workers, args.counter_type, args.input_format),
+        inputs=count_inputs, outputs=count_outputs,
+        params={'counter_type': args.counter_type, 'input_format': args.input_format})
+    ret = ret and stages.run(
+        'trie', _trie_stage,
+        inputs=[TONE_PATH], outputs=[PREFIX_SEARCHER_PATH],
+        params={'version': trie.FORMAT_VERSION})
+    ret = ret and stages.run(
+        'training', _train_stage,
+        inputs=[TONE_PATH, COUNTER_2GRAM_PATH, WORD2POS_PATH, SAMPLE_PATH, PREFIX_SEARCHER_PATH],
+        outputs=[LEARNER_PATH])
+    ret = ret and stages.run(
+        'compile', _compile_stage,
+        inputs=[LEARNER_PATH], outputs=[COMPILED_LEARNER_PATH])
+    return ret
@@ -1,6 +1,9 @@
 # Limitations under the MIT License.
 # Copyright 2019 Katsuya Shimabukuro.
 """Tone processing module."""
+import functools
+from array import array
+import numpy as np
 
 
 tone_types = {}
@@ -13,30 +16,207 @@ tone_types["xtu"] = ['ッ']
 tone_types["n"] = ['ン']
 mini = ['ァ', 'ィ', 'ゥ', 'ェ', 'ォ', 'ャ', 'ュ', 'ョ']
 
+# Character to (tone, is small kana) table
+char_table = {k: (t, k in mini) for t in tone_types for k in tone_types[t]}
 
-def convert_tones(kana):
+# Cached convert_tones results nums
+CACHE_SIZE = 2 ** 16
+
+# Combined kana which can be a final mora
+combined_kana = (
+    [k + m for k in ['キ', 'シ', 'チ', 'ニ', 'ヒ', 'ミ', 'リ', 'ギ', 'ジ', 'ヂ', 'ビ', 'ピ'] for m in ['ャ', 'ュ', 'ョ', 'ェ']] +
+    [k + m for k in ['ウ', 'ク', 'グ', 'ス', 'ズ', 'ツ', 'フ', 'ヴ'] for m in ['ァ', 'ィ', 'ェ', 'ォ']] +
+    ['ティ', 'テュ', 'ディ', 'デュ', 'トゥ', 'ドゥ', 'ヴャ', 'ヴュ', 'ヴョ', 'イェ', 'フャ', 'フュ', 'フョ'])
+
+# Tone codec alphabet. code 0 is not used.
+# tones, kana and combined kana are packed to one byte each.
+code2tone = [""] + list(tone_types) + [k for t in tone_types.values() for k in t] + ['ー'] + combined_kana
+tone2code = {t: i for i, t in enumerate(code2tone) if i != 0}
+
+
+def encode(tones):
+    """Return tones packed to bytes.
+
+    unknown combined kana is packed as its first kana.
+
+    Args:
+        tones (List[String]): tone or kana list. bytes is returned as it is.
+    Return:
+        packed (bytes): tone codes.
+    """
+    if isinstance(tones, (bytes, bytearray)):
+        return bytes(tones)
+    return bytes(tone2code[t] if t in tone2code else tone2code[t[0]] for t in tones)
+
+
+def decode(packed):
+    """Return tones unpacked from bytes.
+
+    Args:
+        packed (bytes): tone codes.
+    Return:
+        tones (List[String]): tone or kana list.
+    """
+    return [code2tone[c] for c in packed]
+
+
+def convert_tones(kana, packed=False):
     """Convert katakana to tone.
 
+    results are cached by kana, returned lists are new objects.
+
+    Args:
+        kana (String): kana list.
+        packed (bool): return tone codes instead of strings.
+    Return:
+        tones (List[String] or array): tone list.
+        splitted_kana (List[String] or array): splitted kana list.
+    """
+    if packed:
+        tones, splitted_kana = _convert_tone_codes(kana)
+        return array('B', tones), array('B', splitted_kana)
+    tones, splitted_kana = _convert_tones(kana)
+    return list(tones), list(splitted_kana)
+
+
+def convert_tones_many(kanas, packed=False):
+    """Convert katakana list to tones.
+
+    Args:
+        kanas (Iterable[String]): kana list.
+        packed (bool): return tone codes instead of strings.
+    Return:
+        results (Iterator[Tuple]): convert_tones results.
+    """
+    for kana in kanas:
+        yield convert_tones(kana, packed)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _convert_tones(kana):
+    """Convert katakana to tone with character table.
+
     Args:
         kana (String): kana list.
     Return:
-        tones (List[String]): tone list.
-        splitted_kana (List[String]): splitted kana list.
+        tones (Tuple[String]): tone list.
+        splitted_kana (Tuple[String]): splitted kana list.
     """
     tones = []
     splitted_kana = []
     for k in kana:
-        if k in mini and len(tones) != 0:
-            del tones[-1]
-        for t in tone_types:
-            if k in tone_types[t]:
-                if k in mini and len(splitted_kana) != 0:
-                    splitted_kana[-1] += k
-                else:
-                    splitted_kana.append(k)
-                tones.append(t)
-        if k == 'ー':
+        entry = char_table.get(k)
+        if entry is not None:
+            t, is_small = entry
+            if is_small and len(tones) != 0:
+                del tones[-1]
+                splitted_kana[-1] += k
+            else:
+                splitted_kana.append(k)
+            tones.append(t)
+        elif k == 'ー':
             if len(tones) != 0:
                 splitted_kana.append(k)
                 tones.append(tones[-1])
-    return tones, splitted_kana
+    return tuple(tones), tuple(splitted_kana)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _convert_tone_codes(kana):
+    """Convert katakana to packed tone.
+
+    Args:
+        kana (String): kana list.
+    Return:
+        tones (bytes): packed tones.
+        splitted_kana (bytes): packed splitted kana.
+    """
+    tones, splitted_kana = _convert_tones(kana)
+    return encode(tones), encode(splitted_kana)
+
+
+def _build_lookup_tables():
+    """Return code point lookup tables for convert_tones_array.
+
+    Return:
+        tone_lut (ndarray): code point to tone code. 0 is not kana.
+        kana_lut (ndarray): code point to kana code.
+        small_lut (ndarray): code point to small kana number + 1. 0 is not small kana.
+        pair_lut (ndarray): (kana code, small kana number) to combined kana code.
+    """
+    tone_lut = np.zeros(0x10000, dtype=np.uint8)
+    kana_lut = np.zeros(0x10000, dtype=np.uint8)
+    small_lut = np.zeros(0x10000, dtype=np.uint8)
+    for k, (t, _) in char_table.items():
+        tone_lut[ord(k)] = tone2code[t]
+        kana_lut[ord(k)] = tone2code[k]
+    kana_lut[ord('ー')] = tone2code['ー']
+    for i, m in enumerate(mini):
+        small_lut[ord(m)] = i + 1
+
+    # Unknown combined kana is packed as its first kana as encode().
+    pair_lut = np.zeros((len(code2tone), len(mini)), dtype=np.uint8)
+    for c in range(1, len(code2tone)):
+        for i, m in enumerate(mini):
+            pair_lut[c, i] = tone2code.get(code2tone[c] + m, c)
+    return tone_lut, kana_lut, small_lut, pair_lut
+
+
+_tone_lut, _kana_lut, _small_lut, _pair_lut = _build_lookup_tables()
+
+
+def convert_tones_array(kanas, final_kana=False):
+    """Convert katakana list to packed tones with vectorized operations.
+
+    results are equal to convert_tones(kana, packed=True) for each kana.
+
+    Args:
+        kanas (List[String]): kana list. each kana must not contain new line.
+        final_kana (bool): replace each last tone with last splitted kana.
+    Return:
+        codes (ndarray): flattened uint8 tone codes.
+        offsets (ndarray): kanas[i] tone codes are codes[offsets[i]:offsets[i + 1]].
+    """
+    n = len(kanas)
+    chars = np.frombuffer('\n'.join(kanas).encode('utf-32-le'), dtype=np.uint32)
+    chars = np.where(chars < 0x10000, chars, 0)
+    word = np.cumsum(chars == ord('\n'))
+
+    tones = _tone_lut[chars]
+    is_kana = tones != 0
+    is_bar = chars == ord('ー')
+    is_small = _small_lut[chars]
+
+    # 'ー' is a tone when kana appears before it in the same word.
+    kana_before = np.cumsum(is_kana) - is_kana
+    if len(chars):
+        kana_before -= kana_before[np.searchsorted(word, np.arange(n))][word]
+    idx = np.flatnonzero(is_kana | (is_bar & (kana_before > 0)))
+    elem_word = word[idx]
+    positions = np.arange(len(idx))
+
+    # Small kana replaces previous tone in the same word.
+    same_word = np.zeros(len(idx), dtype=bool)
+    same_word[1:] = elem_word[1:] == elem_word[:-1]
+    merged = (is_small[idx] != 0) & same_word
+    keep = np.ones(len(idx), dtype=bool)
+    keep[:-1] = ~merged[1:]
+
+    # 'ー' takes previous tone.
+    source = np.maximum.accumulate(np.where(is_bar[idx], 0, positions)) if len(idx) else positions
+    values = tones[idx][source]
+
+    if final_kana and len(idx):
+        last = np.ones(len(idx), dtype=bool)
+        last[:-1] = ~same_word[1:]
+        base = np.maximum.accumulate(np.where(merged, 0, positions))
+        chain = positions - base + 1
+        base_code = _kana_lut[chars[idx[base]]]
+        pair_code = _pair_lut[base_code, np.maximum(is_small[idx].astype(np.int64) - 1, 0)]
+        kana_code = np.where(chain == 1, _kana_lut[chars[idx]], np.where(chain == 2, pair_code, base_code))
+        values = np.where(last, kana_code, values)
+
+    codes = values[keep].astype(np.uint8)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(elem_word[keep], minlength=n), out=offsets[1:])
+    return codes, offsets
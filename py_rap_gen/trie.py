@@ -1,12 +1,47 @@
 # Limitations under the MIT License.
 # Copyright 2019 Katsuya Shimabukuro.
 """Common Prefix Search with Double Array."""
-import copy
+import time
+import functools
+import itertools
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from py_rap_gen import arrayfile
 
 
 # Not found label
 NOT_FOUND = -1
 
+# DoubleArray file format version
+FORMAT_VERSION = 2
+
+# Free slot search trial limit while building DoubleArray
+MAX_TRIALS = 16
+
+# Free slot scanning limit while inserting into DoubleArray
+RELOCATE_SCAN = 1024
+
+# DoubleArray arrays indexed by node index
+NODE_ARRAY_NAMES = ('_base', '_check', '_node_word', '_first', '_last', '_cut_offset')
+
+# DoubleArray typed arrays saved to binary file
+ARRAY_NAMES = (
+    '_base', '_check', '_node_word', '_word_node',
+    '_first', '_last', '_len_order', '_cut_offset', '_cuts')
+
+# DoubleArray instance ids for version tokens
+_instance_ids = itertools.count()
+
+
+def _synchronized(method):
+    """Run method holding instance lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class TrieBase(object):
     """Common Prefix Search with Naive Transition Table."""
@@ -104,13 +139,75 @@ class TrieBase(object):
 
 
 class DoubleArray(TrieBase):
-    """Common Prefix Search with Double Array."""
-    def __init__(self, words):
+    """Common Prefix Search with Double Array.
+
+    base and check are typed int32 arrays and word ids are kept in
+    dense node to word id array, so saved double array can be searched
+    directly on mmap buffer shared between processes.
+
+    word ids are numbered in depth first order. each node keeps
+    [first, last) word id range of its descendants and word ranges per
+    word length, so common prefix search is array slicing.
+
+    words inserted after building get new word ids out of the ranges and
+    are kept as pending words until compact() rebuilds the ranges.
+    searches hold the same lock as insert() and delete(), so they never
+    see half relocated nodes.
+
+    when words are bytes (packed tones), each byte is used as character
+    code without character table and restored words are bytes.
+    byte 0 is not allowed in packed words.
+    """
+    def __init__(self, words=()):
         self._index2char = [""]
         self._char2index = {}
-        self._index2word = {}
-        self._word2index = {}
-        self._base, self._check = self.build(words)
+        self._packed = False
+        self._buffer = None
+        self.build_time = 0.0
+        for name, values in self.build(words).items():
+            setattr(self, name, array('i', values))
+        self._init_updates()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffer'] = None
+        del state['_lock']
+        for name in ARRAY_NAMES:
+            state[name] = arrayfile.to_array(state[name])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._instance_id = next(_instance_ids)
+
+    def __len__(self):
+        return len(self._word_node) - len(self._deleted)
+
+    @property
+    def version(self):
+        """Return hashable token changed by insert() and delete().
+
+        tokens are not shared between instances, so search results can be
+        cached by version.
+        """
+        return (self._instance_id, self._updates)
+
+    def _init_updates(self, pending=(), deleted=()):
+        """Initialize incremental update information.
+
+        Args:
+            pending (List[Int]): inserted word ids out of word ranges.
+            deleted (List[Int]): deleted word ids.
+        """
+        self._pending = list(pending)
+        self._deleted = set(deleted)
+        self._updates = 0
+        self._journal = []  # updates while compact() is running
+        self._compactions = 0
+        self._free_hint = 1
+        self._lock = threading.RLock()
+        self._instance_id = next(_instance_ids)
 
     def build(self, words):
         """Create double array.
@@ -120,80 +217,594 @@ class DoubleArray(TrieBase):
         check is parent node check array.
         both arrays are node length
 
+        nodes are placed in depth first order directly from sorted words.
+        free slots are kept in linked list and slots failed MAX_TRIALS times
+        are skipped from next searching, so building is almost linear time.
+
         Args:
             words (List[Tuple[String]]): target yomi foramt words list.
 
         Return:
-            base (List[Int]): transition node array.
-            check (List[Int]): parent node check array.
+            arrays (Hash[String, List[Int]]): array name to values.
+                _base: transition node array.
+                _check: parent node check array.
+                _node_word: node index to word id array.
+                _word_node: word id to node index array.
+                _first, _last: node descendant word id range.
+                _len_order: word ids sorted by length and word.
+                _cut_offset: node index to _cuts offset.
+                _cuts: level nums and (level, _len_order range) of levels having words.
         """
-        table = super().build(words)
-        index2word = copy.deepcopy(self._index2word)
-        self._index2word = {}
-        self._word2index = {}
+        start_time = time.perf_counter()
+        keys = sorted(set(self._encode_words(words)))
         base = [0]
         check = [NOT_FOUND]
-        not_found_indexes = []
-
-        def _search(p, n):
-            """Deep First Searh for creating double array.
-
-            Args:
-                p (Int): transition table parent node index.
-                n (Int): double array parent node index.
-            """
-            if p in index2word:
-                # Update word node index to double array index
-                w = index2word[p]
-                self._index2word[n] = w
-                self._word2index[w] = n
-
-            if p >= len(table):
-                return
+        word_node = []
 
-            if n >= len(base):
-                base.extend([NOT_FOUND] * (n - len(base) + 1))
+        # Free slot doubly linked list. slot 0 is root and never free.
+        nxt = [NOT_FOUND]
+        prv = [NOT_FOUND]
+        linked = bytearray(1)
+        fails = bytearray(1)
+        head = NOT_FOUND
+        tail = NOT_FOUND
 
-            children = [(char_index, c) for char_index, c in enumerate(table[p]) if c != NOT_FOUND]
+        def _extend(size):
+            nonlocal head, tail
+            for s in range(len(check), size):
+                base.append(NOT_FOUND)
+                check.append(NOT_FOUND)
+                nxt.append(NOT_FOUND)
+                prv.append(tail)
+                linked.append(1)
+                fails.append(0)
+                if tail == NOT_FOUND:
+                    head = s
+                else:
+                    nxt[tail] = s
+                tail = s
 
-            if len(children) == 0:
-                # Case n is end node
+        def _unlink(s):
+            nonlocal head, tail
+            if not linked[s]:
                 return
+            linked[s] = 0
+            if prv[s] == NOT_FOUND:
+                head = nxt[s]
+            else:
+                nxt[prv[s]] = nxt[s]
+            if nxt[s] == NOT_FOUND:
+                tail = prv[s]
+            else:
+                prv[nxt[s]] = prv[s]
+
+        def _find_base(codes):
+            first = codes[0]
+            s = head
+            while True:
+                if s == NOT_FOUND:
+                    _extend(len(check) + 1)
+                    s = tail
+                b = s - first
+                if b >= 0:
+                    if b + codes[-1] >= len(check):
+                        _extend(b + codes[-1] + 1)
+                    if all(check[b + c] == NOT_FOUND for c in codes):
+                        return b
+                next_s = nxt[s]
+                fails[s] += 1
+                if fails[s] >= MAX_TRIALS:
+                    _unlink(s)
+                s = next_s
+
+        # Depth first search on sorted words range.
+        # stack item is (node index, words start, words end, depth)
+        stack = [(0, 0, len(keys), 0)]
+        preorder = []
+        word_range = {}
+        while stack:
+            n, lo, hi, depth = stack.pop()
+            preorder.append(n)
+            word_range[n] = (len(word_node), len(word_node) + hi - lo)
+            if lo < hi and len(keys[lo]) == depth:
+                word_node.append(n)
+                lo += 1
+            if lo == hi:
+                # Case n is end node
+                continue
+
+            children = []
+            i = lo
+            while i < hi:
+                c = keys[i][depth]
+                j = i + 1
+                while j < hi and keys[j][depth] == c:
+                    j += 1
+                children.append((c, i, j))
+                i = j
+
+            codes = [c for c, _, _ in children]
+            b = _find_base(codes)
+            base[n] = b
+            for c in codes:
+                check[b + c] = n
+                _unlink(b + c)
+            for c, i, j in reversed(children):
+                stack.append((b + c, i, j, depth + 1))
+
+        node_word = [NOT_FOUND] * len(check)
+        for word_id, n in enumerate(word_node):
+            node_word[n] = word_id
+
+        # Word ids are equal to sorted keys indexes.
+        len_order = sorted(range(len(keys)), key=lambda i: (len(keys[i]), keys[i]))
+        rank = [0] * len(keys)
+        for r, i in enumerate(len_order):
+            rank[i] = r
 
-            # Search indexies meeting all conditons
-            min_char_index = min(children, key=lambda x: x[0])[0]
-            max_char_index = max(children, key=lambda x: x[0])[0]
-            start_index = min_char_index
+        # Merge word length ranges from leaves to root.
+        # level k is range of words which length is node depth + k.
+        # only levels having words are kept, so ranges are bounded by
+        # total word length.
+        first_arr = [0] * len(check)
+        last_arr = [0] * len(check)
+        cut_offset = [NOT_FOUND] * len(check)
+        cuts = []
+        levels = {}
+        for n in reversed(preorder):
+            lv = levels.pop(n, None) or {}
+            if node_word[n] != NOT_FOUND:
+                r = rank[node_word[n]]
+                lv[0] = [r, r + 1]
+            first_arr[n], last_arr[n] = word_range[n]
+            cut_offset[n] = len(cuts)
+            cuts.append(len(lv))
+            for k in sorted(lv):
+                cuts.extend((k, lv[k][0], lv[k][1]))
 
-            is_end = False
-            start_index = 0
-            while not is_end:
-                if start_index < len(not_found_indexes):
-                    min_index = not_found_indexes[start_index]
+            if n == 0:
+                continue
+            plv = levels.setdefault(check[n], {})
+            for k, r in lv.items():
+                if k + 1 not in plv:
+                    plv[k + 1] = r
                 else:
-                    check.append(NOT_FOUND)
-                    min_index = len(check) - 1
-                    not_found_indexes.append(min_index)
-                base[n] = min_index - min_char_index
+                    plv[k + 1][0] = min(plv[k + 1][0], r[0])
+                    plv[k + 1][1] = max(plv[k + 1][1], r[1])
 
-                if (base[n] + max_char_index) >= len(check):
-                    not_found_indexes.extend(range(len(check), base[n] + max_char_index + 1))
-                    check.extend([NOT_FOUND] * (base[n] + max_char_index - len(check) + 1))
+        self.build_time = time.perf_counter() - start_time
+        return {
+            '_base': base,
+            '_check': check,
+            '_node_word': node_word,
+            '_word_node': word_node,
+            '_first': first_arr,
+            '_last': last_arr,
+            '_len_order': len_order,
+            '_cut_offset': cut_offset,
+            '_cuts': cuts,
+        }
+
+    def _encode_words(self, words):
+        """Return words converted to character index tuples.
+
+        new characters are added to character table in appearance order.
+
+        Args:
+            words (List[Tuple[String]]): target words list.
+
+        Return:
+            codes (List[Tuple[Int]]): character index tuples.
+        """
+        words = iter(words)
+        head = next(words, None)
+        if head is None:
+            return []
+        if not self._packed and self._index2char == [""] and isinstance(head, (bytes, bytearray)):
+            self._packed = True
+            self._index2char = None
+            self._char2index = None
+        words = itertools.chain([head], words)
+        if self._packed:
+            codes = [tuple(w) for w in words]
+            if any(0 in c for c in codes):
+                raise ValueError("Packed word contains byte 0")
+            return codes
 
-                is_end = all([check[base[n] + char_index] == NOT_FOUND for char_index, _ in children])
-                start_index += 1
+        index2char = self._index2char
+        char2index = self._char2index
+        codes = []
+        for w in words:
+            code = []
+            for c in w:
+                i = char2index.get(c)
+                if i is None:
+                    index2char.append(c)
+                    i = char2index[c] = len(index2char) - 1
+                code.append(i)
+            codes.append(tuple(code))
+        return codes
+
+    @property
+    def fill_ratio(self):
+        """Ratio of used slots in double array."""
+        if len(self._check) == 0:
+            return 0.0
+        used = sum(1 for c in self._check if c != NOT_FOUND) + 1
+        return used / len(self._check)
+
+    def save(self, path):
+        """Save double array to flat binary file.
+
+        Args:
+            path (String): output file path.
+        """
+        arrays = {name: getattr(self, name) for name in ARRAY_NAMES}
+        arrayfile.save(path, arrays, {
+            'chars': self._index2char,
+            'version': FORMAT_VERSION,
+            'packed': self._packed,
+            'pending': self._pending,
+            'deleted': sorted(self._deleted)})
+
+    @classmethod
+    def load(cls, path):
+        """Load double array from flat binary file with mmap.
+
+        arrays are not copied, search runs on mapped buffer.
+
+        Args:
+            path (String): input file path.
+
+        Return:
+            da (DoubleArray): loaded double array.
+        """
+        arrays, meta, buf = arrayfile.load(path)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError("Not double array file version " + str(FORMAT_VERSION))
+        da = cls.__new__(cls)
+        da._packed = meta.get('packed', False)
+        da._index2char = meta['chars']
+        da._char2index = None
+        if not da._packed:
+            da._char2index = {c: i for i, c in enumerate(da._index2char) if i != 0}
+        da._buffer = buf
+        da.build_time = 0.0
+        for name in ARRAY_NAMES:
+            setattr(da, name, arrays[name])
+        da._init_updates(meta.get('pending', ()), meta.get('deleted', ()))
+        return da
 
-            # Set searched information
-            for char_index, _ in children:
-                check[base[n] + char_index] = n
-                del_index = not_found_indexes.index(base[n] + char_index)
-                del not_found_indexes[del_index]
-            for char_index, c in children:
-                _search(c, base[n] + char_index)
+    def insert(self, word):
+        """Insert word without rebuilding double array.
 
-        _search(0, 0)
-        return base, check
+        when a new child slot collides with other node,
+        the parent node children are relocated to free slots.
 
+        Args:
+            word (Tuple[String]): target word.
+
+        Return:
+            word_id (Int): inserted word id.
+        """
+        with self._lock:
+            self._make_writable()
+            codes = self._encode_words([word])[0]
+            parent = 0
+            for c in codes:
+                child = self._base[parent] + c
+                if self._base[parent] != NOT_FOUND and \
+                        child < len(self._check) and self._check[child] == parent:
+                    parent = child
+                    continue
+                parent = self._add_child(parent, c)
+
+            if self._node_word[parent] != NOT_FOUND:
+                return self._node_word[parent]
+            word_id = len(self._word_node)
+            self._word_node.append(parent)
+            self._node_word[parent] = word_id
+            self._pending.append(word_id)
+            self._record(True, word)
+            return word_id
+
+    def delete(self, word):
+        """Delete word without rebuilding double array.
+
+        nodes of the word are kept until compact().
+
+        Args:
+            word (Tuple[String]): target word.
+
+        Return:
+            deleted (Bool): word was found or not.
+        """
+        with self._lock:
+            node = self._find_node(word)
+            if node == NOT_FOUND or self._node_word[node] == NOT_FOUND:
+                return False
+            self._make_writable()
+            word_id = self._node_word[node]
+            self._node_word[node] = NOT_FOUND
+            self._deleted.add(word_id)
+            if word_id in self._pending:
+                self._pending.remove(word_id)
+            self._record(False, word)
+            return True
+
+    def _record(self, is_insert, word):
+        """Count update and journal it for running compactions."""
+        self._updates += 1
+        if self._compactions != 0:
+            self._journal.append((is_insert, self._as_key(word)))
+
+    def compact(self, swap=False):
+        """Return new double array rebuilt from current words.
+
+        only arrays are copied under lock and words are restored from the
+        copy, so this can run in background thread while searches,
+        insert() and delete() are called. updates during building are
+        applied to the new double array.
+
+        Args:
+            swap (Bool): replace own arrays with compacted ones. last updates
+                are applied and arrays are replaced under lock, so no update
+                is lost.
+
+        Return:
+            da (DoubleArray): compacted double array. self when swap is True.
+        """
+        with self._lock:
+            self._compactions += 1
+            applied = len(self._journal)
+            snapshot = self._snapshot()
+
+        try:
+            words = [snapshot.key(i) for i in range(len(snapshot._word_node)) if i not in snapshot._deleted]
+            da = self.__class__(words)
+            with self._lock:
+                journal = self._journal[applied:]
+                applied = len(self._journal)
+            da._replay(journal)
+            if swap:
+                with self._lock:
+                    da._replay(self._journal[applied:])
+                    self._swap(da)
+                    da = self
+        finally:
+            with self._lock:
+                self._compactions -= 1
+                if self._compactions == 0:
+                    self._journal = []
+        return da
+
+    def compact_async(self, swap=False):
+        """Run compact() in background thread.
+
+        Args:
+            swap (Bool): replace own arrays with compacted ones.
+
+        Return:
+            future (Future[DoubleArray]): compacted double array future.
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.compact, swap)
+        executor.shutdown(wait=False)
+        return future
+
+    def _snapshot(self):
+        """Return copy having arrays restoring words by key()."""
+        da = self.__class__.__new__(self.__class__)
+        da._packed = self._packed
+        da._index2char = None if self._index2char is None else list(self._index2char)
+        # typed arrays are updated in place, mapped views are not
+        for name in ('_base', '_check', '_word_node'):
+            setattr(da, name, getattr(self, name)[:])
+        da._deleted = set(self._deleted)
+        da._lock = threading.RLock()
+        return da
+
+    def _replay(self, journal):
+        """Apply journaled updates.
+
+        Args:
+            journal (List[Tuple[Bool, Tuple[String]]]): insert flag and word pairs.
+        """
+        for is_insert, word in journal:
+            if is_insert:
+                self.insert(word)
+            else:
+                self.delete(word)
+
+    def _swap(self, da):
+        """Replace arrays and update information with other double array's."""
+        for name in ARRAY_NAMES:
+            setattr(self, name, getattr(da, name))
+        self._index2char = da._index2char
+        self._char2index = da._char2index
+        self._buffer = da._buffer
+        self.build_time = da.build_time
+        self._pending = da._pending
+        self._deleted = da._deleted
+        self._free_hint = da._free_hint
+        # word ids are changed, so version token is new one
+        self._instance_id = da._instance_id
+        self._updates = da._updates
+
+    def _make_writable(self):
+        """Copy arrays on mapped buffer to writable arrays."""
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrayfile.to_array(getattr(self, name)))
+
+    def _find_node(self, word):
+        """Return node index of word.
+
+        Args:
+            word (List[String]): target word.
+
+        Return:
+            node (Int): node index. NOT_FOUND if not exists.
+        """
+        parent = 0
+        for c in self.encode(word):
+            child = self._base[parent] + c
+            if c <= 0 or child >= len(self._check) or self._check[child] != parent:
+                return NOT_FOUND
+            parent = child
+        return parent
+
+    def _children(self, parent):
+        """Return child character codes of node.
+
+        Args:
+            parent (Int): target node index.
+
+        Return:
+            codes (List[Int]): child character codes.
+        """
+        b = self._base[parent]
+        if b == NOT_FOUND:
+            return []
+        return [c for c in range(1, self._char_num())
+                if b + c < len(self._check) and self._check[b + c] == parent]
+
+    def _extend_nodes(self, size):
+        """Extend node arrays to size with empty nodes."""
+        n = size - len(self._check)
+        if n <= 0:
+            return
+        for name in ('_base', '_check', '_node_word', '_cut_offset'):
+            getattr(self, name).extend([NOT_FOUND] * n)
+        for name in ('_first', '_last'):
+            getattr(self, name).extend([0] * n)
+
+    def _find_free_base(self, codes):
+        """Return base value whose slots for codes are free.
+
+        Args:
+            codes (List[Int]): sorted character codes.
+
+        Return:
+            base (Int): base value.
+        """
+        check = self._check
+        start = max(self._free_hint, 1)
+        for s in range(start, min(len(check), start + RELOCATE_SCAN)):
+            b = s - codes[0]
+            if check[s] != NOT_FOUND or b < 0:
+                continue
+            if all(b + c >= len(check) or check[b + c] == NOT_FOUND for c in codes):
+                self._free_hint = s
+                return b
+        self._free_hint = len(check)
+        return len(check)
+
+    def _add_child(self, parent, code):
+        """Add child node and relocate children if slot is used.
+
+        Args:
+            parent (Int): parent node index.
+            code (Int): child character code.
+
+        Return:
+            child (Int): new child node index.
+        """
+        b = self._base[parent]
+        child = b + code
+        if b == NOT_FOUND:
+            b = self._find_free_base([code])
+            self._base[parent] = b
+        elif child >= len(self._check) or (child > 0 and self._check[child] == NOT_FOUND):
+            pass
+        else:
+            b = self._relocate(parent, self._children(parent), code)
+        child = b + code
+        self._extend_nodes(child + 1)
+        self._check[child] = parent
+        return child
+
+    def _relocate(self, parent, codes, new_code):
+        """Move children of parent to new base.
+
+        Args:
+            parent (Int): parent node index.
+            codes (List[Int]): existing child character codes.
+            new_code (Int): character code which will be added.
+
+        Return:
+            base (Int): new base value.
+        """
+        old_base = self._base[parent]
+        new_base = self._find_free_base(sorted(codes + [new_code]))
+        self._extend_nodes(new_base + max(codes + [new_code]) + 1)
+        for c in codes:
+            old = old_base + c
+            new = new_base + c
+            for name in NODE_ARRAY_NAMES:
+                a = getattr(self, name)
+                a[new] = a[old]
+            self._check[new] = parent
+            for g in self._children(old):
+                self._check[self._base[old] + g] = new
+            if self._node_word[old] != NOT_FOUND:
+                self._word_node[self._node_word[old]] = new
+            for name in ('_base', '_check', '_node_word', '_cut_offset'):
+                getattr(self, name)[old] = NOT_FOUND
+            self._first[old] = 0
+            self._last[old] = 0
+        self._base[parent] = new_base
+        return new_base
+
+    @_synchronized
+    def key(self, word_id):
+        """Return word of word id.
+
+        Args:
+            word_id (Int): target word id.
+
+        Return:
+            word (Tuple[String]): word restored from double array.
+        """
+        return self._node_key(self._word_node[word_id])
+
+    def _node_key(self, node):
+        """Return word restored by tracing parent nodes.
+
+        Args:
+            node (Int): target node index.
+
+        Return:
+            word (Tuple[String]): characters from root to node.
+        """
+        chars = []
+        while node != 0:
+            parent = self._check[node]
+            chars.append(node - self._base[parent])
+            node = parent
+        if self._packed:
+            return bytes(reversed(chars))
+        return tuple(self._index2char[c] for c in reversed(chars))
+
+    def _as_key(self, word):
+        """Return word as restored word type.
+
+        Args:
+            word (List[String]): target word.
+
+        Return:
+            word (Tuple[String] or bytes): word tuple or packed word.
+        """
+        if self._packed:
+            return bytes(word)
+        return tuple(word)
+
+    def _char_num(self):
+        """Return character code upper bound."""
+        if self._packed:
+            return 256
+        return len(self._index2char)
+
+    @_synchronized
     def prefix_search(self, word):
         """Search word prefix match words.
 
@@ -206,20 +817,81 @@ class DoubleArray(TrieBase):
         parent = 0
         result = []
 
-        for c in word:
-            if c not in self._char2index:
-                break
-
-            child = self._base[parent] + self._char2index[c]
-            if child >= len(self._check) or self._check[child] != parent:
+        for i, c in enumerate(self.encode(word)):
+            child = self._base[parent] + c
+            if c <= 0 or child >= len(self._check) or self._check[child] != parent:
                 break
 
             parent = child
-            if parent in self._index2word:
-                result.append(self._index2word[parent])
+            if self._node_word[parent] != NOT_FOUND:
+                result.append(self._as_key(word[:i + 1]))
 
         return result
 
+    def encode(self, word):
+        """Return word converted to character codes.
+
+        unknown character is converted to 0.
+        packed word is returned as it is.
+
+        Args:
+            word (List[String]): target word.
+
+        Return:
+            codes (List[Int]): character codes.
+        """
+        if self._packed:
+            return word
+        char2index = self._char2index
+        return [char2index.get(c, 0) for c in word]
+
+    def all_prefix_search(self, word):
+        """Search prefix match words of all word suffixes.
+
+        Args:
+            word (List[String]): target word.
+
+        Return:
+            spans (List[Tuple[Int, Int, Int]]): (start, end, word id) list.
+                word[start:end] is matched word.
+        """
+        return self.all_prefix_search_codes(self.encode(word))
+
+    @_synchronized
+    def all_prefix_search_codes(self, codes):
+        """Search prefix match words of all suffixes on encoded word.
+
+        Args:
+            codes (List[Int]): target word character codes.
+
+        Return:
+            spans (List[Tuple[Int, Int, Int]]): (start, end, word id) list
+                sorted by start and end.
+        """
+        base = self._base
+        check = self._check
+        node_word = self._node_word
+        check_len = len(check)
+        length = len(codes)
+        spans = []
+
+        for start in range(length):
+            parent = 0
+            for end in range(start, length):
+                c = codes[end]
+                if c <= 0:
+                    break
+                child = base[parent] + c
+                if child >= check_len or check[child] != parent:
+                    break
+                parent = child
+                word_id = node_word[child]
+                if word_id != NOT_FOUND:
+                    spans.append((start, end + 1, word_id))
+
+        return spans
+
+    @_synchronized
     def search(self, word, max_len=-1):
         """Search common prefix words.
 
@@ -232,53 +904,178 @@ class DoubleArray(TrieBase):
         """
         parent = 0
         length = 0
-        for c in word:
+        for c in self.encode(word):
             if max_len >= 0 and length == max_len:
                 return []
-            if c not in self._char2index:
-                return []
 
-            child = self._base[parent] + self._char2index[c]
-            if child >= len(self._check) or self._check[child] != parent:
+            child = self._base[parent] + c
+            if c <= 0 or child >= len(self._check) or self._check[child] != parent:
                 return []
 
             parent = child
             length += 1
 
-        return [self._index2word[i]
-                for i in self.descendant(parent, length, max_len) + [parent]
-                if i in self._index2word]
+        return [self.key(i) for i in self._word_ids(parent, length, max_len)]
 
-    def descendant(self, parent, start_len=0, max_len=-1):
-        """Return descendant node list.
+    @_synchronized
+    def longest_prefix_match(self, word, length=-1):
+        """Search words sharing longest prefix with word.
+
+        with double array built on reversed words, this searches
+        longest suffix match words.
+
+        Args:
+            word (List[String]): target word.
+            length (Int): matched word length. minus value is ignored.
+
+        Return:
+            match_len (Int): matched prefix length.
+            result (List[Tuple[String]]): words sharing match_len prefix with word.
+        """
+        path = [0]
+        for c in self.encode(word):
+            child = self._base[path[-1]] + c
+            if c <= 0 or child >= len(self._check) or self._check[child] != path[-1]:
+                break
+            path.append(child)
+
+        for depth in range(len(path) - 1, -1, -1):
+            if length < 0:
+                word_ids = self._word_ids(path[depth], depth)
+            elif length < depth:
+                continue
+            else:
+                word_ids = self._word_ids_of_length(path[depth], depth, length)
+            if len(word_ids) != 0:
+                return depth, [self.key(i) for i in word_ids]
+        return 0, []
+
+    def _word_ids_of_length(self, parent, start_len, length):
+        """Return descendant word ids which length is equal to length.
 
         Args:
             parent (Int): target node index.
-            start_len (Int): start length.
-            max_len (Int): maximum word length. minus value is ignored.
+            start_len (Int): parent node depth.
+            length (Int): word length.
 
         Return:
-            result (List[Int]): descendant node index list fewer length than max_len.
+            result (List[Int]): word ids.
         """
-        S = set()
+        result = []
+        offset = self._cut_offset[parent]
+        k = length - start_len
+        if offset != NOT_FOUND:
+            for j in range(offset + 1, offset + 1 + 3 * self._cuts[offset], 3):
+                if self._cuts[j] >= k:
+                    if self._cuts[j] == k:
+                        start, end = self._cuts[j + 1], self._cuts[j + 2]
+                        result = [i for i in self._len_order[start:end] if i not in self._deleted]
+                    break
+        if len(self._pending) != 0:
+            pending = set(self._pending)
+            result.extend(i for i in self._word_ids(parent, start_len, length)
+                          if i in pending and len(self.key(i)) == length)
+        return result
 
-        def _search(p, length):
-            nonlocal S
+    @_synchronized
+    def fuzzy_search(self, word, max_dist=1, top_n=10):
+        """Search words within levenshtein distance.
 
-            if max_len >= 0 and length == max_len:
-                return
+        trie is walked once with levenshtein distance table rows and
+        subtrees whose row minimum exceeds max_dist are pruned.
 
-            if self._base[p] == NOT_FOUND:
-                return
+        Args:
+            word (List[String]): target word.
+            max_dist (Int): maximum substitution, insertion and deletion nums.
+            top_n (Int): maximum result nums. minus value is ignored.
 
-            children = [self._base[p] + char_index
-                        for char_index in range(1, len(self._index2char))
-                        if (self._base[p] + char_index) < len(self._check) and
-                        self._check[self._base[p] + char_index] == p]
+        Return:
+            result (List[Tuple[Tuple[String], Int]]): (word, distance) list
+                sorted by distance.
+        """
+        codes = self.encode(word)
+        base = self._base
+        check = self._check
+        node_word = self._node_word
+        check_len = len(check)
+        char_num = self._char_num()
+        found = []
 
-            S |= set(children)
-            for c in children:
-                _search(c, length+1)
+        stack = [(0, list(range(len(codes) + 1)))]
+        while stack:
+            parent, row = stack.pop()
+            if node_word[parent] != NOT_FOUND and row[-1] <= max_dist:
+                found.append((row[-1], node_word[parent]))
+            if base[parent] == NOT_FOUND:
+                continue
 
-        _search(parent, start_len)
-        return list(S)
+            for c in range(1, char_num):
+                child = base[parent] + c
+                if child >= check_len or check[child] != parent:
+                    continue
+                new_row = [row[0] + 1]
+                for j in range(1, len(row)):
+                    new_row.append(min(
+                        row[j] + 1,
+                        new_row[j - 1] + 1,
+                        row[j - 1] + (codes[j - 1] != c)))
+                if min(new_row) <= max_dist:
+                    stack.append((child, new_row))
+
+        found.sort()
+        if top_n >= 0:
+            found = found[:top_n]
+        return [(self.key(word_id), dist) for dist, word_id in found]
+
+    def _word_ids(self, parent, start_len=0, max_len=-1):
+        """Return descendant word ids including parent word.
+
+        Args:
+            parent (Int): target node index.
+            start_len (Int): parent node depth.
+            max_len (Int): maximum word length. minus value is ignored.
+
+        Return:
+            result (Iterable[Int]): word ids fewer length than max_len.
+        """
+        if max_len < 0:
+            result = range(self._first[parent], self._last[parent])
+        else:
+            result = []
+            offset = self._cut_offset[parent]
+            if offset != NOT_FOUND:
+                for j in range(offset + 1, offset + 1 + 3 * self._cuts[offset], 3):
+                    if self._cuts[j] > max_len - start_len:
+                        break
+                    result.extend(self._len_order[self._cuts[j + 1]:self._cuts[j + 2]])
+            # same word id order as without max_len
+            result.sort()
+
+        if len(self._deleted) == 0 and len(self._pending) == 0:
+            return result
+        result = [i for i in result if i not in self._deleted]
+        for i in self._pending:
+            node = self._word_node[i]
+            length = start_len
+            while node != parent and node != 0:
+                node = self._check[node]
+                length += 1
+            if node == parent and (max_len < 0 or length <= max_len):
+                result.append(i)
+        return result
+
+    @_synchronized
+    def descendant(self, parent, start_len=0, max_len=-1):
+        """Return descendant word node list.
+
+        Args:
+            parent (Int): target node index.
+            start_len (Int): start length.
+            max_len (Int): maximum word length. minus value is ignored.
+
+        Return:
+            result (List[Int]): descendant word node index list fewer length than max_len.
+        """
+        return [self._word_node[i]
+                for i in self._word_ids(parent, start_len, max_len)
+                if self._word_node[i] != parent]
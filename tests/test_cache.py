@@ -0,0 +1,37 @@
+from nose.tools import eq_
+from py_rap_gen import cache
+
+
+def test_lru_cache_eviction():
+    c = cache.LRUCache(maxsize=2)
+    c.put('a', 1)
+    c.put('b', 2)
+    eq_(1, c.get('a'))
+    c.put('c', 3)
+    eq_(None, c.get('b'))
+    eq_(1, c.get('a'))
+    eq_(3, c.get('c'))
+    eq_(2, len(c))
+    eq_({'hits': 3, 'misses': 1, 'size': 2, 'maxsize': 2}, c.info())
+
+
+def test_lru_cache_ttl():
+    now = [0.0]
+    c = cache.LRUCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    c.put('a', 1)
+    now[0] = 5.0
+    eq_(1, c.get('a'))
+    now[0] = 10.0
+    eq_(None, c.get('a'))
+    eq_(0, len(c))
+
+
+def test_lru_cache_get_or_compute():
+    c = cache.LRUCache()
+    calls = []
+    eq_(None, c.get_or_compute('a', lambda: calls.append(1)))
+    eq_(None, c.get_or_compute('a', lambda: calls.append(1)))
+    eq_(1, len(calls))
+    c.clear()
+    eq_(0, len(c))
+    eq_(0, c.hits)
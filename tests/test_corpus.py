@@ -0,0 +1,96 @@
+from nose.tools import ok_, eq_
+import os
+import tempfile
+from py_rap_gen import corpus
+from py_rap_gen import preprocess
+from py_rap_gen import tone
+
+
+LINES = ['青い アオイ 形容詞\t空 ソラ 名詞-一般\n', '空 ソラ 名詞-一般\t \n', '\n', 'ABC エービーシー 名詞-固有名詞\n']
+
+
+def _convert(d):
+    text_path = os.path.join(d, 'data')
+    with open(text_path, 'w') as w:
+        w.writelines(LINES)
+    path = os.path.join(d, 'data.bin')
+    eq_(len(LINES), corpus.convert(text_path, path))
+    return path
+
+
+def test_convert_and_load():
+    with tempfile.TemporaryDirectory() as d:
+        data = corpus.Corpus.load(_convert(d))
+        eq_(4, len(data))
+        eq_(3, data.vocab_size)
+        eq_([0, 1], list(data.sentence(0)))
+        eq_([1], list(data.sentence(1)))
+        eq_([], list(data.sentence(2)))
+        eq_(['青い', '空', 'ABC'], [data.surface(i) for i in range(3)])
+        eq_(['アオイ', 'ソラ', 'エービーシー'], [data.pronounce(i) for i in range(3)])
+        eq_(['形容詞', '名詞-一般', '名詞-固有名詞'], [data.pos(i) for i in range(3)])
+        for i in range(3):
+            tones, kanas = tone.convert_tones(data.pronounce(i), packed=True)
+            kanas = tones[:-1] + kanas[-1:]
+            eq_(tones.tobytes(), data.tones(i))
+            eq_(kanas.tobytes(), data.kanas(i))
+
+
+def test_counts():
+    with tempfile.TemporaryDirectory() as d:
+        data = corpus.Corpus.load(_convert(d))
+        eq_([1, 2, 1], list(data.count_types()))
+        expected = {
+            '<BOS>_形容詞': 1, '形容詞_名詞-一般': 1, '名詞-一般_<EOS>': 2, '<BOS>_名詞-一般': 1,
+            '<BOS>_<EOS>': 1, '<BOS>_名詞-固有名詞': 1, '名詞-固有名詞_<EOS>': 1}
+        eq_(expected, data.count_pos_2grams())
+
+        chunk_size = corpus.CHUNK_SIZE
+        try:
+            corpus.CHUNK_SIZE = 1
+            eq_([1, 2, 1], list(data.count_types()))
+            eq_(expected, data.count_pos_2grams())
+        finally:
+            corpus.CHUNK_SIZE = chunk_size
+
+
+def test_chunks():
+    with tempfile.TemporaryDirectory() as d:
+        data = corpus.Corpus.load(_convert(d))
+        chunks = list(data.chunks(3))
+        eq_(2, len(chunks))
+        eq_([0, 1, 1], list(chunks[0][0]))
+        eq_([0, 2, 3, 3], list(chunks[0][1]))
+        eq_([2], list(chunks[1][0]))
+        eq_([0, 1], list(chunks[1][1]))
+
+
+def test_train_example():
+    with tempfile.TemporaryDirectory() as d:
+        data = corpus.Corpus.load(_convert(d))
+        eq_((tone.encode(['a', 'o', 'イ', 'o', 'ラ']), ['青い', '空']), data.train_example(0))
+        eq_(None, data.train_example(2))
+
+
+def test_create_tone_list_from_corpus():
+    with tempfile.TemporaryDirectory() as d:
+        path = _convert(d)
+        tone_list, lcounter_2gram, word2pos, train_data = preprocess._create_tone_list_from_corpus(path, seed=0)
+        eq_({'青い': '形容詞', '空': '名詞-一般', 'ABC': '名詞-固有名詞'}, word2pos)
+        ok_(['空'] in tone_list.values())
+        eq_(2, lcounter_2gram['名詞-一般_<EOS>'])
+        eq_(preprocess._train_examples([[w.split() for w in line.strip().split('\t') if w.strip()] for line in LINES]),
+            train_data)
+
+
+def test_create_tone_list_from_corpus_with_counters():
+    with tempfile.TemporaryDirectory() as d:
+        path = _convert(d)
+        expected = preprocess._create_tone_list_from_corpus(path, seed=0)
+        for counter_type in ['lossy', 'space_saving']:
+            tone_list, lcounter_2gram, word2pos, train_data = preprocess._create_tone_list_from_corpus(
+                path, counter_type, seed=0)
+            eq_(expected[0], tone_list)
+            eq_(sorted(expected[1].keys()), sorted(lcounter_2gram.keys()))
+            eq_(expected[2], word2pos)
+            eq_(expected[3], train_data)
@@ -1,9 +1,143 @@
 from py_rap_gen import __version__
 from nose.tools import ok_, eq_
+import os
+import random
+import tempfile
+import pickle
+import functools
 from py_rap_gen import counter
 
 
 def test_lossy_counting():
     lc = counter.LossyCounter(epsilon=0.5)
     lc.count(['あ', 'い', 'あ', 'あ'])
-    eq_({'あ': 3}, lc._items)
\ No newline at end of file
+    eq_({'あ': 3}, lc._items)
+
+
+def test_lossy_counting_incremental():
+    lc = counter.LossyCounter(epsilon=0.5)
+    lc.count(['あ', 'い'])
+    lc.count(['あ', 'あ'])
+    eq_({'あ': 3}, lc._items)
+
+
+def test_lossy_counting_merge():
+    rng = random.Random(0)
+    data = rng.choices(range(200), weights=[1 / (k + 1) for k in range(200)], k=2000)
+    epsilon = 0.01
+    lc1 = counter.LossyCounter(epsilon=epsilon)
+    lc1.count(data[:1200])
+    lc2 = counter.LossyCounter(epsilon=epsilon)
+    lc2.count(data[1200:])
+    lc1.merge(lc2)
+    eq_(2000, lc1._symbol_num)
+    # counts include maximum error of pruned buckets, so they are upper bounds
+    for symbol in set(data):
+        true_count = data.count(symbol)
+        if true_count > epsilon * len(data):
+            ok_(true_count <= lc1._items[symbol] <= true_count + epsilon * len(data))
+
+
+def _shard_data(shard):
+    return ['あ', 'い', 'あ'] * shard
+
+
+def test_count_parallel():
+    lc = counter.count_parallel(_shard_data, [1, 2, 3], functools.partial(counter.LossyCounter, epsilon=1e-3), processes=2)
+    eq_({'あ': 12, 'い': 6}, lc._items)
+    lc = counter.count_parallel(_shard_data, [1, 2, 3], counter.SpaceSavingCounter, processes=1)
+    eq_({'あ': 12, 'い': 6}, lc._items)
+
+
+def test_space_saving_counting():
+    sc = counter.SpaceSavingCounter(capacity=2)
+    sc.count(['あ', 'い', 'あ', 'う', 'あ'])
+    eq_({'あ': 3, 'う': 2}, sc._items)
+    eq_(1, sc._errors['う'])
+    eq_([('あ', 3)], sc.most_common(1))
+
+    data = [i % 7 if i % 3 else 0 for i in range(1000)]
+    sc = counter.SpaceSavingCounter(capacity=4)
+    sc.count(data)
+    eq_(4, len(sc._items))
+    eq_(0, sc.most_common(1)[0][0])
+    for symbol, c in sc._items.items():
+        ok_(c - sc._errors[symbol] <= data.count(symbol) <= c)
+
+
+def test_space_saving_merge():
+    data = [i % 7 if i % 3 else 0 for i in range(1000)]
+    sc1 = counter.SpaceSavingCounter(capacity=4)
+    sc1.count(data[:500])
+    sc2 = counter.SpaceSavingCounter(capacity=4)
+    sc2.count(data[500:])
+    sc1.merge(sc2)
+    eq_(1000, sc1._symbol_num)
+    eq_(4, len(sc1._items))
+    for symbol, c in sc1._items.items():
+        ok_(data.count(symbol) <= c)
+    sc1.count([0])
+    eq_(sum(1 for s in data if s == 0) + 1, sc1._items[0] - sc1._errors[0])
+
+
+def test_exact_counting_with_spill():
+    data = ['w' + str(i % 13 if i % 2 else i % 5) for i in range(500)]
+    ec = counter.ExactCounter(max_items=3, partitions=2)
+    ec.count(data[:250])
+    ec.count(data[250:])
+    expected = sorted((s, data.count(s)) for s in set(data))
+    eq_(expected, list(ec.items()))
+    eq_([s for s, _ in expected], list(ec.keys()))
+    ec.count(['w0'])
+    eq_(data.count('w0') + 1, dict(ec.items())['w0'])
+    ec.close()
+
+
+def test_exact_counting_merge_and_save():
+    data = ['あ', 'い', 'う', 'あ', 'え', 'お', 'あ'] * 10
+    ec1 = counter.ExactCounter(max_items=2, partitions=3)
+    ec1.count(data[:30])
+    ec2 = counter.ExactCounter(max_items=2, partitions=3)
+    ec2.count(data[30:])
+    ec1.merge(ec2)
+    with tempfile.TemporaryDirectory() as d:
+        count_file = ec1.save(os.path.join(d, 'counts.tsv'))
+        eq_(sorted((s, data.count(s)) for s in set(data)), list(count_file.items()))
+    ec1.close()
+
+
+def test_exact_counting_pickle_spills():
+    data = ['あ', 'い', 'う', 'あ'] * 5
+    ec = counter.ExactCounter(max_items=10, partitions=2)
+    ec.count(data)
+    state = ec.__getstate__()
+    eq_({}, state['_items'])
+    ok_(state['_spilled'])
+    restored = pickle.loads(pickle.dumps(ec))
+    eq_(sorted((s, data.count(s)) for s in set(data)), list(restored.items()))
+    restored.close()
+
+
+def test_count_parallel_exact():
+    ec = counter.count_parallel(
+        _shard_data, [1, 2, 3], functools.partial(counter.ExactCounter, max_items=10), processes=2)
+    eq_([('あ', 12), ('い', 6)], list(ec.items()))
+    ec.close()
+
+
+def test_reservoir_sampling():
+    rs = counter.ReservoirSampler(size=3, seed=0)
+    rs.count(['あ', 'い'])
+    eq_(['あ', 'い'], list(rs.keys()))
+    rs.count(range(100))
+    eq_(3, len(rs._items))
+    eq_(102, rs._symbol_num)
+
+    other = counter.ReservoirSampler(size=3, seed=1)
+    other.count(range(100, 110))
+    rs.merge(other)
+    eq_(3, len(set(rs._items)))
+    eq_(112, rs._symbol_num)
+    small = counter.ReservoirSampler(size=3, seed=0)
+    small.merge(other)
+    ok_(set(small._items) <= set(range(100, 110)))
@@ -1,7 +1,11 @@
-from nose.tools import ok_, eq_, raises
+from nose.tools import ok_, eq_, raises, assert_raises
 from py_rap_gen import graph
 from py_rap_gen import trie
+import os
 import pickle
+import random
+import tempfile
+import numpy as np
 
     
 tone_list = {
@@ -24,14 +28,40 @@ for t in tone_list:
 prefix_searcher = trie.DoubleArray(tone_list.keys())
 
 
+def _same_nodes(expected, nodes):
+    return len(expected) == len(nodes) and all(any(graph.node_equal(e, n) for n in nodes) for e in expected)
+
 def test_construct_graph():
     g = graph.Graph.construct_graph(prefix_searcher, tone_list, ('a', 'o', 'i', 'o', 'a'))
     eq_([g.BOS], g.nodes[0])
-    eq_(set([graph.Node(0, 'か'), graph.Node(0, 'あ'), graph.Node(0, 'さ')]), set(g.nodes[1]))
-    eq_(set([graph.Node(0, 'あお'), graph.Node(0, 'かお'), graph.Node(0, 'さと'), graph.Node(1, 'と')]),
-        set(g.nodes[2]))
+    ok_(_same_nodes([graph.Node(0, 'か'), graph.Node(0, 'あ'), graph.Node(0, 'さ')], g.nodes[1]))
+    ok_(_same_nodes([graph.Node(0, 'あお'), graph.Node(0, 'かお'), graph.Node(0, 'さと'), graph.Node(1, 'と')],
+        g.nodes[2]))
     eq_([g.EOS], g.nodes[6])
 
+def test_node_identity():
+    a = graph.Node(0, 'あ')
+    b = graph.Node(0, 'あ')
+    ok_(a != b)
+    eq_(2, len(set([a, b, a])))
+    ok_(graph.node_equal(a, b))
+    a.prev = graph.Node(0, '<BOS>')
+    ok_(not graph.node_equal(a, b))
+    b.prev = graph.Node(0, '<BOS>')
+    ok_(graph.node_equal(a, b))
+    b.cost = 1
+    ok_(not graph.node_equal(a, b))
+    with assert_raises(AttributeError):
+        a.extra = 1
+
+def test_node_equal_long_chain():
+    a = b = None
+    for i in range(10000):
+        prev_a, prev_b = a, b
+        a, b = graph.Node(i, 'あ'), graph.Node(i, 'あ')
+        a.prev, b.prev = prev_a, prev_b
+    ok_(graph.node_equal(a, b))
+
 def test_search_shortest_path():
     g = graph.Graph.construct_graph(prefix_searcher, tone_list, ('a', 'o', 'i', 'o', 'a'))
     g.learner = graph.StructuredLearner()
@@ -132,3 +162,70 @@ def test_structured_perceptron_iterator():
     eq_('と', path[1].word)
     eq_('と', path[2].word)
     eq_('さ', path[3].word)
+
+def _min_costs(g):
+    return [[(n.cost, None if n.prev is None else (n.prev.start_pos, n.prev.word)) for n in nodes] for nodes in g.nodes]
+
+def test_calculate_min_cost_by_matrix_equals_loop():
+    random.seed(0)
+    poses = ['名詞', '動詞', '形容詞']
+    learner = graph.StructuredPerceptron()
+    learner.construct_feature([p + '_' + n for p in poses for n in poses[:2]])
+    learner.train([], prefix_searcher, tone_list, {w: random.choice(poses) for w in word2pos if w != 'し'})
+    for weights in [np.random.RandomState(0).randint(0, 3, learner.N), np.random.RandomState(1).rand(learner.N) * 10]:
+        learner._w = weights.astype(np.float32)
+        for string in [('a', 'o', 'i', 'o', 'a'), ('a', 'o', 'i', 'o', 'a', 'i', 'o', 'i'), ('a', 'o', 'u', 'o', 'a')]:
+            loop = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+            loop.learner = learner
+            loop._calculate_min_cost_by_loop()
+            matrix = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+            matrix.learner = learner
+            matrix._calculate_min_cost()
+            eq_(_min_costs(loop), _min_costs(matrix))
+
+def test_matrix_registers_edge_features_like_loop():
+    random.seed(1)
+    poses = ['名詞', '動詞', '形容詞', '副詞']
+    learner = graph.StructuredPerceptron()
+    learner.train([], prefix_searcher, tone_list, {w: random.choice(poses) for w in word2pos})
+    learner._N = len(learner._index2feature) + 5
+    loop_learner = pickle.loads(pickle.dumps(learner))
+    for string in [('a', 'o', 'i', 'o', 'a', 'i', 'o', 'i'), ('o', 'a', 'o', 'i')]:
+        loop = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+        loop.learner = loop_learner
+        loop._calculate_min_cost_by_loop()
+        matrix = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+        matrix.learner = learner
+        matrix._calculate_min_cost()
+        eq_(_min_costs(loop), _min_costs(matrix))
+    eq_(learner.N, len(learner._index2feature))
+    eq_(loop_learner._index2feature, learner._index2feature)
+
+def test_base_learner_has_no_edge_ids():
+    eq_(None, graph.StructuredLearner().get_edge_ids([graph.Node(0, 'あ')]))
+    eq_(None, graph.StructuredLearner().get_edge_cost_matrix(np.zeros(1), np.zeros(1)))
+
+def test_compiled_perceptron():
+    learner = graph.StructuredPerceptron()
+    learner.train([(('a', 'o', 'i', 'o', 'a'),['あお', 'し', 'もさ']), (('a', 'o', 'o', 'a'), ['あ', 'と', 'と', 'さ'])], prefix_searcher, tone_list, word2pos)
+    compiled = graph.CompiledPerceptron.compile(learner)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'learner.bin')
+        compiled.save(path)
+        loaded = graph.CompiledPerceptron.load(path)
+        for string in [('a', 'o', 'i', 'o', 'a'), ('a', 'o', 'o', 'a'), ('a', 'o', 'i', 'o', 'a', 'i', 'o', 'i')]:
+            g = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+            g.learner = learner
+            g._calculate_min_cost()
+            expected = _min_costs(g)
+            for compiled_learner in [compiled, loaded]:
+                g = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+                g.learner = compiled_learner
+                g._calculate_min_cost()
+                eq_(expected, _min_costs(g))
+                g._calculate_min_cost_by_loop()
+                eq_(expected, _min_costs(g))
+        nodes = [graph.Node(0, 'あお'), graph.Node(0, '未知語')]
+        eq_(learner.get_node_cost(nodes[0]), loaded.get_node_cost(nodes[0]))
+        eq_(learner.get_node_cost(nodes[1]), loaded.get_node_cost(nodes[1]))
+        eq_(learner.get_edge_cost(nodes[0], nodes[1]), loaded.get_edge_cost(nodes[0], nodes[1]))
@@ -0,0 +1,108 @@
+from nose.tools import ok_, eq_, raises
+from py_rap_gen import graph
+from py_rap_gen import lattice
+from py_rap_gen import trie
+
+
+tone_list = {
+    ('a',): ['あ', 'か', 'さ'],
+    ('a', 'o'): ['あお', 'かお', 'さと'],
+    ('a', 'o', 'i'): ['あおい', 'さとみ'],
+    ('o',): ['と'],
+    ('o', 'i'): ['とい', 'こい', 'とし'],
+    ('o', 'i', 'o'): ['たいよ', 'はいりょ'],
+    ('i',): ['き', 'し'],
+    ('i', 'o'): ['みこ', 'しお'],
+    ('o', 'a'): ['もか', 'もさ'],
+}
+
+word2pos = {}
+for i, t in enumerate(tone_list):
+    for w in tone_list[t]:
+        word2pos[w] = str(i % 3)
+
+prefix_searcher = trie.DoubleArray(tone_list.keys())
+
+strings = [('a', 'o', 'i', 'o', 'a'), ('a', 'o', 'o', 'a'), ('a', 'o', 'i', 'o', 'a', 'i', 'o', 'i')]
+
+
+def _learners():
+    learner = graph.StructuredPerceptron()
+    learner.train([(('a', 'o', 'i', 'o', 'a'), ['あお', 'し', 'もさ']), (('a', 'o', 'o', 'a'), ['あ', 'と', 'と', 'さ'])],
+                  prefix_searcher, tone_list, word2pos)
+    return [learner, graph.CompiledPerceptron.compile(learner)]
+
+
+def _words(path):
+    return [(n.start_pos, n.word, n.cost) for n in path]
+
+
+def test_shortest_path_equals_graph():
+    for learner in _learners():
+        lexicon = lattice.Lexicon(tone_list, learner)
+        for string in strings:
+            g = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+            g.learner = learner
+            lat = lattice.Lattice.construct(prefix_searcher, lexicon, learner, string)
+            path = lat.search_shortest_path()
+            eq_(_words(g.search_shortest_path()), _words(path))
+            eq_(graph.Node(0, '<BOS>').word, path[0].prev.word)
+            for prev, node in zip(path, path[1:]):
+                ok_(node.prev is prev)
+
+
+def test_nbest_path_equals_graph():
+    for learner in _learners():
+        lexicon = lattice.Lexicon(tone_list, learner)
+        for string in strings:
+            g = graph.Graph.construct_graph(prefix_searcher, tone_list, string)
+            g.learner = learner
+            lat = lattice.Lattice.construct(prefix_searcher, lexicon, learner, string)
+            eq_([_words(p) for p in g.search_nbest_path(5)], [_words(p) for p in lat.search_nbest_path(5)])
+
+
+def test_groups_share_candidates():
+    learner = _learners()[1]
+    lexicon = lattice.Lexicon(tone_list, learner)
+    lat = lattice.Lattice.construct(prefix_searcher, lexicon, learner, strings[0])
+    g = graph.Graph.construct_graph(prefix_searcher, tone_list, strings[0])
+    eq_(sum(len(nodes) for nodes in g.nodes), len(lat))
+    start, ids = lat.groups[3][0]
+    ok_(any(ids is c for c in lexicon.candidates.values()))
+
+
+@raises(graph.SearchShortestPathError)
+def test_shortest_path_non_vocabulary():
+    learner = _learners()[1]
+    lexicon = lattice.Lexicon(tone_list, learner)
+    lattice.Lattice.construct(prefix_searcher, lexicon, learner, ('a', 'o', 'u', 'o', 'a')).search_shortest_path()
+
+
+@raises(ValueError)
+def test_lexicon_needs_edge_ids():
+    lattice.Lexicon(tone_list, graph.StructuredLearner())
+
+
+def test_lexicon_add_inserted_key():
+    learner = _learners()[1]
+    strings_list = dict(tone_list)
+    searcher = trie.DoubleArray(strings_list.keys())
+    lexicon = lattice.Lexicon(strings_list, learner)
+    searcher.insert(('u',))
+    strings_list[('u',)] = ['う', 'あ']
+    g = graph.Graph.construct_graph(searcher, strings_list, ('a', 'u'))
+    g.learner = learner
+    lat = lattice.Lattice.construct(searcher, lexicon, learner, ('a', 'u'))
+    eq_([_words(p) for p in g.search_nbest_path(3)], [_words(p) for p in lat.search_nbest_path(3)])
+    eq_(['う', 'あ'], [lexicon.words[i] for i in lexicon.candidates[('u',)]])
+    eq_(lexicon.eos_id, lexicon.words.index('<EOS>'))
+    eq_(len(lexicon.words), len(lexicon.node_costs))
+    eq_(len(lexicon.words), len(lexicon.edge_ids))
+
+
+@raises(ValueError)
+def test_lexicon_of_trained_learner():
+    learner = _learners()[0]
+    lexicon = lattice.Lexicon(tone_list, learner)
+    learner.construct_feature(['あ'])
+    lattice.Lattice.construct(prefix_searcher, lexicon, learner, strings[0])
@@ -0,0 +1,62 @@
+from nose.tools import ok_, eq_
+import os
+import tempfile
+from py_rap_gen import manifest
+
+
+def test_manifest_skips_fresh_stage():
+    with tempfile.TemporaryDirectory() as d:
+        input_path = os.path.join(d, 'input')
+        output_path = os.path.join(d, 'output')
+        manifest_path = os.path.join(d, 'manifest.json')
+        with open(input_path, 'w') as w:
+            w.write('a')
+        calls = []
+
+        def stage():
+            calls.append(1)
+            with open(input_path, 'r') as f, open(output_path, 'w') as w:
+                w.write(f.read() * 2)
+
+        def run(params):
+            return manifest.Manifest(manifest_path).run('double', stage, [input_path], [output_path], params)
+
+        ok_(run({'n': 2}))
+        ok_(run({'n': 2}))
+        eq_(1, len(calls))
+
+        # parameter change
+        ok_(run({'n': 3}))
+        eq_(2, len(calls))
+
+        # input change
+        with open(input_path, 'w') as w:
+            w.write('b')
+        ok_(run({'n': 3}))
+        eq_(3, len(calls))
+
+        # output removed
+        os.remove(output_path)
+        ok_(run({'n': 3}))
+        eq_(4, len(calls))
+
+
+def test_manifest_failed_stage_is_not_recorded():
+    with tempfile.TemporaryDirectory() as d:
+        m = manifest.Manifest(os.path.join(d, 'manifest.json'))
+        ok_(not m.run('fail', lambda: False))
+        ok_('fail' not in m.stages)
+        ok_(m.run('ok', lambda: None))
+        ok_(m.is_fresh('ok', [], [], {}))
+        eq_(m.stages, manifest.Manifest(os.path.join(d, 'manifest.json')).stages)
+
+
+def test_manifest_directory_signature():
+    with tempfile.TemporaryDirectory() as d:
+        m = manifest.Manifest(os.path.join(d, 'manifest.json'))
+        os.makedirs(os.path.join(d, 'lib'))
+        before = m.signature(os.path.join(d, 'lib'))
+        with open(os.path.join(d, 'lib', 'dic'), 'w') as w:
+            w.write('a')
+        ok_(before != m.signature(os.path.join(d, 'lib')))
+        eq_(None, m.signature(os.path.join(d, 'missing')))
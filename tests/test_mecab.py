@@ -57,3 +57,40 @@ def test_mecab_yomi_and_pronounce():
     sentence = mecab.parse("気づいた")
     eq_(sentence.words[0].yomi, "キヅイ")
     eq_(sentence.words[0].pronounce, "キズイ")
+
+
+def test_get_tagger_is_reused():
+    eq_(mecab.get_tagger(), mecab.get_tagger())
+    ok_(mecab.get_tagger() is mecab.get_tagger(""))
+
+
+def test_get_tagger_per_thread():
+    import threading
+    taggers = []
+    thread = threading.Thread(target=lambda: taggers.append(mecab.get_tagger()))
+    thread.start()
+    thread.join()
+    ok_(taggers[0] is not mecab.get_tagger())
+
+
+def test_parse_many():
+    sentences = list(mecab.parse_many(["青い空", "ゲスの極み乙女。"]))
+    eq_(2, len(sentences))
+    eq_("空", sentences[0].words[1].surface)
+    eq_("乙女", sentences[1].words[3].surface)
+
+
+def test_word_from_output():
+    word = mecab.Word.from_output("太陽\t名詞,一般,*,*,*,*,太陽,タイヨウ,タイヨー")
+    eq_("太陽", word.surface)
+    eq_("名詞", word.pos)
+    eq_("一般", word.pos1)
+    eq_("タイヨー", word.pronounce)
+    eq_("aaaa", mecab.Word.from_output("aaaa\t名詞,固有名詞,組織,*,*,*,*").pronounce)
+    eq_("タイヨー", mecab.Word("太陽", "名詞,一般,*,*,*,*,太陽,タイヨウ,タイヨー").pronounce)
+
+
+def test_sentence_strips_words():
+    words = mecab.Sentence("太陽 \t名詞,一般,*,*,*,*,太陽,タイヨウ,タイヨー \nEOS\n").words
+    eq_("太陽", words[0].surface)
+    eq_("タイヨー", words[0].pronounce)
@@ -0,0 +1,93 @@
+from nose.tools import ok_, eq_
+import os
+import json
+import tempfile
+from py_rap_gen import preprocess
+from py_rap_gen import tone
+
+
+def test_file_shards():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'data')
+        lines = ['あ' * (i % 7) + str(i) + '\n' for i in range(100)]
+        with open(path, 'w') as w:
+            w.writelines(lines)
+        for num in [1, 3, 8]:
+            eq_(lines, [line for shard in preprocess._file_shards(path, num) for line in preprocess._read_shard(shard)])
+
+
+def test_tag_corpus_keeps_order():
+    sentences = ['青い空', '金縛りにあったように動けない', '君はまさに俺の太陽', '、'] * 5
+    with tempfile.TemporaryDirectory() as d:
+        input_path = os.path.join(d, 'articles.txt')
+        with open(input_path, 'w') as w:
+            w.writelines(s + '\n' for s in sentences)
+        for workers in [1, 2]:
+            output_path = os.path.join(d, 'data' + str(workers))
+            eq_(len(sentences), preprocess._tag_corpus(input_path, output_path, workers, chunk_size=3, mecab_args=''))
+            with open(output_path, 'r') as f:
+                eq_([preprocess._tag_chunk([s + '\n'], '')[0] for s in sentences], f.read().split('\n')[:-1])
+
+
+def test_tag_corpus_resumes_from_checkpoint():
+    sentences = ['青い空', '金縛りにあったように動けない', '君はまさに俺の太陽', '、'] * 5
+    with tempfile.TemporaryDirectory() as d:
+        input_path = os.path.join(d, 'articles.txt')
+        with open(input_path, 'w') as w:
+            w.writelines(s + '\n' for s in sentences)
+        expected_path = os.path.join(d, 'expected')
+        preprocess._tag_corpus(input_path, expected_path, 1, chunk_size=3, mecab_args='')
+        with open(expected_path, 'r') as f:
+            expected = f.read()
+
+        # interrupted after checkpoint with partially written chunk
+        output_path = os.path.join(d, 'data')
+        preprocess._tag_corpus(input_path, output_path, 1, chunk_size=3, mecab_args='', checkpoint_interval=2)
+        stat = os.stat(input_path)
+        source = {'path': input_path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'mecab_args': ''}
+        with open(input_path, 'rb') as f:
+            input_offset = len(b''.join(f.readlines()[:6]))
+        output_offset = len(''.join(expected.split('\n')[:6]).encode('utf-8')) + 6
+        with open(output_path + '.checkpoint', 'w') as w:
+            json.dump({'source': source, 'input_offset': input_offset, 'output_offset': output_offset, 'lines': 6}, w)
+        with open(output_path, 'r+') as w:
+            w.truncate(output_offset + 3)
+
+        eq_(len(sentences), preprocess._tag_corpus(input_path, output_path, 2, chunk_size=3, mecab_args=''))
+        with open(output_path, 'r') as f:
+            eq_(expected, f.read())
+        ok_(not os.path.exists(output_path + '.checkpoint'))
+
+
+def test_corpus_scan():
+    lines = ['青い アオイ 形容詞\t空 ソラ 名詞-一般\n', '空 ソラ 名詞-一般\t \n', '\n']
+    factories = preprocess._counter_factories('lossy')
+    scan = preprocess._CorpusScan(*factories, sample_size=10)
+    scan.count(lines[:1])
+    other = preprocess._CorpusScan(*factories, sample_size=10)
+    other.count(lines[1:])
+    scan.merge(other)
+    eq_({'青い アオイ 形容詞': 1, '空 ソラ 名詞-一般': 2}, scan.words._items)
+    eq_({'<BOS>_形容詞': 1, '形容詞_名詞-一般': 1, '名詞-一般_<EOS>': 2, '<BOS>_名詞-一般': 1, '<BOS>_<EOS>': 1},
+        scan.pos_2grams._items)
+    eq_(3, len(scan.sample._items))
+
+    train_data = preprocess._train_examples(sorted(scan.sample.keys(), key=len, reverse=True))
+    eq_((tone.encode(['a', 'o', 'イ', 'o', 'ラ']), ['青い', '空']), train_data[0])
+    eq_(2, len(train_data))
+
+
+def test_read_dict():
+    rows = [
+        '青い,10,10,100,形容詞,自立,*,*,形容詞・アウオ段,基本形,青い,アオイ,アオイ\n',
+        'NA,1,1,100,名詞,固有名詞,*,*,*,*,NA,エヌエー,エヌエー\n',
+        '"1,2",1,1,100,名詞,数,*,*,*,*,"1,2",イチニ,イチニ\n']
+    with tempfile.TemporaryDirectory() as d:
+        os.makedirs(os.path.join(d, 'build', 'sub'))
+        with open(os.path.join(d, 'build', 'a.csv'), 'w') as w:
+            w.writelines(rows[:2])
+        with open(os.path.join(d, 'build', 'sub', 'b.csv'), 'w') as w:
+            w.writelines(rows[2:])
+        expected = [('青い', 'アオイ'), ('NA', 'エヌエー'), ('1,2', 'イチニ')]
+        eq_(expected, list(preprocess._read_dict(d, chunk_size=1)))
+        eq_([{'surface': s, 'yomi': y} for s, y in expected], list(preprocess._preprocess_dict(d)))
@@ -1,6 +1,10 @@
 from py_rap_gen import __version__
 from nose.tools import ok_, eq_
 from py_rap_gen import generator
+from py_rap_gen import trie
+from py_rap_gen import tone
+from py_rap_gen import graph
+from py_rap_gen import lattice
 
 
 def test_version():
@@ -26,8 +30,83 @@ def test_get_match_word():
     eq_(['動き出す'], generator.get_match_word("ウゴキマス", tone_list))
 
 
+def test_get_match_word_with_suffix_searcher():
+    tone_list = {
+        tone.encode(("a", "a", "a")): ['頭'],
+        tone.encode(("a", "a", "a", "a")): ['頭が', '頭は'],
+        tone.encode(("u", "o", "i")): ['動き'],
+        tone.encode(("u", "o", "i", "a")): ['動きは'],
+        tone.encode(("u", "o", "i", "a", "u")): ['動き出す'],
+        tone.encode(("e", "o", "i", "a", "u")): ['手を抜かず'],
+    }
+    prefix_searcher = trie.DoubleArray(tone_list.keys())
+    suffix_searcher = trie.DoubleArray(t[::-1] for t in tone_list)
+    eq_(['頭'], generator.get_match_word("サカサ", tone_list, prefix_searcher, suffix_searcher))
+    eq_(['動き出す'], generator.get_match_word("ウゴキマス", tone_list, prefix_searcher, suffix_searcher))
+    eq_(['手を抜かず'], generator.get_match_word("ケドキカス", tone_list, prefix_searcher, suffix_searcher))
+    eq_(['動きは'], generator.get_match_word("ウゴキネ", tone_list, prefix_searcher, suffix_searcher))
+    eq_([], generator.get_match_word("アアアアアアア", tone_list, prefix_searcher, suffix_searcher))
+
+
 def test_measure_initial_match_num():
     eq_(3, generator.measure_initial_match_num('aaa', 'aaa'))
     eq_(1, generator.measure_initial_match_num('aa', 'a'))
     eq_(0, generator.measure_initial_match_num('aaa', 'ccc'))
     eq_(2, generator.measure_initial_match_num('aaa', 'aacb'))
+
+
+def test_get_match_word_with_searcher():
+    tone_list = {
+        tone.encode(("a", "a", "a")): ['頭'],
+        tone.encode(("u", "o", "i")): ['動き'],
+        tone.encode(("u", "o", "i", "a", "u")): ['動き出す']
+    }
+    prefix_searcher = trie.DoubleArray(tone_list.keys())
+    eq_(['頭'], generator.get_match_word_with_searcher("サカサ", tone_list, prefix_searcher))
+    eq_(['頭'], generator.get_match_word_with_searcher("サカ", tone_list, prefix_searcher))
+    eq_(['動き'], generator.get_match_word_with_searcher("ウゴイテ", tone_list, prefix_searcher))
+    eq_(['頭'], generator.get_match_word_with_searcher("サカサカサカ", tone_list, prefix_searcher))
+    ok_(generator.get_match_word_with_searcher("ウゴイテマスネヨ", tone_list, prefix_searcher) in [['動き'], ['動き出す']])
+    eq_([], generator.get_match_word_with_searcher("エエエエエエ", tone_list, prefix_searcher))
+
+
+def test_generate_rapv2():
+    tone_list = {
+        tone.encode(('a', 'o', 'イ')): ['青い'],
+        tone.encode(('o', 'ラ')): ['空'],
+    }
+    prefix_searcher = trie.DoubleArray(tone_list.keys())
+    eq_(['青い空'], generator.generate_rapv2("青い空", tone_list, prefix_searcher, graph.StructuredLearner()))
+
+
+def test_generate_rapv2_lattice():
+    tone_list = {
+        tone.encode(('a', 'o', 'イ')): ['青い'],
+        tone.encode(('o', 'ラ')): ['空'],
+    }
+    prefix_searcher = trie.DoubleArray(tone_list.keys())
+    learner = graph.StructuredPerceptron()
+    learner.train([], prefix_searcher, tone_list, {'青い': '形容詞', '空': '名詞'})
+    learner = graph.CompiledPerceptron.compile(learner)
+    lexicon = lattice.Lexicon(tone_list, learner)
+    eq_(['青い空'], generator.generate_rapv2("青い空", tone_list, prefix_searcher, learner, lexicon=lexicon))
+    eq_(['青い空'], generator.generate_rapv2("青い空", tone_list, prefix_searcher, learner, 2, lexicon))
+
+
+def test_generate_rapv2_cache():
+    tone_list = {
+        tone.encode(('a', 'o', 'イ')): ['青い'],
+        tone.encode(('o', 'ラ')): ['空'],
+    }
+    prefix_searcher = trie.DoubleArray(tone_list.keys())
+    generator.sentence_cache.clear()
+    generator.lattice_cache.clear()
+    eq_(['青い空'], generator.generate_rapv2("青い空", tone_list, prefix_searcher, graph.StructuredLearner()))
+    eq_(['青い空'], generator.generate_rapv2("青い空", tone_list, prefix_searcher, graph.StructuredLearner()))
+    eq_(1, generator.cache_info()['sentence']['hits'])
+    eq_(1, generator.cache_info()['lattice']['hits'])
+
+    # updated trie must not use stale lattice
+    prefix_searcher.delete(tone.encode(('o', 'ラ')))
+    eq_("", generator.generate_rapv2("青い空", tone_list, prefix_searcher, graph.StructuredLearner()))
+    eq_(2, generator.cache_info()['lattice']['misses'])
@@ -19,3 +19,50 @@ def testconvert_tones():
 
 def testconvert_tones_error_case():
     eq_(([], []), tone.convert_tones('aaaa'))
+
+
+def test_convert_tones_packed():
+    tones, kana = tone.convert_tones('キャンパス', packed=True)
+    eq_(['a', 'n', 'a', 'u'], tone.decode(tones))
+    eq_(['キャ', 'ン', 'パ', 'ス'], tone.decode(kana))
+    eq_(bytes(tones), tone.encode(['a', 'n', 'a', 'u']))
+
+
+def test_encode_and_decode():
+    for t in tone.code2tone[1:]:
+        eq_([t], tone.decode(tone.encode([t])))
+    ok_(len(tone.code2tone) <= 256)
+    eq_(tone.encode(['ア']), tone.encode(['アァ']))
+    eq_(b'\x01\x02', tone.encode(b'\x01\x02'))
+
+
+def test_convert_tones_many():
+    eq_([(['a', 'n'], ['カ', 'ン']), ([], [])], list(tone.convert_tones_many(['カン', '、'])))
+
+
+def test_convert_tones_cached_result_is_not_shared():
+    tones, kana = tone.convert_tones('カン')
+    tones[-1] = kana[-1]
+    eq_((['a', 'n'], ['カ', 'ン']), tone.convert_tones('カン'))
+    tones, kana = tone.convert_tones('カン', packed=True)
+    tones[-1] = kana[-1]
+    eq_(['a', 'n'], tone.decode(tone.convert_tones('カン', packed=True)[0]))
+
+
+def test_convert_tones_array():
+    kanas = ['キャンパス', '、', '', 'ーカラー', 'キーャ', 'ョ', 'ヴァンパイア', 'aaaa', 'チョウセツ']
+    codes, offsets = tone.convert_tones_array(kanas)
+    finals, _ = tone.convert_tones_array(kanas, final_kana=True)
+    eq_(len(kanas) + 1, len(offsets))
+    for i, k in enumerate(kanas):
+        tones, kana = tone.convert_tones(k, packed=True)
+        eq_(tones.tobytes(), codes[offsets[i]:offsets[i + 1]].tobytes())
+        if len(tones) != 0:
+            tones[-1] = kana[-1]
+        eq_(tones.tobytes(), finals[offsets[i]:offsets[i + 1]].tobytes())
+
+
+def test_convert_tones_array_empty():
+    codes, offsets = tone.convert_tones_array([])
+    eq_(0, len(codes))
+    eq_([0], list(offsets))
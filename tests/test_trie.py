@@ -1,6 +1,23 @@
 from py_rap_gen import __version__
-from nose.tools import ok_, eq_
+from nose.tools import ok_, eq_, assert_raises
+from py_rap_gen import arrayfile
 from py_rap_gen import trie
+import os
+import sys
+import pickle
+import random
+import tempfile
+import threading
+
+
+def levenshtein(w1, w2):
+    row = list(range(len(w2) + 1))
+    for i, c in enumerate(w1):
+        new_row = [i + 1]
+        for j in range(1, len(w2) + 1):
+            new_row.append(min(row[j] + 1, new_row[j - 1] + 1, row[j - 1] + (c != w2[j - 1])))
+        row = new_row
+    return row[-1]
 
 
 class TestTrieBase:
@@ -80,23 +97,23 @@ class TestTrieBase:
 class TestDoubleArray:
     def test_create(self):
         da = trie.DoubleArray([('a', 'b', 'c')])
-        eq_(da._base, [0, 0, 0, -1])
-        eq_(da._check, [-1, 0, 1, 2])
+        eq_(list(da._base), [0, 0, 0, -1])
+        eq_(list(da._check), [-1, 0, 1, 2])
 
     def test_create_contain_common_prefix(self):
         da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
-        eq_(da._base, [0, 0, 0, -1, 2, -1])
-        eq_(da._check, [-1, 0, 1, 2, 1, 4])
+        eq_(list(da._base), [0, 0, 0, -1, 2, -1])
+        eq_(list(da._check), [-1, 0, 1, 2, 1, 4])
 
     def test_create_contain_common_postfix(self):
         da = trie.DoubleArray([('a', 'b', 'c'), ('d', 'b', 'c')])
-        eq_(da._base, [0, 0, 0, -1, 3, 3, -1])
-        eq_(da._check, [-1, 0, 1, 2, 0, 4, 5])
+        eq_(list(da._base), [0, 0, 0, -1, 3, 3, -1])
+        eq_(list(da._check), [-1, 0, 1, 2, 0, 4, 5])
 
     def test_create_multichars(self):
         da = trie.DoubleArray([('しゃ', 'か', 'い')])
-        eq_(da._base, [0, 0, 0, -1])
-        eq_(da._check, [-1, 0, 1, 2])
+        eq_(list(da._base), [0, 0, 0, -1])
+        eq_(list(da._check), [-1, 0, 1, 2])
 
     def test_search(self):
         da = trie.DoubleArray([('a', 'b', 'c')])
@@ -165,27 +182,27 @@ class TestDoubleArray:
         eq_(result, [])
 
     def test_prefix_search(self):
-        da = trie.DoubleArray([('a'), ('a', 'b'), ('a', 'b', 'c')])
+        da = trie.DoubleArray([('a',), ('a', 'b'), ('a', 'b', 'c')])
         result = da.prefix_search(['a'])
-        eq_(result, [('a')])
+        eq_(result, [('a',)])
         result = da.prefix_search(['a', 'b'])
-        eq_(result, [('a'), ('a', 'b')])
+        eq_(result, [('a',), ('a', 'b')])
         result = da.prefix_search(['a', 'b', 'c'])
-        eq_(result, [('a'), ('a', 'b'), ('a', 'b', 'c')])
+        eq_(result, [('a',), ('a', 'b'), ('a', 'b', 'c')])
 
     def test_prefix_search_case_non_vocabulary(self):
-        da = trie.DoubleArray([('a'), ('a', 'b'), ('a', 'b', 'c')])
+        da = trie.DoubleArray([('a',), ('a', 'b'), ('a', 'b', 'c')])
         result = da.prefix_search(['b'])
         eq_(result, [])
         result = da.prefix_search(['a', 'd'])
-        eq_(result, [('a')])
+        eq_(result, [('a',)])
         result = da.prefix_search(['a', 'b', 'a'])
-        eq_(result, [('a'), ('a', 'b')])
+        eq_(result, [('a',), ('a', 'b')])
 
     def test_prefix_search_case_non_word_vocabulary(self):
-        da = trie.DoubleArray([('a'), ('a', 'b', 'c')])
+        da = trie.DoubleArray([('a',), ('a', 'b', 'c')])
         result = da.prefix_search(['a', 'b', 'c', 'd'])
-        eq_(result, [('a'), ('a', 'b', 'c')])
+        eq_(result, [('a',), ('a', 'b', 'c')])
 
     def test_prefix_search_multichars(self):
         da = trie.DoubleArray([('しゃ', ), ('しゃ', 'か'), ('しゃ', 'か', 'い')])
@@ -200,3 +217,257 @@ class TestDoubleArray:
         da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
         result = da.prefix_search(['a', 'd', 'd'])
         eq_(result, [])
+
+    def test_create_many_words(self):
+        rand = random.Random(0)
+        words = set(tuple(rand.choice('aiueon') for _ in range(rand.randint(1, 6))) for _ in range(2000))
+        da = trie.DoubleArray(list(words) + list(words)[:10])
+        eq_(len(da), len(words))
+        for w in words:
+            ok_(w in da.prefix_search(w))
+        ok_(0 < da.fill_ratio <= 1)
+        ok_(da.build_time >= 0)
+
+    def test_search_many_words(self):
+        rand = random.Random(1)
+        words = set(tuple(rand.choice('aiueo') for _ in range(rand.randint(1, 6))) for _ in range(1000))
+        da = trie.DoubleArray(words)
+        for prefix in [('a',), ('i', 'u'), ('o', 'o', 'e')]:
+            for max_len in [-1, 2, 3, 5]:
+                expected = set(w for w in words
+                               if w[:len(prefix)] == prefix and (max_len < 0 or len(w) <= max_len))
+                result = da.search(list(prefix), max_len=max_len)
+                eq_(len(result), len(expected))
+                eq_(set(result), expected)
+                eq_([w for w in da.search(list(prefix)) if max_len < 0 or len(w) <= max_len], result)
+
+    def test_search_long_word(self):
+        word = tuple('a' for _ in range(1500))
+        da = trie.DoubleArray([word, word[:10]])
+        eq_(da.search(['a']), [word[:10], word])
+        eq_(da.search(['a'], max_len=100), [word[:10]])
+        ok_(len(da._cuts) < 10 * len(word))
+
+    def test_all_prefix_search(self):
+        da = trie.DoubleArray([('a',), ('a', 'b'), ('b', 'c'), ('c',)])
+        result = da.all_prefix_search(['a', 'b', 'c', 'd', 'c'])
+        eq_([(s, e, da.key(i)) for s, e, i in result],
+            [(0, 1, ('a',)), (0, 2, ('a', 'b')), (1, 3, ('b', 'c')), (2, 3, ('c',)), (4, 5, ('c',))])
+        eq_(da.all_prefix_search_codes(da.encode(['a', 'b'])), da.all_prefix_search(['a', 'b']))
+        eq_(da.all_prefix_search([]), [])
+
+    def test_fuzzy_search(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c'), ('a', 'b'), ('b', 'c', 'd', 'e')])
+        eq_(da.fuzzy_search(['a', 'b', 'c'], max_dist=0), [(('a', 'b', 'c'), 0)])
+        eq_(da.fuzzy_search(['a', 'b', 'c'], max_dist=1),
+            [(('a', 'b', 'c'), 0), (('a', 'b'), 1), (('a', 'd', 'c'), 1)])
+        eq_(da.fuzzy_search(['a', 'b', 'c'], max_dist=1, top_n=2), [(('a', 'b', 'c'), 0), (('a', 'b'), 1)])
+        eq_(da.fuzzy_search(['x', 'b', 'c'], max_dist=1), [(('a', 'b', 'c'), 1)])
+        eq_(da.fuzzy_search(['b', 'c', 'e'], max_dist=1), [(('b', 'c', 'd', 'e'), 1)])
+
+    def test_fuzzy_search_many_words(self):
+        rand = random.Random(2)
+        words = set(tuple(rand.choice('aiueo') for _ in range(rand.randint(1, 6))) for _ in range(500))
+        da = trie.DoubleArray(words)
+        query = ('a', 'i', 'u', 'e')
+        expected = sorted((levenshtein(query, w), w) for w in words)
+        expected = [(w, d) for d, w in expected if d <= 2]
+        eq_(sorted(da.fuzzy_search(query, max_dist=2, top_n=-1), key=lambda x: (x[1], x[0])), expected)
+
+    def test_longest_prefix_match(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c'), ('a', 'b'), ('b', 'c', 'd')])
+        eq_(da.longest_prefix_match(['a', 'b', 'x']), (2, [('a', 'b'), ('a', 'b', 'c')]))
+        eq_(da.longest_prefix_match(['a', 'b', 'x'], 3), (2, [('a', 'b', 'c')]))
+        eq_(da.longest_prefix_match(['a', 'd', 'x'], 2), (1, [('a', 'b')]))
+        eq_(da.longest_prefix_match(['c', 'd', 'x'], 3), (0, [('a', 'b', 'c'), ('a', 'd', 'c'), ('b', 'c', 'd')]))
+        eq_(da.longest_prefix_match(['a'], 4), (0, []))
+        da.insert(('a', 'd', 'x'))
+        eq_(da.longest_prefix_match(['a', 'd', 'x'], 3), (3, [('a', 'd', 'x')]))
+
+    def test_insert(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
+        da.insert(('a', 'b'))
+        da.insert(('a', 'e'))
+        da.insert(('b', 'x', 'y'))
+        eq_(len(da), 5)
+        eq_(da.search(['a']), [('a', 'b', 'c'), ('a', 'd', 'c'), ('a', 'b'), ('a', 'e')])
+        eq_(da.search(['a'], max_len=2), [('a', 'b'), ('a', 'e')])
+        eq_(da.prefix_search(['a', 'b', 'c']), [('a', 'b'), ('a', 'b', 'c')])
+        eq_(da.search(['b', 'x']), [('b', 'x', 'y')])
+
+    def test_insert_many_words(self):
+        rand = random.Random(3)
+        words = set(tuple(rand.choice('aiueon') for _ in range(rand.randint(1, 5))) for _ in range(300))
+        inserted = set(tuple(rand.choice('aiueoxyz') for _ in range(rand.randint(1, 5))) for _ in range(300))
+        da = trie.DoubleArray(words)
+        for w in inserted:
+            da.insert(w)
+        words |= inserted
+        eq_(len(da), len(words))
+        for prefix in [('a',), ('x',), ('o', 'y')]:
+            eq_(set(da.search(prefix)), set(w for w in words if w[:len(prefix)] == prefix))
+        for w in words:
+            ok_(w in da.prefix_search(w))
+
+    def test_delete(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c'), ('a', 'b')])
+        ok_(da.delete(('a', 'b')))
+        ok_(not da.delete(('a', 'b')))
+        ok_(not da.delete(('a', 'x')))
+        da.insert(('a', 'e'))
+        ok_(da.delete(('a', 'e')))
+        eq_(len(da), 2)
+        eq_(da.search(['a']), [('a', 'b', 'c'), ('a', 'd', 'c')])
+        eq_(da.prefix_search(['a', 'b', 'c']), [('a', 'b', 'c')])
+
+    def test_compact(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
+        da.insert(('a', 'b'))
+        da.delete(('a', 'd', 'c'))
+        compacted = da.compact_async().result()
+        eq_(compacted._pending, [])
+        eq_(len(compacted), 2)
+        eq_(compacted.search(['a']), [('a', 'b'), ('a', 'b', 'c')])
+
+    def test_journal_only_while_compacting(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
+        version = da.version
+        da.insert(('a', 'b'))
+        da.delete(('a', 'b'))
+        eq_(da._journal, [])
+        ok_(da.version != version)
+
+        class Hooked(trie.DoubleArray):
+            hook = None
+
+            def __init__(self, words=()):
+                super().__init__(words)
+                if Hooked.hook is not None:
+                    hook, Hooked.hook = Hooked.hook, None
+                    hook()
+
+        da = Hooked([('a', 'b', 'c'), ('a', 'd', 'c')])
+        Hooked.hook = lambda: da.insert(('a', 'e'))
+        compacted = da.compact()
+        eq_(compacted.search(['a']), [('a', 'b', 'c'), ('a', 'd', 'c'), ('a', 'e')])
+        eq_(da._journal, [])
+
+    def test_update_while_compacting(self):
+        rand = random.Random(6)
+        words = sorted(set(tuple(rand.choice('aiueon') for _ in range(rand.randint(1, 5))) for _ in range(3000)))
+        inserted = [tuple(rand.choice('aiueoxyz') for _ in range(rand.randint(1, 5))) for _ in range(3000)]
+        da = trie.DoubleArray(words)
+        version = da.version
+        expected = set(words)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            future = da.compact_async(swap=True)
+            for i, w in enumerate(inserted):
+                if i % 3 == 0 and i < len(words) and words[i] in expected:
+                    da.delete(words[i])
+                    expected.discard(words[i])
+                da.insert(w)
+                expected.add(w)
+            ok_(future.result() is da)
+        finally:
+            sys.setswitchinterval(interval)
+        eq_(len(da), len(expected))
+        eq_(set(da.search([])), expected)
+        eq_(da._journal, [])
+        ok_(da.version != version)
+
+    def test_search_while_inserting(self):
+        rand = random.Random(5)
+        words = sorted(set(tuple(rand.choice('aiueon') for _ in range(rand.randint(1, 4))) for _ in range(200)))
+        inserted = [tuple(rand.choice('aiueoxyz') for _ in range(rand.randint(1, 5))) for _ in range(2000)]
+        da = trie.DoubleArray(words)
+        missed = []
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                for w in words:
+                    if w not in da.prefix_search(w):
+                        missed.append(w)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            reader = threading.Thread(target=read)
+            reader.start()
+            for w in inserted:
+                da.insert(w)
+            done.set()
+            reader.join()
+        finally:
+            sys.setswitchinterval(interval)
+        eq_(missed, [])
+        for w in words + inserted:
+            ok_(w in da.prefix_search(w))
+
+    def test_insert_loaded(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'da.bin')
+            da.save(path)
+            loaded = trie.DoubleArray.load(path)
+            loaded.insert(('a', 'b'))
+            loaded.save(path)
+            del loaded
+            loaded = trie.DoubleArray.load(path)
+            eq_(loaded.search(['a', 'b']), [('a', 'b', 'c'), ('a', 'b')])
+            eq_(loaded.compact().search(['a', 'b']), [('a', 'b'), ('a', 'b', 'c')])
+            del loaded
+
+    def test_packed_words(self):
+        da = trie.DoubleArray([b'\x01\x02\x03', b'\x01\x04', b'\x02'])
+        eq_(da.search(b'\x01'), [b'\x01\x02\x03', b'\x01\x04'])
+        eq_(da.prefix_search(b'\x01\x04\x05'), [b'\x01\x04'])
+        eq_([(s, e, da.key(i)) for s, e, i in da.all_prefix_search(b'\x01\x04\x02')],
+            [(0, 2, b'\x01\x04'), (2, 3, b'\x02')])
+        eq_(da.fuzzy_search(b'\x01', max_dist=1), [(b'\x01\x04', 1), (b'\x02', 1)])
+        da.insert(b'\x09\x09')
+        ok_(da.delete(b'\x02'))
+        eq_(da.search(b'\x09'), [b'\x09\x09'])
+        ok_(da.compact(swap=True) is da)
+        eq_(da.search(b'\x01'), [b'\x01\x02\x03', b'\x01\x04'])
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'da.bin')
+            da.save(path)
+            loaded = trie.DoubleArray.load(path)
+            eq_(loaded.search(b'\x01'), [b'\x01\x02\x03', b'\x01\x04'])
+            eq_(loaded.search(b'\x02'), [])
+            loaded.insert(b'\x07')
+            eq_(loaded.key(loaded._node_word[loaded._find_node(b'\x07')]), b'\x07')
+            del loaded
+
+    def test_save_and_load(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c'), ('しゃ', 'か')])
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'da.bin')
+            da.save(path)
+            loaded = trie.DoubleArray.load(path)
+            eq_(list(loaded._base), list(da._base))
+            eq_(list(loaded._check), list(da._check))
+            eq_(loaded.search(['a']), [('a', 'b', 'c'), ('a', 'd', 'c')])
+            eq_(loaded.prefix_search(['しゃ', 'か']), [('しゃ', 'か')])
+            eq_(loaded.key(0), ('a', 'b', 'c'))
+            eq_(len(loaded), 3)
+            del loaded
+
+    def test_load_other_version(self):
+        da = trie.DoubleArray([('a', 'b', 'c')])
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'da.bin')
+            arrayfile.save(path, {name: getattr(da, name) for name in trie.ARRAY_NAMES}, {'chars': da._index2char})
+            assert_raises(ValueError, trie.DoubleArray.load, path)
+
+    def test_pickle_loaded(self):
+        da = trie.DoubleArray([('a', 'b', 'c'), ('a', 'd', 'c')])
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'da.bin')
+            da.save(path)
+            loaded = pickle.loads(pickle.dumps(trie.DoubleArray.load(path)))
+        eq_(list(loaded._check), list(da._check))
+        eq_(loaded.search(['a', 'd']), [('a', 'd', 'c')])